@@ -168,5 +168,8 @@ $run 'php indi -d external/proxysql'
 $run 'php indi realtime/debezium/enable'
 $run 'php indi -d realtime/closetab'
 
+# Start excel-to-pdf conversion daemon to keep LibreOffice warm between conversions
+$run 'nohup python3 /usr/local/bin/excel-to-pdf.py --daemon >> /var/log/custom/excel-to-pdf.log 2>&1 &'
+
 # Run original entrypoint script provided by base image
 echo "Apache started" && source /usr/local/bin/docker-php-entrypoint "apache2-foreground"
\ No newline at end of file
@@ -1,109 +1,421 @@
+import uno, os, sys, subprocess, time, json, socket, socketserver, threading, queue, tempfile, shutil, argparse
+from concurrent.futures import ThreadPoolExecutor
+from com.sun.star.beans import PropertyValue
 
+# Path to the unix socket the conversion daemon is listening on
+daemon_socket = os.environ.get('EXCEL_TO_PDF_SOCKET', '/tmp/excel-to-pdf.sock')
 
-import uno, os, sys, subprocess, time
-from com.sun.star.beans import PropertyValue
+# Quantity of documents after which office instance is restarted to keep memory usage under control
+max_docs = int(os.environ.get('EXCEL_TO_PDF_MAX_DOCS', '200'))
+
+# Quantity of office instances the daemon should keep running, to be able to convert documents in parallel
+workers = int(os.environ.get('EXCEL_TO_PDF_WORKERS', '1'))
+
+# UNO port of the first office instance in the pool, so the others are listening on next ports
+base_port = int(os.environ.get('EXCEL_TO_PDF_PORT', '2002'))
+
+# Directory where office instances' user profiles are kept
+profiles = os.environ.get('EXCEL_TO_PDF_PROFILES', os.path.join(tempfile.gettempdir(), 'excel-to-pdf'))
+
+# Extensions of files to be picked from directories given for batch conversion
+extensions = ('.xls', '.xlsx', '.xlsm', '.ods', '.csv')
+
+# Maximum seconds the client will wait for the daemon to convert a document
+client_timeout = int(os.environ.get('EXCEL_TO_PDF_TIMEOUT', '600'))
 
 # Prepare a file url from a system path
 def url(path): return uno.systemPathToFileUrl(os.path.abspath(path))
 
-# Define UNO socket and other shortcuts
-socket = "socket,host=127.0.0.1,port=2002;urp;"
-proc = None
-doc = None
+# Print message to stderr with a timestamp, so it's visible in the daemon log
+def log(msg): print(time.strftime('%Y-%m-%d %H:%M:%S ') + msg, file=sys.stderr, flush=True)
+
+# Get a port number currently not used by anything else
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+# Headless LibreOffice instance reachable via UNO socket. Each instance has its own port and
+# user profile dir, as otherwise concurrently running instances would collide on both
+class Office:
+
+    def __init__(self, port=None, profile=None):
+
+        # If port or profile is not given - it's a one-off instance, so use free port and temporary profile
+        self.temporary = profile is None
+        self.profile = profile or tempfile.mkdtemp(prefix='excel-to-pdf-')
+        self.socket = f"socket,host=127.0.0.1,port={port or free_port()};urp;"
+        self.proc = None
+        self.window = None
+        self.docs = 0
 
-# Try our best
-try:
+    # Open libreoffice subprocess and connect to it
+    def start(self):
 
-    # Open libreoffice subprocess
-    proc = subprocess.Popen([
-        "libreoffice", "--headless", "--nologo", "--nodefault", "--nolockcheck", "--nofirststartwizard", "--norestore",
-        "--invisible", "-env:SAL_USE_VCLPLUGIN=svp", f"--accept={socket}"
-    ])
+        # Open libreoffice subprocess
+        self.proc = subprocess.Popen([
+            "libreoffice", "--headless", "--nologo", "--nodefault", "--nolockcheck", "--nofirststartwizard", "--norestore",
+            "--invisible", "-env:SAL_USE_VCLPLUGIN=svp", f"-env:UserInstallation={url(self.profile)}",
+            f"--accept={self.socket}"
+        ])
 
-    # Connect to LibreOffice
-    local = uno.getComponentContext()
-    resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
-    for _ in range(20):
+        # Connect to LibreOffice
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        for _ in range(20):
+            try:
+                context = resolver.resolve(f"uno:{self.socket}StarOffice.ComponentContext")
+                if context: break
+            except Exception:
+                time.sleep(0.5)
+        else:
+            self.stop()
+            raise RuntimeError("Could not connect to LibreOffice")
+
+        # Get desktop and reset documents counter
+        self.window = context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+        self.docs = 0
+
+    # Check whether libreoffice subprocess is still running
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    # Shutdown LibreOffice
+    def stop(self):
+
+        # Try to terminate gracefully
         try:
-            context = resolver.resolve(f"uno:{socket}StarOffice.ComponentContext")
-            if context: break
+            if self.window: self.window.terminate()
         except Exception:
-            time.sleep(0.5)
-    else:
-        raise RuntimeError("Could not connect to LibreOffice")
-
-    window = context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
-
-    # Open document and get styles
-    doc = window.loadComponentFromURL(url(sys.argv[1]), "_blank", 0, (PropertyValue("Hidden", 0, True, 0),))
-    styles = doc.getStyleFamilies().getByName("PageStyles")
-
-    # Foreach sheet
-    for i in range(doc.getSheets().getCount()):
-
-        # Get current sheet
-        sheet = doc.getSheets().getByIndex(i)
-
-        # Calc width usage
-        cursor = sheet.createCursor()
-        cursor.gotoEndOfUsedArea(True)
-        width_usage = sum(sheet.getColumns().getByIndex(c).Width for c in range(cursor.RangeAddress.EndColumn + 1))
-
-        # Create page style for the current sheet
-        style_name = f"Sheet_{i}"
-        styles.insertByName(style_name, doc.createInstance("com.sun.star.style.PageStyle"))
-        sheet.PageStyle = style_name
-        style = styles.getByName(style_name)
-
-        # Apply sizing and layout
-        style.LeftMargin = style.RightMargin = style.TopMargin = style.BottomMargin = 500
-        style.Width = width_usage + style.LeftMargin + style.RightMargin
-        style.Height = 21000
-        style.IsLandscape = style.Width > style.Height
-        style.ScaleToPagesX = 1
-        style.ScaleToPagesY = 0
-        style.PrintGrid = True
-
-        # Show sheet number and name
-        header = style.RightPageHeaderContent
-        header.LeftText.setString(f"Sheet #{i + 1}")
-        header.CenterText.setString(sheet.Name)
-
-        # Show page number within a sheet
-        cursor = header.RightText.createTextCursor()
-        header.RightText.insertString(cursor, "Page ", False)
-        header.RightText.insertTextContent(cursor, doc.createInstance("com.sun.star.text.TextField.PageNumber"), False)
-
-        # Apply header to style
-        style.HeaderIsOn = True
-        style.RightPageHeaderContent = header
-        style.HeaderBodyDistance = style.TopMargin
-        style.HeaderHeight = 800
-
-    # Save as PDF
-    doc.storeToURL(url(sys.argv[2]), (PropertyValue("FilterName", 0, "calc_pdf_Export", 0),))
-
-# Finalize
-finally:
+            pass
 
-    # Close document if opened
-    if doc:
+        # Hard kill subprocess as last resort
+        if self.proc:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+        # Reset state
+        self.proc = None
+        self.window = None
+
+        # Remove temporary profile
+        if self.temporary: shutil.rmtree(self.profile, ignore_errors=True)
+
+    # Convert given spreadsheet into pdf, (re)starting LibreOffice if need
+    def convert(self, src, dst):
+
+        # If instance has crashed, was never started or has converted too many documents - (re)start it
+        if not self.alive() or self.docs >= max_docs:
+            self.stop()
+            self.start()
+
+        # Do convert, and if LibreOffice died in the middle - restart it and retry once
         try:
-            doc.close(True)
+            timing = convert(self.window, src, dst)
         except Exception:
-            pass
+            if self.alive(): raise
+            log(f"LibreOffice crashed while converting {src}, restarting")
+            self.stop()
+            self.start()
+            timing = convert(self.window, src, dst)
 
-    # Shutdown LibreOffice
+        # Increment documents counter and return timing
+        self.docs += 1
+        return timing
+
+# Convert spreadsheet into pdf using given desktop, and return info on where the time was spent
+def convert(window, src, dst):
+
+    # Document and timing info
+    doc = None
+    timing = {'load': 0, 'sheets': [], 'export': 0}
+    started = time.time()
+
+    # Try our best
     try:
-        if 'window' in locals():
-            window.terminate()
-    except Exception:
-        pass
-
-    # Hard kill subprocess as last resort
-    if proc:
-        proc.terminate()
+
+        # Open document and get styles
+        doc = window.loadComponentFromURL(url(src), "_blank", 0, (PropertyValue("Hidden", 0, True, 0),))
+        styles = doc.getStyleFamilies().getByName("PageStyles")
+        timing['load'] = round(time.time() - started, 3)
+
+        # Foreach sheet
+        for i in range(doc.getSheets().getCount()):
+
+            # Get current sheet
+            sheet = doc.getSheets().getByIndex(i)
+            started = time.time()
+
+            # Calc width usage as the width of the used columns range, so that it's
+            # fetched in a single call rather than a call per each column
+            cursor = sheet.createCursor()
+            cursor.gotoEndOfUsedArea(True)
+            columns = cursor.RangeAddress.EndColumn + 1
+            width_usage = sheet.getCellRangeByPosition(0, 0, columns - 1, 0).Size.Width
+            measured = time.time()
+
+            # Create page style for the current sheet
+            style_name = f"Sheet_{i}"
+            styles.insertByName(style_name, doc.createInstance("com.sun.star.style.PageStyle"))
+            sheet.PageStyle = style_name
+            style = styles.getByName(style_name)
+
+            # Apply sizing and layout
+            style.LeftMargin = style.RightMargin = style.TopMargin = style.BottomMargin = 500
+            style.Width = width_usage + style.LeftMargin + style.RightMargin
+            style.Height = 21000
+            style.IsLandscape = style.Width > style.Height
+            style.ScaleToPagesX = 1
+            style.ScaleToPagesY = 0
+            style.PrintGrid = True
+
+            # Show sheet number and name
+            header = style.RightPageHeaderContent
+            header.LeftText.setString(f"Sheet #{i + 1}")
+            header.CenterText.setString(sheet.Name)
+
+            # Show page number within a sheet
+            cursor = header.RightText.createTextCursor()
+            header.RightText.insertString(cursor, "Page ", False)
+            header.RightText.insertTextContent(cursor, doc.createInstance("com.sun.star.text.TextField.PageNumber"), False)
+
+            # Apply header to style
+            style.HeaderIsOn = True
+            style.RightPageHeaderContent = header
+            style.HeaderBodyDistance = style.TopMargin
+            style.HeaderHeight = 800
+
+            # Remember how much time was spent on this sheet
+            timing['sheets'].append({
+                'name': sheet.Name,
+                'columns': columns,
+                'measure': round(measured - started, 3),
+                'style': round(time.time() - measured, 3)
+            })
+
+        # Save as PDF
+        started = time.time()
+        doc.storeToURL(url(dst), (PropertyValue("FilterName", 0, "calc_pdf_Export", 0),))
+        timing['export'] = round(time.time() - started, 3)
+        return timing
+
+    # Close document if opened
+    finally:
+        if doc:
+            try:
+                doc.close(True)
+            except Exception:
+                pass
+
+# Pool of office instances, where each document is dispatched to the first idle instance. If temporary-arg is true,
+# e.g. for a batch run without daemon, instances use free ports and temporary profiles, same as one-off instance does,
+# so that several batches can run at the same time, else those use fixed ports and profiles kept between restarts
+class Pool:
+
+    def __init__(self, size, temporary=False):
+
+        # Create instances having separate ports and profiles
+        if temporary: self.offices = [Office() for i in range(size)]
+        else: self.offices = [Office(base_port + i, os.path.join(profiles, f'worker-{i}')) for i in range(size)]
+        self.idle = queue.Queue()
+
+        # Start instances in parallel, as each start takes a few seconds
+        with ThreadPoolExecutor(size) as executor:
+            list(executor.map(Office.start, self.offices))
+
+        # Mark all as idle
+        for office in self.offices: self.idle.put(office)
+
+    # Convert document using the first idle instance
+    def convert(self, src, dst):
+        office = self.idle.get()
+        try:
+            return office.convert(src, dst)
+        finally:
+            self.idle.put(office)
+
+    # Restart idle instances which have crashed, so next request won't pay the cold start
+    def supervise(self):
+        for _ in range(len(self.offices)):
+            try:
+                office = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                if not office.alive():
+                    log(f"LibreOffice at {office.socket} is not running, restarting")
+                    office.stop()
+                    office.start()
+            except Exception as e:
+                log(f"Failed to restart LibreOffice: {e}")
+            finally:
+                self.idle.put(office)
+
+    # Shutdown all instances
+    def stop(self):
+        for office in self.offices: office.stop()
+
+# Handle a single conversion request sent to the daemon as a line of json
+class Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+
+        # Read request
         try:
-            proc.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            proc.kill()
\ No newline at end of file
+            job = json.loads(self.rfile.readline())
+        except ValueError:
+            return self.reply({'success': False, 'msg': 'Invalid request'})
+
+        # Convert using the first idle warm office instance
+        started = time.time()
+        try:
+            timing = self.server.pool.convert(job['src'], job['dst'])
+        except Exception as e:
+            log(f"Failed to convert {job.get('src')}: {e}")
+            return self.reply({'success': False, 'msg': str(e)})
+
+        # Reply with success and timing
+        log(f"Converted {job['src']} in {time.time() - started:.2f}s: {json.dumps(timing)}")
+        self.reply({'success': True, 'timing': timing})
+
+    # Write json response line
+    def reply(self, data):
+        self.wfile.write((json.dumps(data) + '\n').encode())
+
+# Unix-socket server keeping LibreOffice instances warm between requests
+class Daemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, size):
+
+        # Remove socket file left by previous run, if any
+        if os.path.exists(path): os.unlink(path)
+
+        # Start office instances
+        self.pool = Pool(size)
+
+        # Start listening and make socket usable by any local user
+        super().__init__(path, Handler)
+        os.chmod(path, 0o666)
+
+        # Start supervisor thread
+        threading.Thread(target=self.supervise, daemon=True).start()
+
+    # Periodically check instances
+    def supervise(self):
+        while True:
+            time.sleep(5)
+            self.pool.supervise()
+
+# Run the daemon until killed
+def serve(size):
+    log(f"Listening on {daemon_socket} with {size} worker(s)")
+    with Daemon(daemon_socket, size) as daemon:
+        try:
+            daemon.serve_forever()
+        finally:
+            daemon.pool.stop()
+
+# Print timing info to stderr, if --timing flag is given
+def report(src, timing):
+    if not args.timing: return
+    print(f"{src}: load {timing['load']}s, export {timing['export']}s", file=sys.stderr)
+    for i, sheet in enumerate(timing['sheets']):
+        print(f"» Sheet #{i + 1} '{sheet['name']}', {sheet['columns']} columns: "
+              f"measure {sheet['measure']}s, style {sheet['style']}s", file=sys.stderr)
+
+# Ask daemon to convert the document. Return False if daemon is not running
+def request(src, dst):
+
+    # Send request to the daemon
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(client_timeout)
+            client.connect(daemon_socket)
+            client.sendall((json.dumps({'src': os.path.abspath(src), 'dst': os.path.abspath(dst)}) + '\n').encode())
+            reply = json.loads(client.makefile().readline())
+
+    # If daemon is not running - return false
+    except (FileNotFoundError, ConnectionRefusedError):
+        return False
+
+    # If conversion failed - raise
+    if not reply['success']: raise RuntimeError(reply['msg'])
+    report(src, reply['timing'])
+    return True
+
+# Convert single document via daemon, or by one-off office instance if daemon is not running
+def convert_one(src, dst):
+    if request(src, dst): return
+    office = Office()
+    try:
+        report(src, office.convert(src, dst))
+    finally:
+        office.stop()
+
+# Convert many documents into pdf files in given directory, dispatching them across workers
+def convert_many(paths, out, size):
+
+    # Collect spreadsheets, expanding directories
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(extensions))
+        else:
+            files.append(path)
+
+    # Prepare [source => target] pairs
+    os.makedirs(out, exist_ok=True)
+    jobs = [(src, os.path.join(out, os.path.splitext(os.path.basename(src))[0] + '.pdf')) for src in files]
+    if not jobs: return 0
+
+    # If daemon is running - send requests concurrently, so that they're spread across its workers
+    # Else start own pool of office instances for the duration of this batch. First document is sent to daemon
+    # to check whether it's running, so if daemon failed to convert it - it's counted as failed, same as others
+    pool, failed = None, 0
+    try:
+        try:
+            daemon = request(*jobs[0])
+            if daemon: print(jobs[0][1])
+        except Exception as e:
+            print(f"Failed to convert {jobs[0][0]}: {e}", file=sys.stderr)
+            daemon, failed = True, 1
+        if daemon: jobs.pop(0)
+        else: pool = Pool(min(size, len(jobs)), temporary=True)
+        convert = (lambda src, dst: report(src, pool.convert(src, dst))) if pool else request
+
+        # Convert all, reporting failures one by one
+        with ThreadPoolExecutor(size) as executor:
+            for (src, dst), future in zip(jobs, [executor.submit(convert, src, dst) for src, dst in jobs]):
+                try:
+                    future.result()
+                    print(dst)
+                except Exception as e:
+                    print(f"Failed to convert {src}: {e}", file=sys.stderr)
+                    failed += 1
+        return failed
+    finally:
+        if pool: pool.stop()
+
+# Parse arguments
+parser = argparse.ArgumentParser(description='Convert spreadsheets into pdf')
+parser.add_argument('--daemon', action='store_true', help='run conversion daemon')
+parser.add_argument('--batch', metavar='OUT_DIR', help='convert all given files and directories into OUT_DIR')
+parser.add_argument('--workers', type=int, default=workers, help='quantity of office instances to be used')
+parser.add_argument('--timing', action='store_true', help='print where the conversion time was spent')
+parser.add_argument('paths', nargs='*')
+args = parser.parse_args()
+
+# Run daemon, convert batch or single file
+if args.daemon:
+    serve(args.workers)
+elif args.batch:
+    sys.exit(1 if convert_many(args.paths, args.batch, args.workers) else 0)
+elif len(args.paths) == 2:
+    convert_one(*args.paths)
+else:
+    parser.print_usage()
+    sys.exit(2)
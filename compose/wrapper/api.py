@@ -1,25 +1,48 @@
 # Do imports
-from flask import Flask, request, jsonify
-import subprocess, pika, json, pexpect, re, pymysql, psycopg2, psycopg2.extras, os, shlex
-from pika.exceptions import ChannelClosedByBroker
+from flask import Flask, Response, request, jsonify, g
+import subprocess, pika, json, pexpect, re, pymysql, psycopg2, psycopg2.extras, os, shlex, time, tempfile, zlib, threading, collections
+from pika.exceptions import ChannelClosedByBroker, AMQPChannelError, UnroutableError
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from pools import Pool
+from envfile import DotEnv
+from repo import RepoInfo
+from releases import ReleaseCache, FetchError
+from github import Client, GitHubError
+from stream import Coalescer
+import stream, jobs, ddl, metrics
 
 # Instantiate Flask app
 app = Flask(__name__)
 app.config["JSON_SORT_KEYS"] = False
 
-# Get parent repo
-def get_current_repo():
-    return subprocess.run(
-        'source maintain/functions.sh && get_current_repo',
-        shell=True, executable='/bin/bash', capture_output=True, text=True
-    ).stdout.strip()
+# GitHub API client, and threads to make requests in parallel
+github = Client()
+github_threads = ThreadPoolExecutor(4, thread_name_prefix='github')
+
+# Detect parent repo for a given repo, in the same way as get_parent_repo() in functions.sh does,
+# i.e. the repo which a given one was forked or generated from
+def detect_parent_repo(repo):
+    try:
+        info = github.get_json(f'/repos/{repo}', get_dot_env('GH_TOKEN_CUSTOM_RW'))
+    except GitHubError:
+        return 'null'
+    parent = info.get('parent') or info.get('template_repository')
+    return parent['full_name'] if parent else 'null'
+
+# Cached repo metadata
+repo_info = RepoInfo(detect_parent_repo)
+
+# Cached releases lists
+release_cache = ReleaseCache(github)
 
 # Get current repo
+def get_current_repo():
+    return repo_info.current()
+
+# Get parent repo
 def get_parent_repo():
-    return subprocess.run(
-        'source maintain/functions.sh && get_parent_repo "$(get_current_repo)"',
-        shell=True, executable='/bin/bash', capture_output=True, text=True
-    ).stdout.strip()
+    return repo_info.parent()
 
 # Check tag syntax
 def valid_tag(tagName):
@@ -40,29 +63,86 @@ def queue_exists(channel, name):
         channel.queue_declare(queue=name, passive=True)
         return True, channel
     except ChannelClosedByBroker:
-        return False, channel.connection.channel()
+        return False, mq_channel(channel.connection)
+
+# Open rabbitmq channel with publisher confirms enabled, so that messages published with mandatory
+# flag but having no queue to be routed to - are returned by broker and raise UnroutableError
+def mq_channel(nn):
+    mq = nn.channel()
+    mq.confirm_delivery()
+    return mq
+
+# Parsed .env file, re-read only when changed
+dot_env = DotEnv('.env')
 
 # Get value of given variable from .env file
 def get_dot_env(name):
-    with open('.env') as f:
-        for line in f:
-            if line.startswith(name + '='):
-                value = line.strip().split('=', 1)[1]
-
-                # Remove optional surrounding single or double quotes
-                if (value.startswith('"') and value.endswith('"')) or \
-                   (value.startswith("'") and value.endswith("'")):
-                    value = value[1:-1]
-
-                # Return value with trimmed surrounding single/double quotes
-                return value
-    return ''
-
-# Get DB_ENGINE and credentials from .env
-engine = get_dot_env('DB_ENGINE')
-db_user = get_dot_env('DB_APP_USER')
-db_pass = get_dot_env('DB_APP_PASSWORD')
-db_name = get_dot_env('DB_NAME')
+    return dot_env.get(name)
+
+# DB_ENGINE and credentials from .env
+engine = db_user = db_pass = db_name = None
+
+# Get DB_ENGINE and credentials from .env, and do that again each time .env is changed
+def apply_dot_env(env):
+    global engine, db_user, db_pass, db_name
+
+    # Remember previous values
+    before = engine, db_user, db_pass, db_name
+
+    # Pick fresh values
+    engine = env.values.get('DB_ENGINE', '')
+    db_user = env.values.get('DB_APP_USER', '')
+    db_pass = env.values.get('DB_APP_PASSWORD', '')
+    db_name = env.values.get('DB_NAME', '')
+
+    # Pick GitHub API base url, which can be overridden e.g. to point to a local stub server
+    github.base_url = env.values.get('GITHUB_API_URL') or 'https://api.github.com'
+
+    # If db connection settings changed - drop idle pooled connections, as those use old settings
+    if before != (engine, db_user, db_pass, db_name) and 'db_pool' in globals(): db_pool.clear()
+
+# Setup listener and load .env
+dot_env.on_reload(apply_dot_env)
+dot_env.reload()
+
+# Make sure .env changes are picked before handling each request
+@app.before_request
+def refresh_dot_env():
+    dot_env.refresh()
+
+# Remember when request handling was started
+@app.before_request
+def start_timer():
+    g.started = time.monotonic()
+
+# Record request latency per route. For streamed responses that's the time until response is started
+@app.after_request
+def record_latency(response):
+    observe_request(response.status_code)
+    return response
+
+# Record latency of requests failed with unhandled exception
+@app.teardown_request
+def record_failure(error=None):
+    if error is not None: observe_request(500)
+
+# Record request latency, unless already recorded
+def observe_request(status):
+    if 'started' not in g: return
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe('wrapper_http_request_duration_seconds', time.monotonic() - g.pop('started'), route=route, method=request.method, status=str(status))
+
+# Run command via subprocess.run(), and record its duration
+def run_command(cli, **kwargs):
+    started = time.monotonic()
+    result = subprocess.run(cli, **kwargs)
+    observe_command(cli[0], started, result.returncode)
+    return result
+
+# Record duration of a command spawned at a given time
+def observe_command(command, started, returncode):
+    status = 'ok' if returncode == 0 else 'failed'
+    metrics.observe('wrapper_subprocess_duration_seconds', time.monotonic() - started, command=os.path.basename(command), status=status)
 
 # Get schema name for a given pdo key.
 def get_schema_name(pdokey: str) -> str:
@@ -111,19 +191,12 @@ def get_pdokey_dsn(pdokey: str):
         'schema': get_schema_name(pdokey)
     }
 
-    # If pdokey is custom
+    # If pdokey is custom - get custom DSN via system db, if not empty
     if pdokey == 'custom':
-
-        # Connect to system db
-        db_conn, db = db_system()
-
-        # Get custom DSN, if not empty
-        if custom_dsn := get_custom_dsn(db):
-            info = custom_dsn
-
-        # Close system db cursor and connection
-        db.close()
-        db_conn.close()
+        with db_system() as db:
+            if custom_dsn := get_custom_dsn(db):
+                info = custom_dsn
+                info.setdefault('schema', 'public' if info['engine'] == 'postgres' else info['name'])
 
     # Setup dump executable binary name
     if info['engine'] == 'postgres':  info['dump'] = 'pg_dump'
@@ -145,8 +218,8 @@ def get_pdokey_dsn(pdokey: str):
     # Return custom or default DSN
     return info
 
-# Get table dump via pg_dump
-def get_table_dump(name):
+# Split table name given as 'pdokey.table' or just 'table' into pdokey and table, with 'custom' as default pdokey
+def parse_table_name(name):
 
     # Split into pdokey and table
     if '.' in name:
@@ -159,14 +232,29 @@ def get_table_dump(name):
     # Check table name
     if not valid_pg_identifier(table): raise ValueError(f"Invalid table name: {table}")
 
+    # Return pdokey and table
+    return pdokey, table
+
+# Get table dump via pg_dump. Any extra arguments are passed to get_schema_dump()
+def get_table_dump(name, **kwargs):
+
     # Get dump of a table in pdokey's schema
-    return get_schema_dump(pdokey, table)
+    return get_schema_dump(*parse_table_name(name), **kwargs)
+
+# Max bytes of dump output to be read and sent at once, when streaming
+dump_chunk_size = 65536
 
-# Get table dump via pg_dump
-def get_schema_dump(pdokey, table=None):
+# Get table dump via pg_dump. If stream-arg is true - generator of dump chunks is returned,
+# which are gzip-compressed if compress-arg is true as well. If dsn-arg is given - it's used instead of pdokey's one.
+# If native-arg is true - DDL is built from catalog queries over db connection instead of spawning dump tool
+def get_schema_dump(pdokey, table=None, stream=False, compress=False, dsn=None, native=False):
 
     # Get DSN for given pdokey
-    dsn = get_pdokey_dsn(pdokey)
+    dsn = dsn or get_pdokey_dsn(pdokey)
+
+    # If native-arg is true - build DDL via catalog queries
+    if native:
+        with db_dsn(dsn) as db: return ddl.generate(db, dsn['engine'], dsn['schema'], [table] if table else None)
 
     # Shared args for subprocess.run()
     runArgs = {
@@ -190,8 +278,11 @@ def get_schema_dump(pdokey, table=None):
         if table: cli.append(table)
         cli.extend(['--no-data', '--compact', '--skip-comments'])
 
+    # If stream-arg is true - start streaming
+    if stream: return stream_dump(cli, dsn, compress)
+
     # Run export
-    result = subprocess.run(cli, env=dsn['env'], **runArgs)
+    result = run_command(cli, env=dsn['env'], **runArgs)
 
     # If failed
     if result.returncode != 0: raise RuntimeError(f"{dsn['dump']} failed: {result.stderr}")
@@ -199,31 +290,284 @@ def get_schema_dump(pdokey, table=None):
     # Else print dump
     return result.stdout.strip()
 
-# Get connection and cursor for system db
-def db_system():
+# Run dump command and get generator of output chunks. If dump fails before any output - error is raised right away,
+# else, as response is already started, error message is appended to output and response is aborted by raising error,
+# so that client can't mistake a truncated dump for a complete one
+def stream_dump(cli, dsn, compress=False):
+
+    # Start dump, with stderr kept in a temporary file, so that it won't block dump if not read in time
+    errors = tempfile.TemporaryFile()
+    started = time.monotonic()
+    proc = subprocess.Popen(cli, env=dsn['env'], stdout=subprocess.PIPE, stderr=errors)
+
+    # Get error message
+    def failure():
+        errors.seek(0)
+        return f"{dsn['dump']} failed: {errors.read().decode('utf-8', 'replace')}"
+
+    # Read first chunk, and if there's nothing because dump failed - raise error
+    first = proc.stdout.read1(dump_chunk_size)
+    if not first and proc.wait() != 0:
+        observe_command(cli[0], started, proc.returncode)
+        message = failure()
+        proc.stdout.close()
+        errors.close()
+        raise RuntimeError(message)
+
+    # Generator
+    def chunks():
+        gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        try:
 
-    # Instantiate connection with db cursor
+            # Yield output as it goes
+            chunk = first
+            while chunk:
+                if gzip: chunk = gzip.compress(chunk)
+                if chunk: yield chunk
+                chunk = proc.stdout.read1(dump_chunk_size)
+
+            # If dump failed - append error message and abort response
+            if proc.wait() != 0:
+                message = failure()
+                yield gzip.compress(f"\n-- {message}".encode()) + gzip.flush() if gzip else f"\n-- {message}".encode()
+                raise RuntimeError(message)
+
+            # Flush compressed remainder
+            if gzip: yield gzip.flush()
+
+        # Make sure dump is not left running if client disconnected
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            observe_command(cli[0], started, proc.returncode)
+            proc.stdout.close()
+            errors.close()
+
+    # Return generator
+    return chunks()
+
+# Prepare streamed response for a dump. Output is gzip-compressed if client accepts that
+def dump_response(get_dump, *args):
+    compress = 'gzip' in request.headers.get('Accept-Encoding', '')
+    headers = {'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'} if compress else {}
+    return Response(get_dump(*args, stream=True, compress=compress), 200, headers, mimetype='text/plain')
+
+# Connect to system db
+def db_connect():
     if engine == 'postgres':
         db_conn = psycopg2.connect(host=engine, user=db_user, password=db_pass, dbname=db_name)
         db_conn.autocommit = True
-        db = db_conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
     else:
         db_conn = pymysql.connect(host=engine, user=db_user, password=db_pass, database='system', autocommit=True)
-        db = db_conn.cursor(pymysql.cursors.DictCursor)
+    return db_conn
 
-    # Return
-    return db_conn, db
+# Check whether system db connection is still usable
+def db_alive(db_conn):
+    try:
+        if engine == 'postgres':
+            if db_conn.closed: return False
+            with db_conn.cursor() as db: db.execute('SELECT 1')
+        else:
+            db_conn.ping(reconnect=False)
+        return True
+    except Exception:
+        return False
+
+# Check whether rabbitmq connection is still usable, and process heartbeats missed while it was idle
+def mq_alive(nn):
+    try:
+        nn.process_data_events(time_limit=0)
+        return nn.is_open
+    except Exception:
+        return False
+
+# Connect to rabbitmq, counting connections to see how often broken ones are replaced
+def mq_connect():
+    nn = pika.BlockingConnection(pika.ConnectionParameters('rabbitmq'))
+    metrics.inc('wrapper_mq_connects_total')
+    return nn
+
+# Process-wide pools of system db and rabbitmq connections
+db_pool = Pool(db_connect, db_alive, lambda db_conn: db_conn.close(), int(get_dot_env('DB_POOL_SIZE') or 10))
+mq_pool = Pool(mq_connect, mq_alive, lambda nn: nn.close(), int(get_dot_env('MQ_POOL_SIZE') or 10))
+
+# Get cursor for system db, using pooled connection
+@contextmanager
+def db_system():
+    with db_pool.connection() as db_conn:
+        if engine == 'postgres':
+            db = db_conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        else:
+            db = db_conn.cursor(pymysql.cursors.DictCursor)
+        try:
+            yield db
+        finally:
+            db.close()
+
+# Get cursor for the database specified by DSN-info, using pooled system db connection if it's the default DSN
+@contextmanager
+def db_dsn(dsn):
+
+    # If it's the default DSN - use pooled connection
+    if (dsn['engine'], dsn['host'], dsn['user'], dsn['name']) == (engine, engine, db_user, db_name):
+        with db_system() as db: yield db
+        return
+
+    # Else connect to the custom database
+    if dsn['engine'] == 'postgres':
+        db_conn = psycopg2.connect(host=dsn['host'], port=dsn.get('port') or 5432, user=dsn['user'], password=dsn['pass'], dbname=dsn['name'])
+        db = db_conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    else:
+        db_conn = pymysql.connect(host=dsn['host'], port=int(dsn.get('port') or 3306), user=dsn['user'], password=dsn['pass'], database=dsn['name'])
+        db = db_conn.cursor(pymysql.cursors.DictCursor)
+    try:
+        yield db
+    finally:
+        db_conn.close()
 
-# Send websocket message to open xterm in Indi Engine UI
-def ws(to, data, mq, db):
+# Catalog queries giving schema fingerprint for each of given tables, which changes on any change of table's
+# definition, i.e. columns, defaults, constraints, indexes, triggers or comments. For postgres, xmin of catalog rows
+# is used, as it changes each time a row is updated, and for mysql-family - checksum over information_schema.
+# MySQL 8 and Percona cache dynamic columns like AUTO_INCREMENT of information_schema.TABLES for a day by default,
+# so caching is disabled for the session before the query, while MariaDB has no such cache and no such variable
+table_fingerprints = {
+    'postgres': """
+        SELECT c.relname AS "table", md5(concat_ws('|', c.oid, c.xmin,
+            (SELECT string_agg(a.xmin::text, ',' ORDER BY a.attnum) FROM pg_attribute a WHERE a.attrelid = c.oid),
+            (SELECT string_agg(d.xmin::text, ',' ORDER BY d.oid) FROM pg_attrdef d WHERE d.adrelid = c.oid),
+            (SELECT string_agg(x.xmin::text, ',' ORDER BY x.oid) FROM pg_constraint x WHERE x.conrelid = c.oid),
+            (SELECT string_agg(i.xmin::text || '.' || ic.xmin::text, ',' ORDER BY i.indexrelid) FROM pg_index i JOIN pg_class ic ON ic.oid = i.indexrelid WHERE i.indrelid = c.oid),
+            (SELECT string_agg(t.xmin::text, ',' ORDER BY t.oid) FROM pg_trigger t WHERE t.tgrelid = c.oid),
+            (SELECT string_agg(e.xmin::text, ',' ORDER BY e.objsubid) FROM pg_description e WHERE e.objoid = c.oid)
+        )) AS "fingerprint"
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = ANY(%s)
+    """,
+    'mysql': """
+        SELECT t.TABLE_NAME AS `table`, MD5(CONCAT_WS('|', t.CREATE_TIME, t.ENGINE, t.TABLE_COLLATION, t.TABLE_COMMENT, t.AUTO_INCREMENT,
+            (SELECT GROUP_CONCAT(CONCAT_WS(',', c.COLUMN_NAME, c.COLUMN_TYPE, c.IS_NULLABLE, c.COLUMN_DEFAULT, c.EXTRA, c.COLLATION_NAME, c.COLUMN_COMMENT)
+                ORDER BY c.ORDINAL_POSITION SEPARATOR ';') FROM information_schema.COLUMNS c WHERE c.TABLE_SCHEMA = t.TABLE_SCHEMA AND c.TABLE_NAME = t.TABLE_NAME),
+            (SELECT GROUP_CONCAT(CONCAT_WS(',', s.INDEX_NAME, s.SEQ_IN_INDEX, s.COLUMN_NAME, s.NON_UNIQUE, s.SUB_PART, s.INDEX_TYPE)
+                ORDER BY s.INDEX_NAME, s.SEQ_IN_INDEX SEPARATOR ';') FROM information_schema.STATISTICS s WHERE s.TABLE_SCHEMA = t.TABLE_SCHEMA AND s.TABLE_NAME = t.TABLE_NAME),
+            (SELECT GROUP_CONCAT(CONCAT_WS(',', k.CONSTRAINT_NAME, k.COLUMN_NAME, k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME)
+                ORDER BY k.CONSTRAINT_NAME, k.ORDINAL_POSITION SEPARATOR ';') FROM information_schema.KEY_COLUMN_USAGE k WHERE k.TABLE_SCHEMA = t.TABLE_SCHEMA AND k.TABLE_NAME = t.TABLE_NAME),
+            (SELECT GROUP_CONCAT(CONCAT_WS(',', r.CONSTRAINT_NAME, r.UPDATE_RULE, r.DELETE_RULE)
+                ORDER BY r.CONSTRAINT_NAME SEPARATOR ';') FROM information_schema.REFERENTIAL_CONSTRAINTS r WHERE r.CONSTRAINT_SCHEMA = t.TABLE_SCHEMA AND r.TABLE_NAME = t.TABLE_NAME),
+            (SELECT GROUP_CONCAT(CONCAT_WS(',', g.TRIGGER_NAME, g.CREATED, g.ACTION_STATEMENT)
+                ORDER BY g.TRIGGER_NAME SEPARATOR ';') FROM information_schema.TRIGGERS g WHERE g.EVENT_OBJECT_SCHEMA = t.TABLE_SCHEMA AND g.EVENT_OBJECT_TABLE = t.TABLE_NAME)
+        )) AS `fingerprint`
+        FROM information_schema.TABLES t
+        WHERE t.TABLE_SCHEMA = %s AND t.TABLE_NAME IN %s
+    """
+}
+
+# Get [table => fingerprint] pairs for given tables in the schema specified by DSN-info
+def get_table_fingerprints(dsn, tables):
+    with db_dsn(dsn) as db:
+        if dsn['engine'] == 'postgres': db.execute(table_fingerprints['postgres'], (dsn['schema'], list(tables)))
+        else:
+            if dsn['engine'] != 'mariadb': db.execute('SET SESSION information_schema_stats_expiry = 0')
+            db.execute(table_fingerprints['mysql'], (dsn['schema'], tuple(tables)))
+        return {row['table']: row['fingerprint'] for row in db.fetchall()}
+
+# Cached table dumps, as [(host, database, schema, table, native) => (fingerprint, dump)] pairs, least recently used first
+dump_cache = collections.OrderedDict()
+dump_cache_size = 1000
+dump_cache_lock = threading.Lock()
+
+# Threads to dump tables in parallel
+export_threads = ThreadPoolExecutor(int(get_dot_env('EXPORT_WORKERS') or 4), thread_name_prefix='export')
+
+# Get dumps for given table names, as [name => dump] pairs, and failures, if any, as [name => message] pairs.
+# Tables are dumped in parallel, and dumps are cached until table's schema fingerprint is changed.
+# If native-arg is true - DDL is built from catalog queries instead of spawning dump tool
+def get_table_dumps(names, native=False):
+    dumps, errors, tables = {}, {}, {}
+
+    # Group table names by pdokey
+    for name in dict.fromkeys(names):
+        try:
+            pdokey, table = parse_table_name(name)
+            tables.setdefault(pdokey, {})[table] = name
+        except ValueError as e:
+            errors[name] = str(e)
+
+    # Dump tables, having DSN resolved once per pdokey
+    futures = {}
+    for pdokey, group in tables.items():
+        dsn = get_pdokey_dsn(pdokey)
+        fingerprints = get_table_fingerprints(dsn, group.keys())
+        for table, name in group.items():
+
+            # If table's schema was not changed since cached dump - use cached dump
+            key = (dsn['host'], dsn['name'], dsn['schema'], table, native)
+            with dump_cache_lock:
+                if (cached := dump_cache.get(key)) and cached[0] == fingerprints.get(table):
+                    dump_cache.move_to_end(key)
+                    dumps[name] = cached[1]
+                    continue
+
+            # Else start dump
+            futures[name] = (key, fingerprints.get(table), export_threads.submit(get_schema_dump, pdokey, table, dsn=dsn, native=native))
+
+    # Collect dumps and cache those of tables having fingerprint
+    for name, (key, fingerprint, future) in futures.items():
+        try:
+            dumps[name] = future.result()
+        except Exception as e:
+            errors[name] = str(e)
+            continue
+        if fingerprint:
+            with dump_cache_lock:
+                dump_cache[key] = (fingerprint, dumps[name])
+                dump_cache.move_to_end(key)
+                while len(dump_cache) > dump_cache_size: dump_cache.popitem(last=False)
+
+    # Return dumps and errors
+    return dumps, errors
+
+# Cache of [(roleId, adminId, token) => (resolved token, expiry time)] pairs, least recently used first
+recipients = collections.OrderedDict()
+recipients_size = 1000
+recipients_lock = threading.Lock()
+
+# Seconds during which resolved recipient token is trusted without re-checking
+recipients_ttl = 300
+
+# Get cache key for a recipient, normalized so that ids given as numbers or as strings give the same key
+def recipient_key(to):
+    return (str(to.get('roleId')), str(to.get('adminId')), to['token'])
+
+# Get cached resolved token for a given key, or None if not cached or expired
+def cached_recipient(key):
+    with recipients_lock:
+        if (cached := recipients.get(key)) and cached[1] > time.monotonic():
+            recipients.move_to_end(key)
+            return cached[0]
+    return None
+
+# Cache resolved token of a recipient under given keys, i.e. the ones before and after resolving, as further
+# messages of the same stream are sent to the recipient having the token already resolved
+def cache_recipient(keys, token):
+    with recipients_lock:
+        for key in keys:
+            recipients[key] = (token, time.monotonic() + recipients_ttl)
+            recipients.move_to_end(key)
+        while len(recipients) > recipients_size: recipients.popitem(last=False)
+
+# Remove recipient from cache under given keys
+def forget_recipient(keys):
+    with recipients_lock:
+        for key in keys: recipients.pop(key, None)
+
+# Resolve recipient token: check whether queue for the given token still exists, and if no - pick
+# token of another browser tab opened by the same user, if any. Return rabbitmq channel (existing or new)
+def resolve_recipient(to, mq, db):
 
     # Queue name prefix
     prefix = f'indi-engine.{db_name}.opentab--'
 
-    # If title-prop exist in data - save for later reuse
-    if 'title' in data:
-        ws.title = data['title']
-
     # Set up initial value for refresh flag
     if to['token']:
         exists, mq = queue_exists(mq, prefix + to['token'])
@@ -247,47 +591,116 @@ def ws(to, data, mq, db):
         if db.rowcount:
             to['token'] = db.fetchone()['token']
 
+    # Return rabbitmq channel (existing or new)
+    return mq
+
+# Send websocket message to open xterm in Indi Engine UI. Recipient token is resolved via cache,
+# which is invalidated when message turns out to be unroutable, e.g. user closed the browser tab.
+# If resolve-arg is False - recipient is assumed to be already resolved, so cache is not even checked
+def ws(to, data, mq, db, resolve=True):
+
+    # Queue name prefix
+    prefix = f'indi-engine.{db_name}.opentab--'
+
+    # If title-prop exist in data - save for later reuse
+    if 'title' in data:
+        ws.title = data['title']
+
+    # Cache key
+    key = recipient_key(to)
+
+    # Resolve recipient token using cache, if possible
+    if resolve:
+        if (cached := cached_recipient(key)) is not None:
+            to['token'] = cached
+        else:
+            mq = resolve_recipient(to, mq, db)
+            cache_recipient({key, recipient_key(to)}, to['token'])
+
     # Append title
     if 'title' not in data:
         data['title'] = ws.title
 
-    # Send message
-    mq.basic_publish(
-        exchange = '',
-        routing_key = prefix + to['token'],
-        body = json.dumps(data)
-    )
+    # Send message, and if it was returned as unroutable - invalidate cache, resolve recipient
+    # token from scratch and try once again. If still unroutable - there is no tab to send to
+    try:
+        mq.basic_publish(exchange='', routing_key=prefix + (to['token'] or ''), body=json.dumps(data), mandatory=True)
+    except UnroutableError:
+        forget_recipient({key, recipient_key(to)})
+        mq = resolve_recipient(to, mq, db)
+        cache_recipient({key, recipient_key(to)}, to['token'])
+        try:
+            mq.basic_publish(exchange='', routing_key=prefix + (to['token'] or ''), body=json.dumps(data), mandatory=True)
+        except UnroutableError:
+            pass
+
+    # Count sent messages
+    with stream.stats_lock: stream.stats['messages_out'] += 1
 
     # Return rabbitmq channel (existing or new)
     return mq
 
 # Spawn bash script and stream stdout/stderr to a websocket channel
+# If job-arg is given - output and exit code are also recorded there
 def bash_stream(
     command,
-    data
+    data,
+    job=None
 ):
-    # Connect to RabbitMQ
-    nn = pika.BlockingConnection(pika.ConnectionParameters('rabbitmq'))
-    mq = nn.channel()
+    # Get pooled connections to RabbitMQ and system db
+    with mq_pool.connection() as nn, db_system() as db:
+
+        # Open channel and run script
+        mq = mq_channel(nn)
+        result = bash_run(command, data, mq, db, job)
+
+        # Close channel, if it's still open
+        if result.is_open: result.close()
 
-    # Instantiate connection with system db cursor
-    db_conn, db = db_system()
+    # Return
+    return 'Executed', 200
+
+# Run bash script and stream stdout/stderr using given rabbitmq channel and system db cursor
+def bash_run(command, data, mq, db, job=None):
 
     # Start bash script in a pseudo-terminal
+    started = time.monotonic()
     child = pexpect.spawn('bash -c "' + command + '"', encoding='utf-8')
 
+    # Remember pid to make job cancellable
+    if job: job.spawned(child.pid)
+
     # Recipient definition
     to=data.get('to')
 
-    # Send websocket message to open xterm in Indi Engine UI
+    # Send websocket message to open xterm in Indi Engine UI, and resolve recipient queue
     mq = ws(to, data, mq, db)
 
+    # Send buffered output to already resolved recipient queue, and if publishing
+    # failed - open new channel and resolve recipient queue again
+    def publish(bytes):
+        nonlocal mq
+        msg = {'type': data.get('type'), 'id': data.get('id'), 'bytes': bytes}
+        try:
+            mq = ws(to, msg, mq, db, resolve=False)
+        except AMQPChannelError:
+            metrics.inc('wrapper_mq_channel_reopens_total')
+            mq = ws(to, msg, mq_channel(mq.connection), db)
+
+    # Buffer to coalesce output chunks into less messages
+    out = Coalescer(publish)
+
     # While script is running
     while True:
         try:
 
-            # Read as many bytes as written by script
-            bytes = child.read_nonblocking(size=1024, timeout=180)
+            # Read as many bytes as written by script, but wait no longer than
+            # till the moment when already buffered output should be flushed
+            try:
+                bytes = child.read_nonblocking(size=65536, timeout=out.due() if out.pending() else 180)
+            except pexpect.TIMEOUT:
+                if not out.pending(): raise
+                bytes = ''
 
             # If script has finished and no bytes were read
             # (maybe just before the PTY fully closed),
@@ -295,19 +708,22 @@ def bash_stream(
             if not bytes and not child.isalive():
                 break
 
-            # Send websocket message to open xterm in Indi Engine UI
-            mq = ws(to, {
-                'type': data.get('type'),
-                'id': data.get('id'),
-                'bytes': bytes
-            }, mq, db)
+            # Buffer output and flush if it's time to
+            out.write(bytes)
+            if job: job.write(bytes)
+            if out.pending() and out.due() == 0: out.flush()
 
         # If pexpect is SURE the script is done and the PTY is closed - break the loop
         except pexpect.EOF:
             break
 
-    # Close script process
+    # Flush remaining output and close script process
+    out.flush()
     child.close()
+    observe_command('bash', started, child.exitstatus if child.signalstatus is None else -child.signalstatus)
+
+    # Pass exit code to job, if any
+    if job: job.exit_code = child.exitstatus if child.signalstatus is None else -child.signalstatus
 
     # Indicate all done, if all done
     if child.exitstatus == 0 and child.signalstatus is None:
@@ -341,15 +757,45 @@ def bash_stream(
     ):
         mq = ws(to, {'type': 'restored'}, mq, db)
 
-    # Clone rabbitmq connection
-    nn.close()
+    # Return rabbitmq channel (existing or new)
+    return mq
 
-    # Close db cursor and connection
-    db.close()
-    db_conn.close()
+# Run bash script as a background job and return job id immediately. Backup, restore and update
+# jobs are never run simultaneously. If wait-param is given - respond once job is finished
+def bash_job(kind, command, data):
 
-    # Return
-    return 'Executed', 200
+    # Run script, and reset cached repo metadata and releases lists as script might have changed them
+    def run(job):
+        started = time.monotonic()
+        try:
+            bash_stream(command, data, job)
+        finally:
+            repo_info.invalidate()
+            release_cache.invalidate()
+            status = 'ok' if job.exit_code == 0 else 'failed'
+            metrics.observe('wrapper_job_duration_seconds', time.monotonic() - started, kind=kind, status=status)
+
+    # Submit job
+    job = jobs.submit(jobs.Job(kind), run, 'maintenance')
+
+    # If wait-param is given - wait for the job to finish
+    if request.args.get('wait'):
+        job.done.wait()
+        return 'Executed', 200
+
+    # Return job id
+    return jsonify({'success': True, 'job': job.id}), 202
+
+# Setup job worker threads
+jobs.start(int(get_dot_env('JOB_WORKERS') or 4))
+
+# Setup thread saving metrics of the current worker process, to be summed up with other workers' ones
+metrics.start()
+
+# Expose metrics of all worker processes, and durations of backup/restore phases, in Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), 200, mimetype='text/plain; version=0.0.4')
 
 # Add backup endpoint
 @app.route('/backup', methods=['POST'])
@@ -372,21 +818,21 @@ def backup():
     if data.get('repo'): command = f"REPO={shlex.quote(data.get('repo'))} {command}"
 
     # Run bash script and stream stdout/stderr
-    return bash_stream(command, data)
+    return bash_job('backup', command, data)
 
 # Get restore status
 @app.route('/restore/status', methods=['GET'])
 def restore_status():
 
     # Get branch
-    branch = subprocess.run(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], capture_output=True, text=True)
+    branch = run_command(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], capture_output=True, text=True)
 
     # If something went wrong - flush failure
     if branch.returncode != 0:
         return jsonify({'success': False, 'msg': branch.stderr}), 500
 
     # Get notes
-    notes = subprocess.run(['git', 'notes', 'show'], capture_output=True, text=True)
+    notes = run_command(['git', 'notes', 'show'], capture_output=True, text=True)
 
     # Chec and return json
     if (
@@ -411,26 +857,11 @@ def restore_choices():
     # Prepare choices object
     choices = {'current': {'name': get_current_repo(), 'list': []}}
 
-    # Get GH_TOKEN_CUSTOM_RW from .env
-    token = get_dot_env('GH_TOKEN_CUSTOM_RW')
-
-    # Prepare curl command
-    command = ['curl']
-    if bool(token): command += ['-H', f'Authorization: Bearer {token}']
-    command += ['-sS', '--fail-with-body', url := 'https://api.github.com/repos/' + choices['current']['name'] + '/releases?per_page=100']
-
-    # Get restore choices list for current repo
-    list = subprocess.run(command, capture_output=True, text=True)
+    # Start getting restore choices list for current repo, using GH_TOKEN_CUSTOM_RW from .env
+    current = github_threads.submit(release_cache.get, choices['current']['name'], get_dot_env('GH_TOKEN_CUSTOM_RW'))
+    parent = None
 
-    # If something went wrong - flush failure
-    if list.returncode != 0:
-        return jsonify({
-            'success': False,
-            'msg': list.stderr + url + '\n' + json.loads(list.stdout.strip())['message'].replace(". (", ".\n(")
-        }), 500
-    else: choices['current']['list'] = json.loads(list.stdout.strip())
-
-    # Try to detect parent repo
+    # Meanwhile, try to detect parent repo
     parent_repo = get_parent_repo()
 
     # If detected
@@ -439,23 +870,15 @@ def restore_choices():
         # Append 'parent'-key into choices object
         choices['parent'] = {'name': parent_repo, 'list': []}
 
-        # Get GH_TOKEN_PARENT_RO from .env
-        token = get_dot_env('GH_TOKEN_PARENT_RO')
-
-        # Prepare curl command
-        command = ['curl']
-        if bool(token): command += ['-H', f'Authorization: Bearer {token}']
-        command += ['-sS', '--fail-with-body', url := 'https://api.github.com/repos/' + choices['parent']['name'] + '/releases']
-
-        # Get restore choices list for current repo
-        list = subprocess.run(command, capture_output=True, text=True)
-
-        # If something went wrong - flush failure
-        if list.returncode != 0: return jsonify({'success': False, 'msg': list.stderr}), 500
-        else: choices['parent']['list'] = json.loads(list.stdout.strip())
+        # Start getting restore choices list for parent repo, using GH_TOKEN_PARENT_RO from .env
+        parent = github_threads.submit(release_cache.get, choices['parent']['name'], get_dot_env('GH_TOKEN_PARENT_RO'))
 
-    # Cache choices
-    with open('var/tmp/choices.json', 'w') as file: file.write(json.dumps(choices))
+    # Wait for lists
+    try:
+        choices['current']['list'] = current.result()
+        if parent: choices['parent']['list'] = parent.result()
+    except FetchError as e:
+        return jsonify({'success': False, 'msg': str(e)}), 500
 
     # Return output
     return json.dumps(choices, indent=2), 200
@@ -490,7 +913,7 @@ def restore():
         command += ' --parent'
 
     # Run bash script and stream stdout/stderr
-    return bash_stream(command, data)
+    return bash_job('restore', command, data)
 
 @app.route('/backup/status', methods=['GET'])
 def backup_status():
@@ -535,7 +958,7 @@ def update():
     if data.get('email'): command = f"GIT_COMMIT_EMAIL={shlex.quote(data.get('email'))} {command}"
 
     # Run bash script and stream stdout/stderr
-    return bash_stream(command, data)
+    return bash_job('update', command, data)
 
 @app.route('/token', methods=['GET'])
 def token():
@@ -570,14 +993,74 @@ def export_table():
     # Get the name of a table to be exported
     table = request.args.get('name')
 
+    # If native-param is given - flush DDL built from catalog queries
+    if request.args.get('native'): return get_table_dump(table, native=True), 200
+
+    # If stream-param is given - stream pg_dump output as it goes
+    if request.args.get('stream'): return dump_response(get_table_dump, table)
+
     # Flush pg_dump output for a certain table
     return get_table_dump(table), 200
 
+# Export several tables at once, given as 'names' list in json body, or as multiple 'name' params in query string
+@app.route('/export/tables', methods=['GET', 'POST'])
+def export_tables():
+
+    # Get the names of tables to be exported
+    names = (request.get_json(silent=True) or {}).get('names') or request.args.getlist('name')
+    if not names or not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        return jsonify({'success': False, 'msg': 'Table names are required'}), 400
+
+    # Flush [name => dump] pairs, and [name => error message] pairs for tables that failed to be dumped
+    dumps, errors = get_table_dumps(names, bool(request.args.get('native')))
+    return jsonify({'success': not errors, 'tables': dumps, 'errors': errors}), 200
+
 @app.route('/export/schema', methods=['GET'])
 def export_schema():
 
     # Get the name of a pdokey whose schema is going to be exported
     pdokey = request.args.get('pdokey')
 
+    # If native-param is given - flush DDL built from catalog queries
+    if request.args.get('native'): return get_schema_dump(pdokey, native=True), 200
+
+    # If stream-param is given - stream dump as it goes
+    if request.args.get('stream'): return dump_response(get_schema_dump, pdokey)
+
     # Flush dump for a schema mapped to a given pdokey
-    return get_schema_dump(pdokey), 200
\ No newline at end of file
+    return get_schema_dump(pdokey), 200
+
+# Get job status and output. If offset-param is given - output starting from that byte offset
+# is returned, so that UI can resume the stream, else most recent output is returned
+@app.route('/jobs/<id>', methods=['GET'])
+def job_status(id):
+
+    # If no such job - flush failure
+    state = jobs.load(id)
+    if not state: return jsonify({'success': False, 'msg': 'Job not found'}), 404
+
+    # Check offset, if given
+    offset = request.args.get('offset') or '0'
+    if not (offset.isascii() and offset.isdigit()): return jsonify({'success': False, 'msg': 'Invalid offset'}), 400
+
+    # Get output. If output file is missing, e.g. as job files were removed meanwhile - flush failure
+    try:
+        if 'offset' in request.args:
+            output, offset = jobs.read(id, int(offset))
+        else:
+            output, offset = jobs.tail(id), None
+    except FileNotFoundError:
+        return jsonify({'success': False, 'msg': 'Job not found'}), 404
+
+    # Return state and output
+    return jsonify({'success': True, **state, 'output': output, 'offset': offset}), 200
+
+# Cancel job
+@app.route('/jobs/<id>', methods=['DELETE'])
+def job_cancel(id):
+
+    # If no such job or it's already finished - flush failure
+    if not jobs.cancel(id): return jsonify({'success': False, 'msg': 'Job not found or already finished'}), 404
+
+    # Return success
+    return jsonify({'success': True}), 200
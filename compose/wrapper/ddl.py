@@ -0,0 +1,291 @@
+import re
+
+# Postgres catalog queries. Table is given by oid, and identifiers are quoted by postgres itself
+pg_queries = {
+    'tables': """
+        SELECT c.oid, c.relname AS "name", quote_ident(n.nspname) || '.' || quote_ident(c.relname) AS "qualified",
+               c.relkind AS "kind", obj_description(c.oid, 'pg_class') AS "comment",
+               CASE WHEN c.relkind = 'p' THEN pg_get_partkeydef(c.oid) END AS "partkey",
+               CASE WHEN c.relispartition THEN pg_get_expr(c.relpartbound, c.oid) END AS "bound",
+               h.inhparent AS "parent_oid", quote_ident(pn.nspname) || '.' || quote_ident(p.relname) AS "parent"
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_inherits h ON c.relispartition AND h.inhrelid = c.oid
+        LEFT JOIN pg_class p ON p.oid = h.inhparent
+        LEFT JOIN pg_namespace pn ON pn.oid = p.relnamespace
+        WHERE n.nspname = %s AND c.relkind IN ('r', 'p') AND (%s::name[] IS NULL OR c.relname = ANY(%s::name[]))
+        ORDER BY c.relname
+    """,
+    'columns': """
+        SELECT quote_ident(a.attname) AS "name", format_type(a.atttypid, a.atttypmod) AS "type", a.attnotnull AS "notnull",
+               a.attidentity AS "identity", a.attgenerated AS "generated", pg_get_expr(d.adbin, d.adrelid) AS "default",
+               col_description(a.attrelid, a.attnum) AS "comment",
+               CASE WHEN a.attcollation <> t.typcollation THEN (
+                   SELECT quote_ident(cn.nspname) || '.' || quote_ident(co.collname)
+                   FROM pg_collation co JOIN pg_namespace cn ON cn.oid = co.collnamespace WHERE co.oid = a.attcollation
+               ) END AS "collation"
+        FROM pg_attribute a
+        JOIN pg_type t ON t.oid = a.atttypid
+        LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+        WHERE a.attrelid = %s AND a.attnum > 0 AND NOT a.attisdropped
+        ORDER BY a.attnum
+    """,
+    'sequences': """
+        SELECT quote_ident(sn.nspname) || '.' || quote_ident(s.relname) AS "name", format_type(q.seqtypid, NULL) AS "type",
+               q.seqstart AS "start", q.seqincrement AS "increment", q.seqmin AS "min", q.seqmax AS "max",
+               q.seqcache AS "cache", q.seqcycle AS "cycle", quote_ident(a.attname) AS "column"
+        FROM pg_depend d
+        JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+        JOIN pg_namespace sn ON sn.oid = s.relnamespace
+        JOIN pg_sequence q ON q.seqrelid = s.oid
+        JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+        WHERE d.classid = 'pg_class'::regclass AND d.refobjid = %s AND d.deptype = 'a'
+        ORDER BY s.relname
+    """,
+    'constraints': """
+        SELECT quote_ident(conname) AS "name", contype AS "type", pg_get_constraintdef(oid) AS "definition",
+               convalidated AS "valid", conislocal AS "local"
+        FROM pg_constraint
+        WHERE conrelid = %s AND contype IN ('p', 'u', 'c', 'x', 'f') AND NOT (contype = 'f' AND conparentid <> 0)
+        ORDER BY contype = 'f', conname
+    """,
+    'indexes': """
+        SELECT pg_get_indexdef(i.indexrelid) AS "definition"
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s AND NOT EXISTS (SELECT 1 FROM pg_constraint x WHERE x.conindid = i.indexrelid AND x.conrelid = i.indrelid)
+        ORDER BY c.relname
+    """,
+    'attached_indexes': """
+        SELECT quote_ident(pn.nspname) || '.' || quote_ident(pc.relname) AS "parent", pi.indrelid AS "parent_table",
+               quote_ident(cn.nspname) || '.' || quote_ident(cc.relname) AS "child"
+        FROM pg_index i
+        JOIN pg_class cc ON cc.oid = i.indexrelid JOIN pg_namespace cn ON cn.oid = cc.relnamespace
+        JOIN pg_inherits h ON h.inhrelid = i.indexrelid
+        JOIN pg_index pi ON pi.indexrelid = h.inhparent
+        JOIN pg_class pc ON pc.oid = h.inhparent JOIN pg_namespace pn ON pn.oid = pc.relnamespace
+        WHERE i.indrelid = %s
+        ORDER BY cc.relname
+    """,
+    'triggers': """
+        SELECT pg_get_triggerdef(oid) AS "definition" FROM pg_trigger WHERE tgrelid = %s AND NOT tgisinternal AND tgparentid = 0 ORDER BY tgname
+    """,
+    'header': """
+        SELECT current_setting('server_version') AS "version", current_setting('server_version_num')::int AS "version_num",
+               pg_client_encoding() AS "encoding"
+    """
+}
+
+# Get DDL for tables in a given schema, built from catalog queries rather than by spawning pg_dump or mysqldump.
+# If tables-arg is given - only those tables are included, else all tables in schema. Output is in the same form
+# and order as pg_dump --schema-only or mysqldump --no-data --compact does, so that it can be applied as is.
+# Given db should be a cursor returning rows as dicts
+def generate(db, engine, schema, tables=None):
+    if engine != 'postgres': return mysql_ddl(db, schema, tables)
+
+    # Postgres catalog functions like pg_get_expr() or format_type() qualify names only if those are not visible via
+    # search_path, so it's emptied, same as pg_dump does and as the header sets it, and restored afterwards, as the
+    # connection can be a pooled one. If failed within a transaction - it's rolled back so that restoring is possible
+    db.execute("SELECT current_setting('search_path') AS \"path\"")
+    path = db.fetchone()['path']
+    db.execute("SELECT set_config('search_path', '', false)")
+    try:
+        return pg_ddl(db, schema, tables)
+    except Exception:
+        if not db.connection.autocommit: db.connection.rollback()
+        raise
+    finally:
+        db.execute("SELECT set_config('search_path', %s, false)", (path,))
+
+# Quote string literal for postgres
+def pg_literal(value):
+    return "'" + value.replace("'", "''") + "'"
+
+# Get header setting up the session same as pg_dump does, depending on server version
+def pg_header(db):
+    db.execute(pg_queries['header'])
+    server = db.fetchone()
+    lines = [
+        "--\n-- PostgreSQL database dump\n--\n",
+        f"-- Dumped from database version {server['version']}\n",
+        "SET statement_timeout = 0;",
+        "SET lock_timeout = 0;"
+    ]
+    if server['version_num'] >= 90600: lines.append("SET idle_in_transaction_session_timeout = 0;")
+    if server['version_num'] >= 170000: lines.append("SET transaction_timeout = 0;")
+    lines += [
+        f"SET client_encoding = {pg_literal(server['encoding'])};",
+        "SET standard_conforming_strings = on;",
+        "SELECT pg_catalog.set_config('search_path', '', false);",
+        "SET check_function_bodies = false;",
+        "SET xmloption = content;",
+        "SET client_min_messages = warning;",
+        "SET row_security = off;\n",
+        "SET default_tablespace = '';\n"
+    ]
+    if server['version_num'] >= 120000: lines.append("SET default_table_access_method = heap;")
+    return "\n".join(lines)
+
+# Get DDL for postgres tables. Partitioned tables are created with their partition keys, and partitions are created
+# as standalone tables attached to their parents afterwards, along with their indexes, as pg_dump does. Partitions
+# have inherited CHECK constraints inline, as ATTACH PARTITION requires partition to have them already
+def pg_ddl(db, schema, tables=None):
+
+    # Sections of output
+    sections = {'tables': [], 'attach': [], 'constraints': [], 'indexes': [], 'attach_indexes': [],
+                'triggers': [], 'foreign': [], 'comments': []}
+
+    # Tables' oids, and partitions and indexes to be attached if their parents are in output as well
+    oids, attach, attach_indexes = set(), [], []
+
+    # Get tables
+    db.execute(pg_queries['tables'], (schema, tables, tables))
+    for table in db.fetchall():
+        oid, name = table['oid'], table['qualified']
+        oids.add(oid)
+
+        # Sequences owned by serial columns
+        db.execute(pg_queries['sequences'], (oid,))
+        sequences = db.fetchall()
+        for seq in sequences:
+            sections['tables'].append(
+                f"CREATE SEQUENCE {seq['name']}\n    AS {seq['type']}\n    START WITH {seq['start']}\n"
+                f"    INCREMENT BY {seq['increment']}\n    MINVALUE {seq['min']}\n    MAXVALUE {seq['max']}\n"
+                f"    CACHE {seq['cache']}{chr(10) + '    CYCLE' if seq['cycle'] else ''};"
+            )
+
+        # Columns
+        db.execute(pg_queries['columns'], (oid,))
+        lines, comments = [], []
+        for column in db.fetchall():
+            line = f"    {column['name']} {column['type']}"
+            if column['collation']: line += f" COLLATE {column['collation']}"
+            if column['generated'] == 's': line += f" GENERATED ALWAYS AS ({column['default']}) STORED"
+            elif column['default'] is not None: line += f" DEFAULT {column['default']}"
+            if column['notnull']: line += " NOT NULL"
+            if column['identity']:
+                line += f" GENERATED {'ALWAYS' if column['identity'] == 'a' else 'BY DEFAULT'} AS IDENTITY"
+            lines.append(line)
+            if column['comment'] is not None:
+                comments.append(f"COMMENT ON COLUMN {name}.{column['name']} IS {pg_literal(column['comment'])};")
+
+        # Constraints. Valid CHECK constraints are inline, same as pg_dump does, and foreign keys are kept separately
+        # to be added after all tables. Foreign keys of partitioned tables are added without ONLY, so that those
+        # are propagated to partitions, as foreign keys cloned to partitions are not in output
+        db.execute(pg_queries['constraints'], (oid,))
+        for constraint in db.fetchall():
+            if constraint['type'] == 'c' and constraint['valid'] and (constraint['local'] or table['bound'] is not None):
+                lines.append(f"    CONSTRAINT {constraint['name']} {constraint['definition']}")
+            elif constraint['type'] == 'f':
+                sections['foreign'].append(f"ALTER TABLE {'' if table['kind'] == 'p' else 'ONLY '}{name}\n"
+                                           f"    ADD CONSTRAINT {constraint['name']} {constraint['definition']};")
+            elif constraint['type'] != 'c' or constraint['local']:
+                sections['constraints'].append(f"ALTER TABLE ONLY {name}\n    ADD CONSTRAINT {constraint['name']} {constraint['definition']};")
+
+        # Table itself, with partition key if it's a partitioned table, and partition bound if it's a partition
+        partkey = f"\nPARTITION BY {table['partkey']}" if table['partkey'] else ""
+        sections['tables'].append(f"CREATE TABLE {name} (\n" + ",\n".join(lines) + f"\n){partkey};")
+        if table['bound'] is not None:
+            attach.append((table['parent_oid'], f"ALTER TABLE ONLY {table['parent']} ATTACH PARTITION {name} {table['bound']};"))
+
+        # Sequence ownership
+        for seq in sequences:
+            sections['tables'].append(f"ALTER SEQUENCE {seq['name']} OWNED BY {name}.{seq['column']};")
+
+        # Table comment, followed by column comments
+        if table['comment'] is not None:
+            comments.insert(0, f"COMMENT ON TABLE {name} IS {pg_literal(table['comment'])};")
+        sections['comments'] += comments
+
+        # Indexes not backing constraints, and indexes to be attached to indexes of parent table
+        db.execute(pg_queries['indexes'], (oid,))
+        sections['indexes'] += [f"{index['definition']};" for index in db.fetchall()]
+        db.execute(pg_queries['attached_indexes'], (oid,))
+        attach_indexes += [(index['parent_table'], f"ALTER INDEX {index['parent']} ATTACH PARTITION {index['child']};") for index in db.fetchall()]
+
+        # Triggers, except the ones cloned from partitioned table
+        db.execute(pg_queries['triggers'], (oid,))
+        sections['triggers'] += [f"{trigger['definition']};" for trigger in db.fetchall()]
+
+    # Attach partitions and their indexes, if parents are in output
+    sections['attach'] = [statement for parent, statement in attach if parent in oids]
+    sections['attach_indexes'] = [statement for parent, statement in attach_indexes if parent in oids]
+
+    # Join header and sections
+    statements = [pg_header(db)] + [statement for section in sections.values() for statement in section]
+    return "\n\n".join(statements) + "\n\n--\n-- PostgreSQL database dump complete\n--"
+
+# Quote identifier for mysql
+def mysql_ident(name):
+    return '`' + name.replace('`', '``') + '`'
+
+# Wrap DEFINER clause of CREATE VIEW or CREATE TRIGGER statement into version-specific comments, as mysqldump does
+definer_clause = re.compile(r'^CREATE (ALGORITHM=\w+ )?(DEFINER=`(?:[^`]|``)*`@`(?:[^`]|``)*`) (SQL SECURITY \w+ )?(VIEW|TRIGGER) ', re.S)
+
+# Get statements setting and restoring charset variables and sql_mode, in the form mysqldump wraps views and triggers in
+def mysql_session(version, charset, collation, sql_mode=None):
+    saved = [('@saved_cs_client', 'character_set_client', charset), ('@saved_cs_results', 'character_set_results', charset),
+             ('@saved_col_connection', 'collation_connection', collation)]
+    width, end = (25, ' */;') if version == '50001' else (21, ' */ ;')
+    setup = [f"/*!{version} SET {var:<{width}} = @@{name}{end}" for var, name, value in saved]
+    setup += [f"/*!{version} SET {name:<{width}} = {value}{end}" for var, name, value in saved]
+    restore = [f"/*!{version} SET {name:<{width}} = {var}{end}" for var, name, value in saved]
+    if sql_mode is not None:
+        setup += [f"/*!{version} SET {'@saved_sql_mode':<{width}} = @@sql_mode{end}", f"/*!{version} SET {'sql_mode':<{width}} = '{sql_mode}'{end}"]
+        restore.insert(0, f"/*!{version} SET {'sql_mode':<{width}} = @saved_sql_mode{end}")
+    return "\n".join(setup), "\n".join(restore)
+
+# Get DDL for mysql-family tables and views, in the same form as mysqldump --no-data --compact does: tables,
+# each followed by its triggers, with views being replaced by stand-in views having same columns, so that views
+# referring to other views can be created regardless of the order, and actual views created at the end
+def mysql_ddl(db, schema, tables=None):
+
+    # Get tables and views
+    if tables is None:
+        db.execute("SELECT `TABLE_NAME` AS `name` FROM `information_schema`.`TABLES` "
+                   "WHERE `TABLE_SCHEMA` = %s AND `TABLE_TYPE` IN ('BASE TABLE', 'VIEW') ORDER BY `TABLE_NAME`", (schema,))
+        tables = [row['name'] for row in db.fetchall()]
+
+    # Collect CREATE TABLE statements, each followed by triggers, and stand-ins for views
+    statements, views = [], []
+    for table in tables:
+        qualified = f"{mysql_ident(schema)}.{mysql_ident(table)}"
+        db.execute(f"SHOW CREATE TABLE {qualified}")
+        create = db.fetchone()
+
+        # If it's a view - create stand-in view, and remember actual view to be created at the end
+        if 'Create View' in create:
+            db.execute("SELECT `COLUMN_NAME` AS `name` FROM `information_schema`.`COLUMNS` "
+                       "WHERE `TABLE_SCHEMA` = %s AND `TABLE_NAME` = %s ORDER BY `ORDINAL_POSITION`", (schema, table))
+            columns = ",\n".join(f" 1 AS {mysql_ident(row['name'])}" for row in db.fetchall())
+            statements.append(f"SET @saved_cs_client     = @@character_set_client;\n/*!50503 SET character_set_client = utf8mb4 */;\n"
+                              f"/*!50001 CREATE VIEW {mysql_ident(table)} AS SELECT \n{columns}*/;\nSET character_set_client = @saved_cs_client;")
+            views.append(create)
+            continue
+
+        # Table
+        statements.append(create['Create Table'] + ';')
+
+        # Triggers, wrapped into charset and sql_mode setup, with definer in a version-specific comment
+        db.execute("SELECT `TRIGGER_NAME` AS `name` FROM `information_schema`.`TRIGGERS` "
+                   "WHERE `EVENT_OBJECT_SCHEMA` = %s AND `EVENT_OBJECT_TABLE` = %s ORDER BY `ACTION_TIMING`, `EVENT_MANIPULATION`, `ACTION_ORDER`",
+                   (schema, table))
+        for name in [row['name'] for row in db.fetchall()]:
+            db.execute(f"SHOW CREATE TRIGGER {mysql_ident(schema)}.{mysql_ident(name)}")
+            trigger = db.fetchone()
+            setup, restore = mysql_session('50003', trigger['character_set_client'], trigger['collation_connection'], trigger['sql_mode'])
+            sql = definer_clause.sub(lambda m: f"CREATE*/ /*!50017 {m.group(2)}*/ /*!50003 TRIGGER ", trigger['SQL Original Statement'])
+            statements.append(f"{setup}\nDELIMITER ;;\n/*!50003 {sql} */;;\nDELIMITER ;\n{restore}")
+
+    # Replace stand-ins with actual views
+    for view in views:
+        setup, restore = mysql_session('50001', view['character_set_client'], view['collation_connection'])
+        match = definer_clause.match(view['Create View'])
+        if match:
+            body = view['Create View'][match.end():]
+            sql = (f"/*!50001 CREATE {match.group(1) or ''}*/\n/*!50013 {match.group(2)} {match.group(3) or ''}*/\n"
+                   f"/*!50001 VIEW {body} */;")
+        else:
+            sql = f"/*!50001 {view['Create View']} */;"
+        statements.append(f"/*!50001 DROP VIEW IF EXISTS {mysql_ident(view['View'])}*/;\n{setup}\n{sql}\n{restore}")
+
+    # Join statements
+    return "\n".join(statements)
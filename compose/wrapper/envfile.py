@@ -0,0 +1,59 @@
+import os, threading
+
+# Parsed .env file, which is re-read only when file's mtime, inode or size is changed
+class DotEnv:
+
+    def __init__(self, path='.env'):
+        self.path = path
+        self.values = {}
+        self.stamp = None
+        self.lock = threading.Lock()
+        self.listeners = []
+
+    # Re-read file and notify listeners
+    def reload(self):
+        with self.lock:
+            values = {}
+            try:
+                stat = os.stat(self.path)
+                with open(self.path) as f:
+                    for line in f:
+
+                        # Skip comments and lines not looking like NAME=value
+                        if line.startswith('#') or '=' not in line: continue
+                        name, value = line.strip().split('=', 1)
+
+                        # Remove optional surrounding single or double quotes
+                        if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'':
+                            value = value[1:-1]
+
+                        # If variable is mentioned more than once - first occurrence wins
+                        values.setdefault(name, value)
+                self.stamp = (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+            except FileNotFoundError:
+                self.stamp = None
+            self.values = values
+        for listener in self.listeners: listener(self)
+
+    # Reload file if it was changed since last read
+    def refresh(self):
+        try:
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp != self.stamp or not self.values: self.reload()
+
+    # Get value of given variable, or empty string if no such variable
+    def get(self, name, default=''):
+        self.refresh()
+        return self.values.get(name, default)
+
+    # Get all variables as [name => value] pairs
+    def all(self):
+        self.refresh()
+        return dict(self.values)
+
+    # Register function to be called with this object each time file is re-read
+    def on_reload(self, listener):
+        self.listeners.append(listener)
@@ -0,0 +1,95 @@
+import json, time, random, zlib, threading, http.client
+from urllib.parse import urlsplit
+
+# Error raised when GitHub API request fails, having GitHub's message if any
+class GitHubError(Exception):
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+# GitHub API client keeping connections alive between requests, so that TLS handshake is done once per
+# host for each thread rather than once per request. Failed requests are retried with exponential backoff
+# if it's a network error, server-side error or secondary rate limit, and Retry-After header is respected
+class Client:
+
+    def __init__(self, base_url='https://api.github.com', timeout=10, retries=3, backoff=0.5, max_wait=10):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.local = threading.local()
+
+    # Get connection to a given host for the current thread, creating it if not yet exists
+    def connection(self, scheme, netloc):
+        if not hasattr(self.local, 'conns'): self.local.conns = {}
+        if (conn := self.local.conns.get((scheme, netloc))) is None:
+            cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            conn = self.local.conns[(scheme, netloc)] = cls(netloc, timeout=self.timeout)
+        return conn
+
+    # Close connection to a given host for the current thread, so that next request will open a new one
+    def disconnect(self, scheme, netloc):
+        if conn := getattr(self.local, 'conns', {}).pop((scheme, netloc), None): conn.close()
+
+    # Make request and return status, headers as [lowercased name => value] pairs, and body.
+    # Url can be either absolute, e.g. taken from Link-header, or relative to base url
+    def request(self, method, url, token='', headers=None):
+
+        # Prepare url and headers
+        if url.startswith('/'): url = self.base_url + url
+        parts = urlsplit(url)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        headers = {'Accept': 'application/vnd.github+json', 'Accept-Encoding': 'gzip', 'User-Agent': 'indi-engine-wrapper', **(headers or {})}
+        if bool(token): headers['Authorization'] = f'Bearer {token}'
+
+        # Make attempts
+        for attempt in range(self.retries + 1):
+
+            # Send request and read response
+            try:
+                conn = self.connection(parts.scheme, parts.netloc)
+                conn.request(method, path, headers=headers)
+                response = conn.getresponse()
+                status, body = response.status, response.read()
+                received = {name.lower(): value for name, value in response.getheaders()}
+
+            # If connection was dropped, e.g. kept idle for too long, or request timed out - reconnect and retry
+            except (OSError, http.client.HTTPException) as e:
+                self.disconnect(parts.scheme, parts.netloc)
+                if attempt == self.retries: raise GitHubError(f'{url}\n{e}') from e
+                if attempt > 0: time.sleep(self.delay(attempt))
+                continue
+
+            # Decompress body, if need
+            if received.get('content-encoding') == 'gzip': body = zlib.decompress(body, 31)
+
+            # If it's server-side error or rate limit - retry, unless it's primary rate limit which won't be reset soon
+            if attempt < self.retries and (status >= 500 or status == 429 or status == 403 and self.limited(received, body)):
+                wait = received.get('retry-after')
+                time.sleep(min(self.max_wait, float(wait) if wait and wait.isdigit() else self.delay(attempt)))
+                continue
+
+            # If request failed - raise error having GitHub's message
+            if status >= 400:
+                try:
+                    message = json.loads(body)['message']
+                except (ValueError, KeyError, TypeError):
+                    message = body.decode('utf-8', 'replace')
+                raise GitHubError(f'{url}\n' + message.replace('. (', '.\n('), status)
+
+            # Return response
+            return status, received, body
+
+    # Check whether 403 response means secondary rate limit, i.e. the one worth waiting for
+    def limited(self, headers, body):
+        return 'retry-after' in headers or b'secondary rate limit' in body
+
+    # Get seconds to wait before retry, growing exponentially with attempts, with jitter
+    def delay(self, attempt):
+        return self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+
+    # Make GET-request and return decoded json
+    def get_json(self, url, token=''):
+        return json.loads(self.request('GET', url, token)[2])
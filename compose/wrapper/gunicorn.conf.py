@@ -0,0 +1,22 @@
+import os
+
+# Listen on the same port as flask development server did
+bind = '0.0.0.0:80'
+
+# Worker processes, each having a pool of threads, so that long requests don't block others
+worker_class = 'gthread'
+workers = int(os.environ.get('WRAPPER_WORKERS') or 2)
+threads = int(os.environ.get('WRAPPER_THREADS') or 8)
+
+# Seconds after which a worker process that stopped notifying the master is restarted. For gthread workers
+# that's a heartbeat of the worker process, so it doesn't limit the duration of a single request, and long
+# operations are anyway run as jobs in background threads and are polled via /jobs/<id>
+timeout = int(os.environ.get('WRAPPER_TIMEOUT') or 120)
+
+# Seconds given to workers to finish on shutdown, and seconds to keep idle connection open for next request
+graceful_timeout = 30
+keepalive = 5
+
+# Log requests and errors to stdout, so they appear in container.log
+accesslog = '-'
+errorlog = '-'
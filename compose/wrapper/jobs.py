@@ -0,0 +1,224 @@
+import os, re, json, time, fcntl, signal, secrets, threading, collections
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+# Directory where jobs state and output files are kept, so that any worker process can serve them
+jobs_dir = 'var/tmp/jobs'
+
+# Max characters of most recent output kept in memory for each job
+ring_size = 65536
+
+# Days after which files of finished jobs are removed
+keep_days = 7
+
+# Jobs started by the current process, as [id => job] pairs
+running = {}
+
+# Executor for jobs, set up by start()
+executor = None
+
+# Background job, having state and output stored in files
+class Job:
+
+    def __init__(self, kind):
+
+        # Setup props
+        self.id = secrets.token_hex(8)
+        self.exit_code = None
+        self.ring = collections.deque()
+        self.ring_len = 0
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.state = {
+            'id': self.id,
+            'kind': kind,
+            'status': 'queued',
+            'created': time.time(),
+            'started': None,
+            'finished': None,
+            'exit_code': None,
+            'pid': None,
+            'owner': owner()
+        }
+
+        # Create files
+        os.makedirs(jobs_dir, exist_ok=True)
+        self.log = open(path(self.id, 'log'), 'a', encoding='utf-8')
+        self.update()
+
+    # Update state and save into file
+    def update(self, **props):
+        self.state.update(props)
+        tmp = path(self.id, 'json.tmp')
+        with open(tmp, 'w') as f: json.dump(self.state, f)
+        os.replace(tmp, path(self.id, 'json'))
+
+    # Remember pid of the spawned script to make job cancellable, and if job was cancelled before that, i.e. while
+    # cancel() could not know the pid yet - terminate the script right away
+    def spawned(self, pid):
+        self.update(pid=pid)
+        if cancelled(self.id): terminate(pid)
+
+    # Append output chunk
+    def write(self, text):
+        with self.lock:
+            self.ring.append(text)
+            self.ring_len += len(text)
+            while self.ring_len - len(self.ring[0]) >= ring_size:
+                self.ring_len -= len(self.ring.popleft())
+            self.log.write(text)
+            self.log.flush()
+
+    # Get most recent output
+    def tail(self):
+        with self.lock:
+            return ''.join(self.ring)[-ring_size:]
+
+# Get path to a job's file having given extension
+def path(id, ext):
+    return os.path.join(jobs_dir, f'{id}.{ext}')
+
+# Check job id syntax
+def valid_id(id):
+    return bool(re.fullmatch(r'[a-f0-9]{16}', id or ''))
+
+# Get identity of the current process as [pid, start time] pair, with start time taken into account so that
+# pid reused by another process after the owner has exited is not mistaken for the owner
+def owner(pid=None):
+    pid = pid or os.getpid()
+    try:
+        with open(f'/proc/{pid}/stat') as f: started = int(f.read().rsplit(')', 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        started = None
+    return [pid, started]
+
+# Check whether process that owns a job, i.e. the worker process the job was submitted to, is still running
+def owner_alive(state):
+    if not state.get('owner'): return True
+    pid, started = state['owner']
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return started is None or owner(pid)[1] in (None, started)
+
+# Get job state by id, or None if no such job. If job is not finished but the worker process running it has exited,
+# e.g. as it was restarted, reloaded or killed on timeout by gunicorn - job is marked as failed, as otherwise it
+# would be shown as queued or running forever
+def load(id):
+    if not valid_id(id): return None
+    try:
+        with open(path(id, 'json')) as f: state = json.load(f)
+    except FileNotFoundError:
+        return None
+    if not state['finished'] and state.get('owner', [None])[0] != os.getpid() and not owner_alive(state):
+        state.update(status='failed', finished=time.time())
+        with open(path(id, 'log'), 'a', encoding='utf-8') as log: log.write("\r\nJob was interrupted as worker process exited\r\n")
+        tmp = path(id, f'json.{os.getpid()}.tmp')
+        with open(tmp, 'w') as f: json.dump(state, f)
+        os.replace(tmp, path(id, 'json'))
+    return state
+
+# Get job output starting from given byte offset, and the offset to continue from
+def read(id, offset=0):
+    with open(path(id, 'log'), 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    return data.decode('utf-8', 'replace'), offset + len(data)
+
+# Get most recent output of a job, from memory if job is run by the current process, or from file otherwise
+def tail(id):
+    if id in running: return running[id].tail()
+    with open(path(id, 'log'), 'rb') as f:
+        f.seek(max(0, os.fstat(f.fileno()).st_size - ring_size))
+        return f.read().decode('utf-8', 'replace')
+
+# Terminate script process group
+def terminate(pid):
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+# Cancel job: if it's not started yet - it won't be, and if it's running - terminate the script process group
+def cancel(id):
+
+    # If no such job, or it's already finished - return false
+    state = load(id)
+    if not state or state['finished']: return False
+
+    # Create cancel-file, so the job won't start if still queued
+    open(path(id, 'cancel'), 'w').close()
+
+    # If job is running - terminate it. State is re-loaded after cancel-file is created, as the script might have
+    # been spawned meanwhile, and if its pid is still not there - the job will terminate it by itself via spawned()
+    if (state := load(id)) and state['pid']: terminate(state['pid'])
+    return True
+
+# Check whether job was cancelled
+def cancelled(id):
+    return os.path.exists(path(id, 'cancel'))
+
+# Acquire lock shared by all worker processes, so that jobs in the same group are run one after another
+@contextmanager
+def exclusive(group):
+    os.makedirs(jobs_dir, exist_ok=True)
+    with open(os.path.join(jobs_dir, f'{group}.lock'), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+# Remove files of jobs finished long ago, including temporary files left by interrupted writes, e.g. '<id>.json.tmp'
+def prune():
+    expired = time.time() - keep_days * 86400
+    for name in os.listdir(jobs_dir):
+        if re.fullmatch(r'[a-f0-9]{16}\.[\w.]+', name) and os.path.getmtime(file := os.path.join(jobs_dir, name)) < expired:
+            os.remove(file)
+
+# Setup executor with given quantity of worker threads
+def start(workers):
+    global executor
+    executor = ThreadPoolExecutor(workers, thread_name_prefix='job')
+
+# Run job in a worker thread. Given target is called with job as an argument and is expected to set job.exit_code
+# Jobs having same group are never run simultaneously, even if submitted to different worker processes
+def submit(job, target, group=None):
+
+    # Worker
+    def run():
+        try:
+            with exclusive(group) if group else nullcontext():
+
+                # If job was cancelled while queued - skip it
+                if cancelled(job.id):
+                    job.update(status='cancelled', finished=time.time())
+                    return
+
+                # Run job
+                job.update(status='running', started=time.time())
+                try:
+                    target(job)
+                except Exception as e:
+                    job.write(f"\r\n{e}\r\n")
+
+                # Update status
+                if cancelled(job.id): status = 'cancelled'
+                elif job.exit_code == 0: status = 'done'
+                else: status = 'failed'
+                job.update(status=status, finished=time.time(), exit_code=job.exit_code)
+
+        # Cleanup
+        finally:
+            job.log.close()
+            job.done.set()
+            running.pop(job.id, None)
+
+    # Remember job as run by the current process, remove outdated jobs and submit
+    running[job.id] = job
+    prune()
+    executor.submit(run)
+    return job
@@ -0,0 +1,198 @@
+import os, json, time, fcntl, bisect, threading
+import stream
+
+# Process-wide counters and histograms, exposed in Prometheus text format at /metrics endpoint. Each gunicorn worker
+# process has its own metrics, so those are periodically saved into 'var/tmp/metrics/<pid>.json' files, and metrics
+# of all live worker processes are summed up when /metrics is requested, whichever worker process handles that.
+# Durations of backup/restore phases are recorded by the scripts into 'var/tmp/phases.json', see record_phase()
+
+# Directory where each worker process keeps its metrics
+metrics_dir = 'var/tmp/metrics'
+
+# File where backup/restore scripts record durations of phases
+phases_file = 'var/tmp/phases.json'
+
+# Seconds between saving metrics of the current process into file
+save_interval = 5
+
+# Histogram buckets, in seconds: for requests and spawned commands, and for backup/restore phases
+buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+phase_buckets = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+# Metric types and descriptions
+described = {
+    'wrapper_http_request_duration_seconds': ('histogram', 'Latency of HTTP requests, per route, until response is started'),
+    'wrapper_subprocess_duration_seconds': ('histogram', 'Duration of spawned commands, e.g. dump tools, git and bash scripts'),
+    'wrapper_job_duration_seconds': ('histogram', 'Duration of backup, restore and update jobs started via API'),
+    'wrapper_ws_messages_total': ('counter', 'Websocket messages published to RabbitMQ'),
+    'wrapper_mq_connects_total': ('counter', 'RabbitMQ connections opened, including the ones replacing broken connections'),
+    'wrapper_mq_channel_reopens_total': ('counter', 'RabbitMQ channels re-opened as publishing via existing channel failed'),
+    'wrapper_stream_bytes_total': ('counter', 'Bytes of scripts output read to be streamed'),
+    'wrapper_stream_flushes_total': ('counter', 'Flushes of buffered scripts output'),
+    'wrapper_stream_flush_latency_seconds_total': ('counter', 'Seconds the scripts output was kept in buffer before flush'),
+    'wrapper_stream_flush_latency_max_seconds': ('gauge', 'Max seconds the scripts output was kept in buffer before flush'),
+    'wrapper_phase_duration_seconds': ('histogram', 'Duration of backup/restore phases, e.g. dump, upload, download and import'),
+    'wrapper_phase_last_duration_seconds': ('gauge', 'Duration of the most recent run of backup/restore phase'),
+    'wrapper_phase_last_timestamp_seconds': ('gauge', 'Unix time when the most recent run of backup/restore phase was finished')
+}
+
+# Counters as [(name, labels) => value] pairs, and histograms as [(name, labels) => [bucket counts, sum, count]]
+# pairs, where labels is a tuple of (label, value) pairs
+counters = {}
+histograms = {}
+lock = threading.Lock()
+
+# Increment counter
+def inc(name, value=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with lock: counters[key] = counters.get(key, 0) + value
+
+# Observe value in histogram
+def observe(name, value, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with lock:
+        histogram = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+        if (i := bisect.bisect_left(buckets, value)) < len(buckets): histogram[0][i] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+# Get metrics of the current process as json-serializable dict
+def snapshot():
+    with stream.stats_lock: stats = dict(stream.stats)
+    with lock:
+        return {
+            'counters': [[name, dict(labels), value] for (name, labels), value in counters.items()] + [
+                ['wrapper_ws_messages_total', {}, stats['messages_out']],
+                ['wrapper_stream_bytes_total', {}, stats['bytes_in']],
+                ['wrapper_stream_flushes_total', {}, stats['flushes']],
+                ['wrapper_stream_flush_latency_seconds_total', {}, stats['flush_latency_sum']]
+            ],
+            'gauges': [['wrapper_stream_flush_latency_max_seconds', {}, stats['flush_latency_max']]],
+            'histograms': [[name, dict(labels), list(buckets), list(h[0]), h[1], h[2]] for (name, labels), h in histograms.items()]
+        }
+
+# Save metrics of the current process into file
+def save():
+    os.makedirs(metrics_dir, exist_ok=True)
+    path = os.path.join(metrics_dir, f'{os.getpid()}.json')
+    with open(path + '.tmp', 'w') as f: json.dump(snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+# Start thread saving metrics of the current process periodically
+def start():
+    def run():
+        while True:
+            time.sleep(save_interval)
+            try: save()
+            except OSError: pass
+    threading.Thread(target=run, name='metrics', daemon=True).start()
+
+# Check whether process with given pid is still running
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+# Load metrics of all live worker processes, with the current process metrics being taken as is rather than from
+# file, and remove files of processes not running anymore, e.g. workers restarted by gunicorn
+def load():
+    snapshots = [snapshot()]
+    for name in os.listdir(metrics_dir) if os.path.isdir(metrics_dir) else []:
+        if not name.endswith('.json') or not name[:-5].isdigit() or int(name[:-5]) == os.getpid(): continue
+        path = os.path.join(metrics_dir, name)
+        if not alive(int(name[:-5])):
+            try: os.remove(path)
+            except OSError: pass
+            continue
+        try:
+            with open(path) as f: snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+# Load durations of backup/restore phases recorded by scripts
+def load_phases(path=phases_file):
+    try:
+        with open(path) as f: return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+# Record duration of backup/restore phase into file, having it locked, as phases can be recorded by several scripts
+def record_phase(phase, seconds, path=phases_file, **labels):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    labels = {'phase': phase, **{name: value for name, value in labels.items() if value}}
+    key = json.dumps(labels, sort_keys=True)
+    with open(path + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        phases = load_phases(path)
+        item = phases.setdefault(key, {'labels': labels, 'buckets': list(phase_buckets), 'counts': [0] * len(phase_buckets), 'sum': 0.0, 'count': 0})
+        if (i := bisect.bisect_left(item['buckets'], seconds)) < len(item['buckets']): item['counts'][i] += 1
+        item['sum'] += seconds
+        item['count'] += 1
+        item['last'] = seconds
+        item['at'] = time.time()
+        with open(path + '.tmp', 'w') as f: json.dump(phases, f)
+        os.replace(path + '.tmp', path)
+
+# Format labels, e.g. '{route="/backup",method="POST"}', escaping values as required by text format
+def format_labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels: return ''
+    escape = lambda value: str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+# Format number, having integers printed without fraction
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+# Render metrics of all live worker processes, and durations of backup/restore phases, in Prometheus text format
+def render():
+
+    # Sum up counters and histograms, and take max of gauges, across processes
+    totals, gauges, hists = {}, {}, {}
+    for snap in load():
+        for name, labels, value in snap['counters']:
+            key = (name, tuple(sorted(labels.items())))
+            totals[key] = totals.get(key, 0) + value
+        for name, labels, value in snap['gauges']:
+            key = (name, tuple(sorted(labels.items())))
+            gauges[key] = max(gauges.get(key, value), value)
+        for name, labels, bounds, counts, total, count in snap['histograms']:
+            key = (name, tuple(sorted(labels.items())))
+            h = hists.setdefault(key, [bounds, [0] * len(bounds), 0.0, 0])
+            h[1] = [a + b for a, b in zip(h[1], counts)]
+            h[2] += total
+            h[3] += count
+
+    # Add backup/restore phases
+    for item in load_phases().values():
+        labels = tuple(sorted(item['labels'].items()))
+        hists[('wrapper_phase_duration_seconds', labels)] = [item['buckets'], item['counts'], item['sum'], item['count']]
+        gauges[('wrapper_phase_last_duration_seconds', labels)] = item['last']
+        gauges[('wrapper_phase_last_timestamp_seconds', labels)] = item['at']
+
+    # Group samples by metric name
+    samples = {}
+    for (name, labels), value in list(totals.items()) + list(gauges.items()):
+        samples.setdefault(name, []).append(f'{name}{format_labels(dict(labels))} {format_value(value)}')
+    for (name, labels), (bounds, counts, total, count) in hists.items():
+        lines, cumulative = samples.setdefault(name, []), 0
+        for bound, qty in zip(bounds, counts):
+            cumulative += qty
+            lines.append(f'{name}_bucket{format_labels(dict(labels), le=format_value(bound))} {cumulative}')
+        lines.append(f'{name}_bucket{format_labels(dict(labels), le="+Inf")} {count}')
+        lines.append(f'{name}_sum{format_labels(dict(labels))} {format_value(total)}')
+        lines.append(f'{name}_count{format_labels(dict(labels))} {count}')
+
+    # Render, with type and description for each metric
+    output = []
+    for name in sorted(samples):
+        kind, text = described.get(name, ('untyped', name))
+        output.append(f'# HELP {name} {text}')
+        output.append(f'# TYPE {name} {kind}')
+        output.extend(samples[name])
+    return '\n'.join(output) + '\n'
@@ -0,0 +1,70 @@
+import queue, threading
+from contextlib import contextmanager
+
+# Bounded pool of reusable connections, where each connection is health-checked on checkout
+# and transparently replaced with a fresh one if it turns out to be dead
+class Pool:
+
+    def __init__(self, connect, check, close, size=10, timeout=30):
+        self.connect = connect
+        self.check = check
+        self.close = close
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    # Get healthy connection, waiting for a free slot if all connections are in use
+    def acquire(self):
+
+        # Wait for a free slot
+        if not self.slots.acquire(timeout=self.timeout):
+            raise RuntimeError(f"No free connection in pool within {self.timeout}s")
+
+        # Try to pick idle connection and check it's still alive, else create new one
+        try:
+            while True:
+                try:
+                    conn = self.idle.get_nowait()
+                except queue.Empty:
+                    return self.connect()
+                if self.check(conn): return conn
+                self.discard(conn)
+
+        # Free the slot if connect failed
+        except Exception:
+            self.slots.release()
+            raise
+
+    # Put connection back into the pool, or close it if it's broken
+    def release(self, conn, broken=False):
+        if broken: self.discard(conn)
+        else: self.idle.put(conn)
+        self.slots.release()
+
+    # Close connection ignoring any errors
+    def discard(self, conn):
+        try:
+            self.close(conn)
+        except Exception:
+            pass
+
+    # Use connection within a with-block. If something goes wrong - connection is
+    # closed rather than returned to the pool, unless it's still healthy
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, broken=not self.check(conn))
+            raise
+        else:
+            self.release(conn)
+
+    # Close all idle connections
+    def clear(self):
+        while True:
+            try:
+                self.discard(self.idle.get_nowait())
+            except queue.Empty:
+                return
@@ -0,0 +1,150 @@
+import os, re, json, time, threading
+from github import GitHubError
+
+# Error raised when releases list can't be fetched from GitHub and there is no cached list to fall back to
+class FetchError(Exception):
+    pass
+
+# Cached lists of GitHub releases, stored as one file per repo so that any worker process, as well as
+# load_releases() shell function, can read them. Cached list is served right away while it's younger
+# than max_age seconds, and revalidated in background once it's older than fresh seconds. Revalidation
+# is done via conditional requests, so that unchanged pages are answered with 304 not counted against rate limit
+class ReleaseCache:
+
+    def __init__(self, client, cache_dir='var/tmp/releases', fresh=15, max_age=300, max_pages=10):
+        self.client = client
+        self.cache_dir = cache_dir
+        self.fresh = fresh
+        self.max_age = max_age
+        self.max_pages = max_pages
+        self.memo = {}
+        self.refreshing = set()
+        self.lock = threading.Lock()
+
+    # Get path to the cache file for a given repo, e.g. 'var/tmp/releases/owner--name.json'
+    def path(self, repo):
+        return os.path.join(self.cache_dir, repo.replace('/', '--') + '.json')
+
+    # Load cache for a given repo, or None if there is no cache so far.
+    # File is re-parsed only if it was changed since last load
+    def load(self, repo):
+        try:
+            with open(self.path(repo)) as f:
+                stamp = os.fstat(f.fileno()).st_mtime_ns
+                if (memo := self.memo.get(repo)) and memo[0] == stamp: return memo[1]
+                cache = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        self.memo[repo] = (stamp, cache)
+        return cache
+
+    # Save cache for a given repo. Temporary file is unique per process and thread, as cache can be saved
+    # by several api server workers and background refresh threads at the same time
+    def save(self, repo, cache):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f'{self.path(repo)}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as f: json.dump(cache, f)
+        os.replace(tmp, self.path(repo))
+
+    # Get releases list for a given repo
+    def get(self, repo, token=''):
+
+        # Get cache age
+        cache = self.load(repo)
+        age = time.time() - cache['checked'] if cache else None
+
+        # If there is no cache or it's too old - revalidate it right now
+        if cache is None or age >= self.max_age: return self.refresh(repo, token)['list']
+
+        # Else if it's not fresh - revalidate it in background
+        if age >= self.fresh: self.refresh_in_background(repo, token)
+
+        # Return cached list
+        return cache['list']
+
+    # Revalidate cache for a given repo, page by page, and return it.
+    # If GitHub can't be reached - return cache as is, if any
+    def refresh(self, repo, token=''):
+        cache = self.load(repo)
+        try:
+            pages = self.fetch(repo, token, cache['pages'] if cache else [])
+        except FetchError:
+            if cache: return cache
+            raise
+        cache = {'repo': repo, 'checked': time.time(), 'pages': pages, 'list': [item for page in pages for item in page['list']]}
+        self.save(repo, cache)
+        return cache
+
+    # Start revalidation in a separate thread, unless it's already started for that repo
+    def refresh_in_background(self, repo, token=''):
+        with self.lock:
+            if repo in self.refreshing: return
+            self.refreshing.add(repo)
+
+        # Worker
+        def run():
+            try:
+                self.refresh(repo, token)
+            except Exception:
+                pass
+            finally:
+                with self.lock: self.refreshing.discard(repo)
+
+        # Start
+        threading.Thread(target=run, daemon=True).start()
+
+    # Fetch all pages of releases list, using validators of previously fetched pages
+    def fetch(self, repo, token, known):
+        pages = []
+        url = f'/repos/{repo}/releases?per_page=100'
+        while url and len(pages) < self.max_pages:
+
+            # Pick previously fetched version of this page, if any
+            prev = known[len(pages)] if len(pages) < len(known) and known[len(pages)]['url'] == url else None
+
+            # Request page, and if it's not modified - keep previous version
+            status, headers, body = self.request(url, token, prev)
+            if status == 304:
+                page = prev
+            else:
+                page = {
+                    'url': url,
+                    'etag': headers.get('etag'),
+                    'last_modified': headers.get('last-modified'),
+                    'next': next_link(headers.get('link', '')),
+                    'list': json.loads(body)
+                }
+
+            # Append page and proceed to the next one, if any
+            pages.append(page)
+            url = page['next']
+        return pages
+
+    # Make GET-request, conditional one if previous version of page is given
+    def request(self, url, token, prev=None):
+        headers = {}
+        if prev and prev['etag']: headers['If-None-Match'] = prev['etag']
+        elif prev and prev['last_modified']: headers['If-Modified-Since'] = prev['last_modified']
+        try:
+            return self.client.request('GET', url, token, headers)
+        except GitHubError as e:
+            raise FetchError(str(e)) from e
+
+    # Force revalidation on next call for all repos, e.g. after backup created new release. Repo is picked
+    # from the cache file itself, as file name can't be reliably converted back, e.g. if repo name contains '--'
+    def invalidate(self):
+        if not os.path.isdir(self.cache_dir): return
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'): continue
+            try:
+                with open(os.path.join(self.cache_dir, name)) as f: repo = json.load(f)['repo']
+            except (FileNotFoundError, ValueError, KeyError, TypeError):
+                continue
+            if cache := self.load(repo):
+                cache['checked'] = 0
+                self.save(repo, cache)
+
+# Get url of the next page from Link-header, if any
+def next_link(link):
+    match = re.search(r'<([^>]+)>;\s*rel="next"', link)
+    return match.group(1) if match else None
@@ -0,0 +1,59 @@
+import os, re, time, threading
+
+# Cached metadata of the project's git repo: current repo name is re-detected only when .git/config
+# is changed, and parent repo is re-detected when current repo is changed or cached value is outdated
+class RepoInfo:
+
+    def __init__(self, detect_parent, config='.git/config', ttl=3600):
+        self.detect_parent = detect_parent
+        self.config = config
+        self.ttl = ttl
+        self.stamp = None
+        self.repo = ''
+        self.parent_repo = None
+        self.parent_time = 0
+        self.lock = threading.Lock()
+
+    # Get current repo name, e.g. 'owner/name', based on url of origin remote
+    def current(self):
+
+        # Get .git/config modification stamp
+        try:
+            stat = os.stat(self.config)
+            stamp = (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+
+        # If it's changed - re-detect current repo and reset parent repo
+        if stamp != self.stamp:
+            with self.lock:
+                self.repo = self.parse()
+                self.stamp = stamp
+                self.parent_repo = None
+
+        # Return current repo
+        return self.repo
+
+    # Extract repo name from url of origin remote, in the same way as get_current_repo() in functions.sh does
+    def parse(self):
+        try:
+            with open(self.config) as f: config = f.read()
+        except FileNotFoundError:
+            return ''
+        match = re.search(r'\[remote "origin"\].+?url\s*=\s*https?://([\w\-]+@)?github\.com/([\w\-]+/[\w.\-]+)', config, re.S)
+        return re.sub(r'\.git$', '', match.group(2)) if match else ''
+
+    # Get parent repo name, or 'null' if current repo is neither forked nor generated from template
+    def parent(self):
+        repo = self.current()
+        with self.lock:
+            if self.parent_repo is None or time.time() - self.parent_time > self.ttl:
+                self.parent_repo = self.detect_parent(repo)
+                self.parent_time = time.time()
+            return self.parent_repo
+
+    # Force re-detection on next call, e.g. after update or restore
+    def invalidate(self):
+        with self.lock:
+            self.stamp = None
+            self.parent_repo = None
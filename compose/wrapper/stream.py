@@ -0,0 +1,80 @@
+import re, time, threading
+
+# Max seconds the output is kept in buffer before being flushed
+flush_window = 0.1
+
+# Max characters the output is accumulated up to before being flushed regardless of window
+flush_size = 16384
+
+# Carriage return followed by anything but newline, i.e. the one used to redraw progress line
+redraw = re.compile(r'\r(?=[^\n])')
+
+# Process-wide counters
+stats = {
+    'bytes_in': 0,
+    'messages_out': 0,
+    'flushes': 0,
+    'flush_latency_sum': 0.0,
+    'flush_latency_max': 0.0
+}
+stats_lock = threading.Lock()
+
+# Collapse progress redraws, i.e. for each line keep only the text written after the last bare
+# carriage return, as the text written before would anyway be overwritten in terminal.
+# Lines having escape sequences are kept as is, as those may move cursor elsewhere
+def collapse(text):
+    lines = text.split('\n')
+    for i, line in enumerate(lines):
+        if '\x1b' in line: continue
+        last = None
+        for last in redraw.finditer(line): pass
+        if last: lines[i] = line[last.start():]
+    return '\n'.join(lines)
+
+# Buffer for the output of a script, which is flushed via given callback when
+# either time window since the first buffered chunk is elapsed or size threshold is reached
+class Coalescer:
+
+    def __init__(self, publish):
+        self.publish = publish
+        self.buffer = []
+        self.size = 0
+        self.since = None
+
+    # Check whether there is something waiting to be flushed
+    def pending(self):
+        return self.since is not None
+
+    # Get seconds remaining until buffer should be flushed
+    def due(self):
+        return max(0, self.since + flush_window - time.monotonic())
+
+    # Append chunk to the buffer, and flush if it's time to
+    def write(self, chunk):
+        if not chunk: return
+        if self.since is None: self.since = time.monotonic()
+        self.buffer.append(chunk)
+        self.size += len(chunk)
+        with stats_lock: stats['bytes_in'] += len(chunk.encode())
+        if self.size >= flush_size or self.due() == 0: self.flush()
+
+    # Send buffered output as a single message
+    def flush(self):
+
+        # If nothing to flush - return
+        if self.since is None: return
+
+        # Collapse redraws and publish
+        self.publish(collapse(''.join(self.buffer)))
+
+        # Update counters
+        latency = time.monotonic() - self.since
+        with stats_lock:
+            stats['flushes'] += 1
+            stats['flush_latency_sum'] += latency
+            stats['flush_latency_max'] = max(stats['flush_latency_max'], latency)
+
+        # Reset buffer
+        self.buffer = []
+        self.size = 0
+        self.since = None
@@ -0,0 +1,311 @@
+import os, re, sys, unittest, subprocess
+
+# Fidelity tests for DDL built by ddl.py from catalog queries, compared against pg_dump and mysqldump. Fixture schema
+# is created in a scratch schema (postgres) or database (mysql-family), dumped by the dump tool, and then re-created
+# from the DDL built by ddl.py and dumped again, so both dumps should be the same. Tests need the database of the
+# engine mentioned as DB_ENGINE in .env and the dump tools, so they're expected to be run within the wrapper container:
+#
+#   python3 -m unittest discover -s compose/wrapper/tests
+#
+# Tests of other engines, as well as all tests if database is not reachable, are skipped
+
+# Make wrapper modules importable
+wrapper_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+root = os.path.dirname(os.path.dirname(wrapper_dir))
+sys.path.insert(0, wrapper_dir)
+import ddl
+from envfile import DotEnv
+
+# Settings from environment, with .env as fallback
+dot_env = DotEnv(os.path.join(root, '.env'))
+dot_env.reload()
+def setting(name, default=''):
+    return os.environ.get(name) or dot_env.values.get(name) or default
+
+# Engine, and scratch schema for the fixture
+engine = setting('DB_ENGINE', 'postgres')
+schema = 'ddl_fixture'
+
+# Postgres fixture. Prelude is the part not covered by ddl.py, i.e. functions, so it's re-created before applying DDL
+pg_prelude = """
+    CREATE FUNCTION ddl_fixture.touch() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN NEW.updated = now(); RETURN NEW; END $$;
+"""
+pg_fixture = """
+    CREATE TABLE ddl_fixture.category (
+        id serial PRIMARY KEY,
+        title varchar(100) COLLATE "C" NOT NULL,
+        CONSTRAINT category_title UNIQUE (title)
+    );
+    COMMENT ON TABLE ddl_fixture.category IS 'Item''s category';
+    COMMENT ON COLUMN ddl_fixture.category.title IS 'Title';
+    CREATE TABLE ddl_fixture.item (
+        id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        category_id integer REFERENCES ddl_fixture.category (id) ON DELETE CASCADE,
+        price numeric(10,2) DEFAULT 0 NOT NULL CHECK (price >= 0),
+        qty integer DEFAULT 1 NOT NULL,
+        total numeric GENERATED ALWAYS AS (price * qty) STORED,
+        updated timestamp
+    );
+    ALTER TABLE ddl_fixture.item ADD CONSTRAINT item_qty CHECK (qty > 0) NOT VALID;
+    CREATE INDEX item_category ON ddl_fixture.item (category_id) WHERE category_id IS NOT NULL;
+    CREATE INDEX item_lower ON ddl_fixture.item ((lower(price::text)));
+    CREATE TRIGGER item_touch BEFORE UPDATE ON ddl_fixture.item FOR EACH ROW EXECUTE FUNCTION ddl_fixture.touch();
+    CREATE TABLE ddl_fixture.event (
+        id integer NOT NULL,
+        happened date NOT NULL,
+        item_id bigint REFERENCES ddl_fixture.item (id),
+        CONSTRAINT event_id CHECK (id > 0),
+        PRIMARY KEY (id, happened)
+    ) PARTITION BY RANGE (happened);
+    CREATE TABLE ddl_fixture.event_2024 PARTITION OF ddl_fixture.event FOR VALUES FROM ('2024-01-01') TO ('2025-01-01');
+    CREATE TABLE ddl_fixture.event_rest PARTITION OF ddl_fixture.event DEFAULT;
+    CREATE INDEX event_item ON ddl_fixture.event (item_id);
+    CREATE TRIGGER event_touch BEFORE INSERT ON ddl_fixture.event FOR EACH ROW EXECUTE FUNCTION ddl_fixture.touch();
+"""
+
+# Postgres fixture for public schema, which is on the default search_path, so DDL is checked to have all names
+# qualified, e.g. in defaults, types, foreign keys and trigger functions. It's created in a scratch database,
+# having the same name as the scratch schema, and sequence not owned by any column is in prelude as well
+pg_public_prelude = """
+    CREATE TYPE public.mood AS ENUM ('good', 'bad');
+    CREATE SEQUENCE public.code_seq;
+    CREATE FUNCTION public.touch() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN NEW.updated = now(); RETURN NEW; END $$;
+"""
+pg_public_fixture = """
+    CREATE TABLE public.category (
+        id serial PRIMARY KEY,
+        code integer DEFAULT nextval('public.code_seq') NOT NULL,
+        mood public.mood DEFAULT 'good'
+    );
+    CREATE TABLE public.item (
+        id serial PRIMARY KEY,
+        category_id integer REFERENCES public.category (id),
+        updated timestamp
+    );
+    CREATE INDEX item_category ON public.item (category_id);
+    CREATE TRIGGER item_touch BEFORE UPDATE ON public.item FOR EACH ROW EXECUTE FUNCTION public.touch();
+"""
+
+# Mysql-family fixture
+mysql_fixture = [
+    """CREATE TABLE `category` (
+        `id` int NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        `title` varchar(100) NOT NULL COMMENT 'Title',
+        UNIQUE KEY `title` (`title`)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='Item''s category'""",
+    """CREATE TABLE `item` (
+        `id` bigint NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        `categoryId` int DEFAULT NULL,
+        `price` decimal(10,2) NOT NULL DEFAULT '0.00',
+        `qty` int NOT NULL DEFAULT '1',
+        `total` decimal(20,2) GENERATED ALWAYS AS (`price` * `qty`) STORED,
+        `updated` datetime DEFAULT NULL,
+        KEY `categoryId` (`categoryId`),
+        CONSTRAINT `item_category` FOREIGN KEY (`categoryId`) REFERENCES `category` (`id`) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    "CREATE TRIGGER `item_touch` BEFORE UPDATE ON `item` FOR EACH ROW SET NEW.`updated` = NOW()",
+    "CREATE TRIGGER `item_check` BEFORE UPDATE ON `item` FOR EACH ROW FOLLOWS `item_touch` SET NEW.`qty` = GREATEST(NEW.`qty`, 1)",
+    "CREATE VIEW `priced` AS SELECT `id`, `price` FROM `item` WHERE `price` > 0",
+    "CREATE SQL SECURITY INVOKER VIEW `categorized` AS SELECT `p`.`id`, `c`.`title` FROM `priced` `p` JOIN `item` `i` ON `i`.`id` = `p`.`id` JOIN `category` `c` ON `c`.`id` = `i`.`categoryId`"
+]
+
+# Run command and return its output, failing the test if command failed
+def run(test, cli, env, input=None):
+    result = subprocess.run(cli, input=input, env={**os.environ, **env}, capture_output=True, text=True)
+    test.assertEqual(result.returncode, 0, f"{cli[0]} failed: {result.stderr}")
+    return result.stdout
+
+@unittest.skipUnless(engine == 'postgres', 'DB_ENGINE is not postgres')
+class PostgresFidelity(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            import psycopg2, psycopg2.extras
+            cls.conn = psycopg2.connect(host=setting('DB_HOST', engine), user=setting('DB_ROOT_USER', 'postgres'),
+                                        password=setting('DB_ROOT_PASSWORD'), dbname=setting('DB_NAME'), connect_timeout=5)
+        except Exception as e:
+            raise unittest.SkipTest(f"database is not reachable: {e}")
+        cls.conn.autocommit = True
+        cls.db = cls.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cls.dump = ['pg_dump', '-h', setting('DB_HOST', engine), '-U', setting('DB_ROOT_USER', 'postgres'), '-d', setting('DB_NAME'),
+                    '-n', schema, '--schema-only', '--no-owner', '--no-acl']
+        cls.env = {'PGPASSWORD': setting('DB_ROOT_PASSWORD')}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        cls.conn.close()
+
+    # Create empty scratch schema with functions used by fixture
+    def reset(self):
+        self.db.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        self.db.execute(f'CREATE SCHEMA {schema}')
+        self.db.execute(pg_prelude)
+
+    # Dump scratch schema, without comments and \restrict lines, as those differ from dump to dump
+    def pg_dump(self):
+        dump = run(self, self.dump, self.env)
+        lines = [line for line in dump.splitlines() if not line.startswith(('--', '\\restrict', '\\unrestrict'))]
+        return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+    # Get session setup lines, i.e. SET-statements and set_config() calls before first CREATE-statement
+    def session(self, dump):
+        head = dump.split('\nCREATE ', 1)[0]
+        return [line for line in head.splitlines() if line.startswith(('SET ', 'SELECT pg_catalog.set_config'))]
+
+    # DDL applied to empty schema should give the same schema as fixture
+    def test_round_trip(self):
+        self.reset()
+        self.db.execute(pg_fixture)
+        expected = self.pg_dump()
+        native = ddl.generate(self.db, 'postgres', schema)
+        self.reset()
+        self.db.execute(native)
+        self.assertEqual(self.pg_dump(), expected)
+
+    # Session setup should start same as pg_dump's one, which has default_tablespace and default_table_access_method
+    # set up later, right before the first table
+    def test_header(self):
+        self.reset()
+        self.db.execute(pg_fixture)
+        expected = self.session(run(self, self.dump, self.env))
+        self.assertEqual(self.session(ddl.generate(self.db, 'postgres', schema))[:len(expected)], expected)
+
+    # Partitions should be attached to their parents, along with their indexes
+    def test_partitions(self):
+        self.reset()
+        self.db.execute(pg_fixture)
+        native = ddl.generate(self.db, 'postgres', schema)
+        self.assertIn('PARTITION BY RANGE (happened);', native)
+        self.assertIn(f'ALTER TABLE ONLY {schema}.event ATTACH PARTITION {schema}.event_rest DEFAULT;', native)
+        self.assertIn(f'ALTER INDEX {schema}.event_pkey ATTACH PARTITION {schema}.event_2024_pkey;', native)
+        self.assertEqual(native.count('CREATE TRIGGER event_touch'), 1)
+
+    # Only given tables should be included, and partitions of a table not in output should not be attached
+    def test_given_tables(self):
+        self.reset()
+        self.db.execute(pg_fixture)
+        native = ddl.generate(self.db, 'postgres', schema, ['category', 'event_2024'])
+        self.assertIn(f'CREATE TABLE {schema}.category (', native)
+        self.assertIn(f'CREATE TABLE {schema}.event_2024 (', native)
+        self.assertNotIn(f'CREATE TABLE {schema}.item (', native)
+        self.assertNotIn('ATTACH PARTITION', native)
+
+@unittest.skipUnless(engine == 'postgres', 'DB_ENGINE is not postgres')
+class PostgresPublicFidelity(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            import psycopg2, psycopg2.extras
+            connect = lambda dbname: psycopg2.connect(host=setting('DB_HOST', engine), user=setting('DB_ROOT_USER', 'postgres'),
+                                                      password=setting('DB_ROOT_PASSWORD'), dbname=dbname, connect_timeout=5)
+            cls.admin = connect(setting('DB_NAME'))
+        except Exception as e:
+            raise unittest.SkipTest(f"database is not reachable: {e}")
+        cls.admin.autocommit = True
+        with cls.admin.cursor() as db:
+            db.execute(f'DROP DATABASE IF EXISTS {schema}')
+            db.execute(f'CREATE DATABASE {schema}')
+        cls.conn = connect(schema)
+        cls.conn.autocommit = True
+        cls.db = cls.conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cls.dump = ['pg_dump', '-h', setting('DB_HOST', engine), '-U', setting('DB_ROOT_USER', 'postgres'), '-d', schema,
+                    '-n', 'public', '--schema-only', '--no-owner', '--no-acl']
+        cls.env = {'PGPASSWORD': setting('DB_ROOT_PASSWORD')}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+        with cls.admin.cursor() as db: db.execute(f'DROP DATABASE IF EXISTS {schema}')
+        cls.admin.close()
+
+    # Re-create empty public schema with types, sequence and functions used by fixture
+    def reset(self):
+        self.db.execute('DROP SCHEMA public CASCADE')
+        self.db.execute('CREATE SCHEMA public')
+        self.db.execute(pg_public_prelude)
+
+    # DDL applied via a session having empty search_path, as the header sets it, should give the same schema as fixture,
+    # and search_path of the connection DDL was built with should be kept as is
+    def test_round_trip(self):
+        self.reset()
+        self.db.execute(pg_public_fixture)
+        expected = PostgresFidelity.pg_dump(self)
+        self.db.execute("SELECT current_setting('search_path') AS path")
+        path = self.db.fetchone()['path']
+        native = ddl.generate(self.db, 'postgres', 'public')
+        self.db.execute("SELECT current_setting('search_path') AS path")
+        self.assertEqual(self.db.fetchone()['path'], path)
+        self.assertIn("nextval('public.category_id_seq'::regclass)", native)
+        self.assertIn('REFERENCES public.category(id)', native)
+        self.reset()
+        self.db.execute(native)
+        self.db.execute("SELECT set_config('search_path', %s, false)", (path,))
+        self.assertEqual(PostgresFidelity.pg_dump(self), expected)
+
+@unittest.skipUnless(engine in ('mysql', 'mariadb', 'percona'), 'DB_ENGINE is not mysql-family')
+class MysqlFidelity(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            import pymysql, pymysql.cursors
+            cls.conn = pymysql.connect(host=setting('DB_HOST', engine), user=setting('DB_ROOT_USER', 'root'),
+                                       password=setting('DB_ROOT_PASSWORD'), autocommit=True, connect_timeout=5)
+        except Exception as e:
+            raise unittest.SkipTest(f"database is not reachable: {e}")
+        cls.db = cls.conn.cursor(pymysql.cursors.DictCursor)
+        args = ['-h', setting('DB_HOST', engine), '-u', setting('DB_ROOT_USER', 'root')]
+        cls.dump = ['mariadb-dump' if engine == 'mariadb' else 'mysqldump', *args, schema, '--no-data', '--compact', '--skip-comments']
+        cls.client = ['mariadb' if engine == 'mariadb' else 'mysql', *args, '-D', schema]
+        cls.env = {'MYSQL_PWD': setting('DB_ROOT_PASSWORD')}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.execute(f'DROP DATABASE IF EXISTS `{schema}`')
+        cls.conn.close()
+
+    # Create empty scratch database
+    def reset(self):
+        self.db.execute(f'DROP DATABASE IF EXISTS `{schema}`')
+        self.db.execute(f'CREATE DATABASE `{schema}`')
+        self.db.execute(f'USE `{schema}`')
+
+    # Create fixture
+    def fixture(self):
+        self.reset()
+        for sql in mysql_fixture: self.db.execute(sql)
+
+    # DDL applied to empty database via command-line client should give the same database as fixture
+    def test_round_trip(self):
+        self.fixture()
+        expected = run(self, self.dump, self.env)
+        native = ddl.generate(self.db, engine, schema)
+        self.reset()
+        run(self, self.client, self.env, native)
+        self.assertEqual(run(self, self.dump, self.env), expected)
+
+    # Views should be created via stand-ins, and triggers should be wrapped same as mysqldump does
+    def test_views_and_triggers(self):
+        self.fixture()
+        native = ddl.generate(self.db, engine, schema)
+        dump = run(self, self.dump, self.env)
+        for name in ('priced', 'categorized'):
+            self.assertIn(f'/*!50001 CREATE VIEW `{name}` AS SELECT \n', native)
+        self.assertIn('/*!50013 DEFINER=', native)
+        self.assertIn('/*!50003 CREATE*/ /*!50017 DEFINER=', native)
+        for line in dump.splitlines():
+            if line.startswith(('/*!50003 SET', '/*!50001 SET', '/*!50001 CREATE', '/*!50001 VIEW', 'DELIMITER')):
+                self.assertIn(line, native)
+
+    # Single view given by name should not raise, as SHOW CREATE TABLE returns 'Create View' for views
+    def test_given_view(self):
+        self.fixture()
+        native = ddl.generate(self.db, engine, schema, ['priced'])
+        self.assertIn('/*!50001 VIEW `priced` AS ', native)
+        self.assertNotIn('CREATE TABLE', native)
+
+if __name__ == '__main__':
+    unittest.main()
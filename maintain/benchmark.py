@@ -0,0 +1,619 @@
+import os, re, sys, json, time, random, shutil, hashlib, argparse, platform, tempfile, threading, statistics, subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+# Benchmark the wrapper API and the backup/restore pipeline offline, and write results into a json report, so that
+# reports of different runs, e.g. before and after a change, can be compared via --compare. Nothing is sent to GitHub
+# or RabbitMQ: GitHub is replaced with a local stub release server, and RabbitMQ connections are replaced with a fake
+# broker counting published messages. Suites are:
+#
+#  stream    - bash_stream() throughput, i.e. how fast output of a script is turned into websocket messages
+#  choices   - /restore/choices latency with empty, stale and fresh releases cache, against the stub server
+#  export    - /export/table latency via dump tool and via catalog queries (native=1), against the local database
+#  dataset   - compressing, chunking, importing and dumping of a generated dump having --rows rows in total
+#  transfer  - chunked upload and download throughput of release assets, against the stub server
+#
+# Suites involving api.py need wrapper's python packages, and export suite needs the database, so it's expected
+# to be run within the wrapper container, e.g. 'python3 maintain/benchmark.py'. Dataset suite imports and dumps the
+# generated data via a scratch database, which is created and dropped by the suite, and if database is not reachable
+# or --no-db is given, then client command is replaced with a stand-in, so only dump parsing and spooling is measured
+
+# Project root and wrapper's api dir
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+wrapper_dir = os.path.join(root, 'compose', 'wrapper')
+
+# Error raised when suite can't be run, e.g. as some dependency is missing, so suite is reported as skipped
+class Skip(Exception):
+    pass
+
+# Get latency stats, in milliseconds, for given durations in seconds
+def latency(durations):
+    ms = sorted(d * 1000 for d in durations)
+    return {
+        'requests': len(ms),
+        'mean_ms': round(statistics.fmean(ms), 2),
+        'p50_ms': round(ms[len(ms) // 2], 2),
+        'p95_ms': round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 2),
+        'max_ms': round(ms[-1], 2)
+    }
+
+# Get throughput stats for given quantity of bytes, rows or messages transferred within given seconds
+def throughput(seconds, **quantities):
+    stats = {'seconds': round(seconds, 3)}
+    for name, qty in quantities.items():
+        stats[name] = qty
+        stats[f'{name}_per_sec'] = round(qty / max(seconds, 1e-9), 1)
+    return stats
+
+# Read .env file of the project as [name => value] pairs
+def dot_env():
+    values = {}
+    try:
+        with open(os.path.join(root, '.env')) as f:
+            for line in f:
+                if line.startswith('#') or '=' not in line: continue
+                name, value = line.strip().split('=', 1)
+                if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'': value = value[1:-1]
+                values.setdefault(name, value)
+    except FileNotFoundError:
+        pass
+    return values
+
+# Local stand-in for GitHub API and release assets storage. Releases list is paginated and revalidated via ETag, same
+# as GitHub does, and asset downloads are redirected to another host, i.e. 'localhost' instead of '127.0.0.1', as
+# GitHub redirects to S3, so that clients are benchmarked with the same quantity of requests and connections
+class StubGitHub:
+
+    def __init__(self, releases=300):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes = 0
+        self.next_id = 1000
+        self.tags = {}
+        self.assets = {}
+        self.list = [{
+            'id': i + 1,
+            'tag_name': f'P-custom-{i:03d}',
+            'name': f'Backup {i:03d}',
+            'draft': False,
+            'prerelease': False,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() - i * 3600)),
+            'published_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() - i * 3600)),
+            'body': '',
+            'assets': []
+        } for i in range(releases)]
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.url = f'http://127.0.0.1:{self.port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    # Stop server
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # Get release for a given tag, creating it if not yet exists
+    def release(self, repo, tag):
+        with self.lock:
+            if tag not in self.tags:
+                self.next_id += 1
+                self.tags[tag] = {'id': self.next_id, 'tag_name': tag,
+                                  'upload_url': f'{self.url}/uploads/repos/{repo}/releases/{self.next_id}/assets{{?name,label}}'}
+            return self.tags[tag]
+
+    # Get asset metadata
+    def meta(self, repo, asset):
+        return {'id': asset['id'], 'name': asset['name'], 'size': len(asset['data']), 'state': 'uploaded',
+                'url': f'{self.url}/repos/{repo}/releases/assets/{asset["id"]}',
+                'browser_download_url': f'http://localhost:{self.port}/storage/{asset["id"]}'}
+
+    # Get request handler class
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            # Send response
+            def send(self, status, body=b'', headers=None):
+                if not isinstance(body, bytes): body = json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in (headers or {}).items(): self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            # Send paginated list, with Link-header pointing to the next page, if any, and ETag-header
+            def page(self, items, query):
+                per_page, page = int(query.get('per_page', ['30'])[0]), int(query.get('page', ['1'])[0])
+                body = json.dumps(items[(page - 1) * per_page:page * per_page]).encode()
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag: return self.send(304, b'', {'ETag': etag})
+                headers = {'ETag': etag, 'Content-Type': 'application/json'}
+                if page * per_page < len(items):
+                    headers['Link'] = f'<{stub.url}{urlsplit(self.path).path}?per_page={per_page}&page={page + 1}>; rel="next"'
+                self.send(200, body, headers)
+
+            def do_GET(self):
+                with stub.lock: stub.requests += 1
+                parts = urlsplit(self.path)
+                path, query = parts.path, parse_qs(parts.query)
+
+                # Asset contents, with Range-header support
+                if match := re.fullmatch(r'/storage/(\d+)', path):
+                    data = stub.assets[int(match.group(1))]['data']
+                    start = int(range.group(1)) if (range := re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range', ''))) else 0
+                    if start and start >= len(data): return self.send(416)
+                    with stub.lock: stub.bytes += len(data) - start
+                    self.send_response(206 if start else 200)
+                    self.send_header('Content-Length', str(len(data) - start))
+                    self.end_headers()
+                    self.wfile.write(memoryview(data)[start:])
+                    return
+
+                # Asset download via API, redirected to storage
+                if match := re.fullmatch(r'/repos/([^/]*/[^/]*)/releases/assets/(\d+)', path):
+                    if int(match.group(2)) not in stub.assets: return self.send(404, {'message': 'Not Found'})
+                    return self.send(302, b'', {'Location': f'http://localhost:{stub.port}/storage/{match.group(2)}'})
+
+                # Release by tag
+                if match := re.fullmatch(r'/repos/([^/]*/[^/]*)/releases/tags/(.+)', path):
+                    return self.send(200, stub.release(match.group(1), match.group(2)))
+
+                # Assets of a release
+                if match := re.fullmatch(r'/repos/([^/]*/[^/]*)/releases/(\d+)/assets', path):
+                    with stub.lock: items = [stub.meta(match.group(1), a) for a in stub.assets.values() if a['release'] == int(match.group(2))]
+                    return self.page(items, query)
+
+                # Releases list
+                if re.fullmatch(r'/repos/([^/]*/[^/]*)/releases', path):
+                    return self.page(stub.list, query)
+
+                # Repo, having no parent
+                if match := re.fullmatch(r'/repos/([^/]*/[^/]*)', path):
+                    return self.send(200, {'full_name': match.group(1), 'fork': False})
+                self.send(404, {'message': 'Not Found'})
+
+            def do_POST(self):
+                with stub.lock: stub.requests += 1
+                parts = urlsplit(self.path)
+                match = re.fullmatch(r'/uploads/repos/([^/]*/[^/]*)/releases/(\d+)/assets', parts.path)
+                name = parse_qs(parts.query).get('name', [''])[0]
+                data = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if not match or not name: return self.send(404, {'message': 'Not Found'})
+                with stub.lock:
+                    if any(a['release'] == int(match.group(2)) and a['name'] == name for a in stub.assets.values()):
+                        return self.send(422, {'message': 'Validation Failed', 'errors': [{'code': 'already_exists'}]})
+                    stub.next_id += 1
+                    stub.bytes += len(data)
+                    stub.assets[stub.next_id] = asset = {'id': stub.next_id, 'release': int(match.group(2)), 'name': name, 'data': data}
+                self.send(201, stub.meta(match.group(1), asset))
+
+            def do_DELETE(self):
+                with stub.lock: stub.requests += 1
+                match = re.fullmatch(r'/repos/([^/]*/[^/]*)/releases/assets/(\d+)', urlsplit(self.path).path)
+                with stub.lock: found = match and stub.assets.pop(int(match.group(2)), None)
+                self.send(204 if found else 404)
+
+        return Handler
+
+# Fake RabbitMQ broker, having the same interface as pika's BlockingConnection and its channels, as far as api.py
+# uses it. Queues are assumed to exist, and published messages are counted rather than delivered anywhere
+class FakeBroker:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.bytes = 0
+        self.connections = 0
+
+    # Open connection, i.e. stand-in for pika.BlockingConnection()
+    def connect(self):
+        with self.lock: self.connections += 1
+        return FakeConnection(self)
+
+class FakeConnection:
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_open = True
+
+    def channel(self):
+        return FakeChannel(self)
+
+    def process_data_events(self, time_limit=0):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+class FakeChannel:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.is_open = True
+
+    def confirm_delivery(self):
+        pass
+
+    def queue_declare(self, queue, passive=False):
+        return True
+
+    def basic_publish(self, exchange, routing_key, body, mandatory=False):
+        broker = self.connection.broker
+        with broker.lock:
+            broker.messages += 1
+            broker.bytes += len(body)
+
+    def close(self):
+        self.is_open = False
+
+# Stand-in for system db connection used to resolve websocket recipients, having a single browser tab
+class FakeDb:
+
+    def cursor(self, *args, **kwargs):
+        return self
+
+    def execute(self, query, params=None):
+        self.rowcount = 1
+
+    def fetchone(self):
+        return {'token': 'benchmark'}
+
+    def close(self):
+        pass
+
+# Import wrapper's api.py, having GitHub API pointed to the stub server, releases cached in a temporary dir,
+# and RabbitMQ and system db connections, used for streaming, replaced with stand-ins
+def load_api(args, stub, tmp):
+    if getattr(args, 'api', None): return args.api
+    sys.path.insert(0, wrapper_dir)
+    try:
+        import api
+    except ImportError as e:
+        raise Skip(f"wrapper's python packages are not available: {e}")
+    api.dot_env.on_reload(lambda env: setattr(api.github, 'base_url', stub.url))
+    api.github.base_url = stub.url
+    api.release_cache = api.ReleaseCache(api.github, cache_dir=os.path.join(tmp, 'releases'))
+    args.broker = FakeBroker()
+    args.api = api
+    return api
+
+# Benchmark bash_stream(), i.e. how fast script output is read, coalesced and published as websocket messages
+def bench_stream(args, stub, tmp):
+    api = load_api(args, stub, tmp)
+    api.mq_pool = api.Pool(args.broker.connect, lambda nn: nn.is_open, lambda nn: nn.close())
+    api.db_pool = api.Pool(FakeDb, lambda db: True, lambda db: None)
+    data = {'to': {'token': 'benchmark', 'roleId': 1, 'adminId': 1}, 'type': 'bench', 'id': 'bench', 'title': 'Benchmark'}
+
+    # Scripts producing plain lines, and progress line being redrawn via carriage return
+    scripts = {
+        'lines': f"seq -f 'benchmark output line %09g' 1 {args.lines}",
+        'redraws': f"for i in $(seq 1 {args.lines // 10}); do printf '\\rprogress %d of {args.lines // 10}' $i; done"
+    }
+    results = {}
+    for name, command in scripts.items():
+        with api.stream.stats_lock: before = dict(api.stream.stats)
+        messages = args.broker.messages
+        started = time.perf_counter()
+        api.bash_stream(command, dict(data))
+        elapsed = time.perf_counter() - started
+        with api.stream.stats_lock: after = dict(api.stream.stats)
+        results[name] = throughput(elapsed, bytes=after['bytes_in'] - before['bytes_in'], messages=args.broker.messages - messages)
+        results[name]['flushes'] = after['flushes'] - before['flushes']
+    return results
+
+# Benchmark /restore/choices latency: with no releases cache, with stale cache revalidated via conditional
+# requests, and with fresh cache served as is
+def bench_choices(args, stub, tmp):
+    api = load_api(args, stub, tmp)
+    client = api.app.test_client()
+
+    # Request choices
+    def request():
+        started = time.perf_counter()
+        response = client.get('/restore/choices')
+        if response.status_code != 200: raise RuntimeError(f"/restore/choices responded with {response.status_code}: {response.get_data(as_text=True)}")
+        return time.perf_counter() - started
+
+    # Do requests
+    results = {'releases': len(stub.list)}
+    empty, stale = [], []
+    for i in range(args.requests):
+        shutil.rmtree(api.release_cache.cache_dir, ignore_errors=True)
+        api.release_cache.memo.clear()
+        empty.append(request())
+    for i in range(args.requests):
+        api.release_cache.invalidate()
+        stale.append(request())
+    results['empty_cache'] = latency(empty)
+    results['stale_cache'] = latency(stale)
+    results['fresh_cache'] = latency([request() for i in range(args.requests)])
+    return results
+
+# Benchmark /export/table latency via dump tool and via catalog queries
+def bench_export(args, stub, tmp):
+    api = load_api(args, stub, tmp)
+    client = api.app.test_client()
+    results = {'table': args.table}
+    for mode, query in {'dump_tool': '', 'native': '&native=1'}.items():
+        durations = []
+        for i in range(args.requests):
+            started = time.perf_counter()
+            response = client.get(f'/export/table?name={args.table}{query}')
+            if response.status_code != 200: raise Skip(f"/export/table responded with {response.status_code}, database is not reachable?")
+            durations.append(time.perf_counter() - started)
+        results[mode] = latency(durations)
+    return results
+
+# Database of a given engine, accessed via its command-line client and dump tool as root user
+class Database:
+
+    def __init__(self, engine, host, user, password, name):
+        self.engine = engine
+        self.name = name
+        if engine == 'postgres':
+            self.env = {**os.environ, 'PGPASSWORD': password}
+            self.base = ['-h', host, '-U', user]
+            self.client = ['psql', *self.base, '-d', name, '-q', '-o', '/dev/null', '-v', 'ON_ERROR_STOP=1']
+            self.dump = ['pg_dump', *self.base, '-d', name, '--no-owner', '--no-acl']
+        else:
+            cli = 'mariadb' if engine == 'mariadb' else 'mysql'
+            self.env = {**os.environ, 'MYSQL_PWD': password}
+            self.base = ['-h', host, '-u', user]
+            self.client = [cli, *self.base, '-D', name]
+            self.dump = ['mariadb-dump' if engine == 'mariadb' else 'mysqldump', *self.base, '--single-transaction', name]
+        if not shutil.which(self.client[0]) or not shutil.which(self.dump[0]): raise Skip(f"{self.client[0]} or {self.dump[0]} is not installed")
+
+    # Run sql as root, outside of the scratch database
+    def admin(self, sql):
+        if self.engine == 'postgres': cli = ['psql', *self.base, '-d', 'postgres', '-q', '-v', 'ON_ERROR_STOP=1', '-c', sql]
+        else: cli = [self.client[0], *self.base, '-e', sql]
+        result = subprocess.run(cli, env=self.env, capture_output=True, text=True, timeout=60)
+        if result.returncode != 0: raise Skip(f"{cli[0]} failed: {result.stderr.strip()}")
+
+    # Create empty scratch database, dropping existing one, if any
+    def create(self):
+        self.drop()
+        self.admin(f'CREATE DATABASE {self.name}')
+
+    # Drop scratch database
+    def drop(self):
+        self.admin(f'DROP DATABASE IF EXISTS {self.name}')
+
+# Write generated dump having given quantity of rows spread across given quantity of tables into a given file,
+# in the same format as pg_dump or mysqldump writes, so that dump-import.py splits it as it does with real dumps
+def generate_dump(path, engine, rows, tables):
+    rnd = random.Random(1)
+    words = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'theta', 'kappa', 'lambda', 'sigma']
+    epoch = 1700000000
+    with open(path, 'w', buffering=1 << 20) as f:
+        if engine == 'postgres':
+            f.write("SET statement_timeout = 0;\nSET client_encoding = 'UTF8';\nSET standard_conforming_strings = on;\n\n")
+        else:
+            f.write("/*!40101 SET NAMES utf8mb4 */;\n/*!40014 SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0 */;\n\n")
+        for t in range(tables):
+            table, qty = f'bench_items_{t + 1}', rows // tables + (t < rows % tables)
+            if engine == 'postgres':
+                f.write(f"--\n-- Name: {table}; Type: TABLE; Schema: public; Owner: -\n--\n\n"
+                        f"CREATE TABLE public.{table} (\n    id bigint NOT NULL,\n    title character varying(100) NOT NULL,\n"
+                        f"    qty integer NOT NULL,\n    price numeric(10,2) NOT NULL,\n    created timestamp without time zone NOT NULL\n);\n\n")
+            else:
+                f.write(f"--\n-- Table structure for table `{table}`\n--\n\nDROP TABLE IF EXISTS `{table}`;\n"
+                        f"CREATE TABLE `{table}` (\n  `id` bigint NOT NULL,\n  `title` varchar(100) NOT NULL,\n  `qty` int NOT NULL,\n"
+                        f"  `price` decimal(10,2) NOT NULL,\n  `created` datetime NOT NULL,\n  PRIMARY KEY (`id`),\n  KEY `qty` (`qty`)\n) ENGINE=InnoDB;\n\n")
+        for t in range(tables):
+            table, qty = f'bench_items_{t + 1}', rows // tables + (t < rows % tables)
+            if engine == 'postgres':
+                f.write(f"--\n-- Data for Name: {table}; Type: TABLE DATA; Schema: public; Owner: -\n--\n\n"
+                        f"COPY public.{table} (id, title, qty, price, created) FROM stdin;\n")
+                for i in range(1, qty + 1):
+                    f.write(f"{i}\t{words[i % 10]} item {rnd.getrandbits(32):08x}\t{i % 1000}\t{i % 100000 / 100:.2f}\t"
+                            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(epoch - i))}\n")
+                f.write("\\.\n\n\n")
+            else:
+                f.write(f"--\n-- Dumping data for table `{table}`\n--\n\nLOCK TABLES `{table}` WRITE;\n")
+                for start in range(1, qty + 1, 1000):
+                    values = ','.join(f"({i},'{words[i % 10]} item {rnd.getrandbits(32):08x}',{i % 1000},{i % 100000 / 100:.2f},"
+                                      f"'{time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(epoch - i))}')" for i in range(start, min(start + 1000, qty + 1)))
+                    f.write(f"INSERT INTO `{table}` VALUES {values};\n")
+                f.write("UNLOCK TABLES;\n\n")
+        if engine == 'postgres':
+            for t in range(tables):
+                table = f'bench_items_{t + 1}'
+                f.write(f"--\n-- Name: {table} {table}_pkey; Type: CONSTRAINT; Schema: public; Owner: -\n--\n\n"
+                        f"ALTER TABLE ONLY public.{table}\n    ADD CONSTRAINT {table}_pkey PRIMARY KEY (id);\n\n\n"
+                        f"--\n-- Name: {table}_qty; Type: INDEX; Schema: public; Owner: -\n--\n\n"
+                        f"CREATE INDEX {table}_qty ON public.{table} USING btree (qty);\n\n\n")
+
+# Run pipeline of given commands, feeding first one from given file, if any, and raise error if any command failed
+def pipeline(commands, stdin=None, env=None):
+    procs = []
+    with open(stdin or os.devnull, 'rb') as source:
+        for i, command in enumerate(commands):
+            last = i == len(commands) - 1
+            procs.append(subprocess.Popen(command, stdin=procs[-1].stdout if procs else source,
+                                          stdout=subprocess.DEVNULL if last else subprocess.PIPE, env=env))
+            if len(procs) > 1: procs[-2].stdout.close()
+        for proc in procs:
+            name = os.path.basename(proc.args[1] if proc.args[0] == sys.executable else proc.args[0])
+            if proc.wait() != 0: raise RuntimeError(f"{name} exited with code {proc.returncode}")
+
+# Benchmark compressing and chunking via dump-sink.py, importing via dump-import.py, and dumping via dump tool,
+# using generated dump having --rows rows
+def bench_dataset(args, stub, tmp):
+    results = {'engine': args.engine, 'rows': args.rows, 'tables': args.tables}
+    python, maintain = sys.executable, os.path.join(root, 'maintain')
+    plain, gz = os.path.join(tmp, 'dataset.sql'), os.path.join(tmp, 'dataset.sql.gz')
+
+    # Generate dump
+    started = time.perf_counter()
+    generate_dump(plain, args.engine, args.rows, args.tables)
+    results['generate'] = throughput(time.perf_counter() - started, rows=args.rows, bytes=os.path.getsize(plain))
+
+    # Compress and chunk, as dump-prepare.sh does
+    sink = [python, os.path.join(maintain, 'dump-sink.py'), gz, '--max-size', args.max_size, '--jobs', str(args.dump_jobs), '--progress', 'none']
+    started = time.perf_counter()
+    pipeline([sink], plain)
+    chunks = sorted(name for name in os.listdir(tmp) if name.startswith('dataset.sql.gz'))
+    results['compress'] = throughput(time.perf_counter() - started, rows=args.rows, bytes=os.path.getsize(plain))
+    results['compress']['compressed_bytes'] = sum(os.path.getsize(os.path.join(tmp, name)) for name in chunks)
+    results['compress']['chunks'] = len(chunks)
+
+    # Pick scratch database, if reachable
+    db, results['database'] = None, 'stand-in'
+    if not args.no_db:
+        env = dot_env()
+        try:
+            db = Database(args.engine, args.db_host or args.engine, args.db_user or ('postgres' if args.engine == 'postgres' else 'root'),
+                          args.db_password if args.db_password is not None else env.get('DB_ROOT_PASSWORD', ''), args.db_name)
+            db.create()
+            results['database'] = db.name
+        except Skip as e:
+            results['database_error'], db = str(e), None
+
+    # Import, via client stand-in swallowing the sql if there is no database
+    client = db.client if db else ['sh', '-c', 'cat > /dev/null']
+    importer = [python, os.path.join(maintain, 'dump-import.py'), '--engine', args.engine, '--jobs', str(args.import_jobs), '--spool', tmp, '--', *client]
+    try:
+        started = time.perf_counter()
+        pipeline([['cat', *[os.path.join(tmp, name) for name in chunks]], ['gunzip'], importer], env=db.env if db else None)
+        results['import'] = throughput(time.perf_counter() - started, rows=args.rows)
+
+        # Dump imported data back, compressing and chunking it as dump-prepare.sh does
+        if db:
+            started = time.perf_counter()
+            pipeline([db.dump, [*sink[:2], os.path.join(tmp, 'dumped.sql.gz'), *sink[3:]]], env=db.env)
+            results['dump'] = throughput(time.perf_counter() - started, rows=args.rows)
+    finally:
+        if db and not args.keep_db: db.drop()
+    return results
+
+# Benchmark chunked upload and download of release assets via release-transfer.py
+def bench_transfer(args, stub, tmp):
+    results = {'assets': args.assets, 'asset_bytes': args.asset_mb << 20, 'jobs': args.transfer_jobs}
+    up, down = os.path.join(tmp, 'up'), os.path.join(tmp, 'down')
+    os.makedirs(up)
+    os.makedirs(down)
+
+    # Generate incompressible assets
+    files = []
+    for i in range(args.assets):
+        files.append(os.path.join(up, f'upload-{i:04d}.pack'))
+        with open(files[-1], 'wb') as f:
+            for j in range(args.asset_mb): f.write(random.randbytes(1 << 20))
+
+    # Run release-transfer.py, counting asset bytes actually uploaded or downloaded
+    def transfer(command, *items):
+        cli = [sys.executable, os.path.join(root, 'maintain', 'release-transfer.py'), command, '--repo', 'benchmark/repo',
+               '--release', 'benchmark', '--api-url', stub.url, '--jobs', str(args.transfer_jobs), '--dir', down, *items]
+        requests, transferred, started = stub.requests, stub.bytes, time.perf_counter()
+        result = subprocess.run(cli, env={**os.environ, 'GH_TOKEN': 'benchmark'}, capture_output=True, text=True)
+        if result.returncode != 0: raise RuntimeError(f"release-transfer.py {command} failed: {result.stderr.strip()}")
+        stats = throughput(time.perf_counter() - started, bytes=stub.bytes - transferred)
+        stats['requests'] = stub.requests - requests
+        return stats
+
+    # Upload, download, and download again, when nothing is changed so only checksums manifest should be downloaded,
+    # so for the latter seconds is the time spent on checking that, rather than on transferring the assets
+    names = [os.path.basename(path) for path in files]
+    results['upload'] = transfer('upload', *files)
+    results['download'] = transfer('download', *names)
+    results['download_unchanged'] = transfer('download', *names)
+    return results
+
+# Suites
+suites = {
+    'stream': bench_stream,
+    'choices': bench_choices,
+    'export': bench_export,
+    'dataset': bench_dataset,
+    'transfer': bench_transfer
+}
+
+# Print comparison of measured results, i.e. durations, latencies and throughputs, of two reports, as percent of change
+def compare(previous, current, path=''):
+    for name, value in current.items():
+        old = previous.get(name) if isinstance(previous, dict) else None
+        if isinstance(value, dict): compare(old or {}, value, f'{path}{name}.')
+        elif (name == 'seconds' or name.endswith(('_per_sec', '_ms'))) and isinstance(old, (int, float)) and old:
+            print(f"  {path}{name}: {old} -> {value} ({(value - old) / old * 100:+.1f}%)")
+
+# Parse arguments
+env = dot_env()
+parser = argparse.ArgumentParser(description='Benchmark wrapper API and backup/restore pipeline offline')
+parser.add_argument('suites', nargs='*', help=f"suites to be run, default: all, i.e. {', '.join(suites)}")
+parser.add_argument('--output', default='', help='report file, default: var/tmp/benchmarks/<date>-<time>.json')
+parser.add_argument('--compare', default='', help='previous report to compare results with')
+parser.add_argument('--lines', type=int, default=200000, help='lines of script output for stream suite')
+parser.add_argument('--requests', type=int, default=20, help='requests per case for choices and export suites')
+parser.add_argument('--releases', type=int, default=300, help='releases on stub server for choices suite')
+parser.add_argument('--table', default='system.field', help='table for export suite, as pdokey.table')
+parser.add_argument('--engine', default=env.get('DB_ENGINE') or 'postgres', help='db engine for dataset suite')
+parser.add_argument('--rows', type=int, default=1000000, help='rows in generated dump for dataset suite')
+parser.add_argument('--tables', type=int, default=4, help='tables in generated dump for dataset suite')
+parser.add_argument('--max-size', default=env.get('GH_ASSET_MAX_SIZE') or '2000m', help='max size of dump chunks')
+parser.add_argument('--dump-jobs', type=int, default=os.cpu_count(), help='jobs to compress dump')
+parser.add_argument('--import-jobs', type=int, default=os.cpu_count(), help='jobs to import dump')
+parser.add_argument('--no-db', action='store_true', help='use client stand-in instead of scratch database')
+parser.add_argument('--keep-db', action='store_true', help='keep scratch database after dataset suite')
+parser.add_argument('--db-host', default='', help='database host, default: DB_ENGINE from .env')
+parser.add_argument('--db-user', default='', help='database root user, default: postgres or root')
+parser.add_argument('--db-password', default=None, help='database root password, default: DB_ROOT_PASSWORD from .env')
+parser.add_argument('--db-name', default='benchmark', help='scratch database name, created and dropped by dataset suite')
+parser.add_argument('--assets', type=int, default=8, help='assets for transfer suite')
+parser.add_argument('--asset-mb', type=int, default=16, help='size of each asset for transfer suite, in megabytes')
+parser.add_argument('--transfer-jobs', type=int, default=int(env.get('TRANSFER_JOBS') or 4), help='assets transferred at a time')
+args = parser.parse_args()
+if unknown := [name for name in args.suites if name not in suites]: parser.error(f"unknown suite: {', '.join(unknown)}")
+
+# Setup report
+os.chdir(root)
+commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+report = {
+    'version': 1,
+    'started': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+    'commit': commit,
+    'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+    'params': {name: value for name, value in vars(args).items() if name not in ('suites', 'output', 'compare', 'db_password')},
+    'results': {}
+}
+
+# Run suites, each in its own temporary dir, against the same stub server
+stub = StubGitHub(args.releases)
+try:
+    for name in args.suites or suites:
+        print(f"Running {name} benchmark...", end='', flush=True)
+        tmp = tempfile.mkdtemp(prefix=f'benchmark-{name}-')
+        try:
+            report['results'][name] = suites[name](args, stub, tmp)
+            print(" Done")
+        except Skip as e:
+            report['results'][name] = {'skipped': str(e)}
+            print(f" Skipped: {e}")
+        except (RuntimeError, OSError) as e:
+            report['results'][name] = {'failed': str(e)}
+            print(f" Failed: {e}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+finally:
+    stub.stop()
+
+# Save report
+output = args.output or os.path.join('var', 'tmp', 'benchmarks', time.strftime('%Y%m%d-%H%M%S') + '.json')
+os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+with open(output, 'w') as f: json.dump(report, f, indent=2)
+print(json.dumps(report['results'], indent=2))
+print(f"Report saved into {output}")
+
+# Compare with previous report, if given
+if args.compare:
+    with open(args.compare) as f: previous = json.load(f)
+    print(f"Changes since {args.compare} ({previous.get('commit', '')[:7]}):")
+    if differ := [name for name, value in report['params'].items() if previous.get('params', {}).get(name, value) != value]:
+        print(f"  Note: params differ, so results may be not comparable: {', '.join(differ)}")
+    compare(previous.get('results', {}), report['results'])
@@ -0,0 +1,69 @@
+#!/bin/bash
+
+# Load functions
+source maintain/functions.sh
+
+# Set the trap: Call on_exit function when the script exits
+trap on_exit EXIT
+
+# If docker is installed - it means benchmark-command is being run on host
+if command -v docker >/dev/null 2>&1; then
+
+  # Add -i if we're in interactive shell
+  [[ $- == *i* ]] && bash_flags=(-i) || bash_flags=()
+
+  # Execute benchmark-command within the container environment passing all arguments, if any
+  docker compose exec -it -e TERM="$TERM" wrapper bash "${bash_flags[@]}" "maintain/$(basename "${BASH_SOURCE[0]}")" $@
+
+# Else it means we're in the wrapper-container, so proceed with the benchmark
+else
+
+  # Goto project root
+  cd "$DOC"
+
+  # Quantities of jobs to compare, e.g. 'maintain/dump-benchmark.sh 1 4 8', where 1 is the single-core path
+  modes="${@:-1 $(nproc)}"
+
+  # Directory where dumps are created, and removed afterwards
+  base="var/tmp/dump-benchmark"
+
+  # Print header
+  printf "%-6s %10s %10s %10s %6s %10s %s\n" "JOBS" "WALL, s" "USER, s" "SYS, s" "CPU" "SIZE" "CHECK"
+
+  # Foreach mode
+  for jobs in $modes; do
+
+    # Shortcuts
+    dir="$base/$jobs"
+    log="$base/$jobs.log"
+    rm -rf "$dir" && mkdir -p "$dir"
+
+    # Run dump-prepare script with given quantity of jobs, and measure wall time
+    # as well as user and system cpu time spent by the script and all its children
+    TIMEFORMAT="%R %U %S"
+    { time DUMP_JOBS=$jobs bash maintain/dump-prepare.sh "$dir" > "$log" 2>&1; } 2> "$base/$jobs.time"; exit_code=$?
+    read -r real user sys < "$base/$jobs.time"
+
+    # If dump failed - print the log and proceed to next mode
+    if [[ $exit_code -ne 0 ]]; then
+      echo "$jobs: dump-prepare.sh exited with code $exit_code:"; tail -n 20 "$log"
+      continue
+    fi
+
+    # Check whether each dump is a valid gzip stream when chunks are joined, i.e. importable by import_possibly_chunked_dump()
+    check="ok"
+    for dump in $(ls -1 "$dir" | sed -E 's~[0-9]{2}$~~' | sort -u); do
+      cat "$dir/$dump"* | gzip -t 2> /dev/null || check="invalid $dump"
+    done
+
+    # Get total size of dumps
+    size=$(du -scbh "$dir" 2> /dev/null | awk '/total/ {print $1}')
+
+    # Print results
+    printf "%-6s %10s %10s %10s %5s%% %10s %s\n" "$jobs" "$real" "$user" "$sys" \
+      "$(awk -v r="$real" -v u="$user" -v s="$sys" 'BEGIN { printf "%d", r > 0 ? (u + s) / r * 100 : 0 }')" "$size" "$check"
+  done
+
+  # Cleanup
+  rm -rf "$base"
+fi
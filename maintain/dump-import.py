@@ -0,0 +1,249 @@
+import os, re, sys, gzip, time, shutil, tempfile, subprocess, argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Read plain sql dump from stdin and import it via given db client command, using several client sessions in parallel:
+#
+#  1. Schema part of the dump is imported via single session while the dump is being read,
+#     and data part is spooled into temporary gzip-compressed files, one per table
+#  2. Data of each table is imported via separate session, with up to --jobs sessions at a time
+#  3. Indexes and constraints (except foreign keys) are built, with statements for different tables run in parallel
+#  4. Everything else, i.e. foreign keys, triggers, sequence values and views, is imported via single session
+#
+# Dump is split into parts based on comments written by pg_dump (e.g. '-- Data for Name: ...; Type: TABLE DATA; ...')
+# or mysqldump (e.g. '-- Dumping data for table `...`'), so both COPY-based and INSERT-based dumps are supported. If the
+# dump has no such comments - it's imported as is via single session, same as it would be by piping it to client command.
+# If --size is given, e.g. size of the gzipped dump, and spool directory has less free space than that - the dump is also
+# imported as is via single session, as spooled data would not fit there
+
+# Postgres TOC entry comment, e.g. '-- Name: t t_pkey; Type: CONSTRAINT; Schema: public; Owner: -'
+pg_entry = re.compile(rb'^-- (Data for )?Name: (.+?); Type: ([A-Z ]+); Schema: (.*?); Owner: ')
+
+# Postgres TOC entry types, which are built in parallel per table after data is imported
+pg_parallel = (b'CONSTRAINT', b'INDEX')
+
+# Table affected by a postgres CONSTRAINT or INDEX statement
+pg_table = re.compile(rb'(?:^ALTER TABLE (?:ONLY )?| ON (?:ONLY )?)(\S+)', re.M)
+
+# Postgres session settings which should be applied in each session, and psql's \restrict meta-command
+pg_setting = re.compile(rb'^(SET |SELECT pg_catalog\.set_config\(|\\restrict )')
+
+# Mysqldump section comments
+my_section = re.compile(rb'^-- (Table structure for table|Dumping data for table|Temporary view structure for view|'
+                        rb'Final view structure for view|Dumping events|Dumping routines) `?(.*?)`?$')
+
+# Mysql session settings written at the beginning of the dump, e.g. '/*!40014 SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0 */;'
+my_setting = re.compile(rb'^(/\*!\d+ )?SET ')
+
+# Mysql statements wrapping table data, which are not needed when each table is imported via separate session
+my_wrapping = re.compile(rb'^(LOCK TABLES |UNLOCK TABLES;|/\*!40000 ALTER TABLE .* (DISABLE|ENABLE) KEYS \*/;)')
+
+# Dump being split into parts
+class Dump:
+
+    def __init__(self, engine, spool):
+        self.engine = engine
+        self.spool = spool
+        self.header = []
+        self.tables = {}
+        self.rows = 0
+        self.parallel = {}
+        self.serial = []
+        self.sections = 0
+
+    # Get spool file for data of a given table, creating it if not yet exists. Fastest compression level is used
+    # so that spooling won't slow down reading the dump, while still taking several times less disk space
+    def table(self, name):
+        if name not in self.tables:
+            self.tables[name] = gzip.open(os.path.join(self.spool, f'{len(self.tables)}.sql.gz'), 'wb', compresslevel=1)
+        return self.tables[name]
+
+    # Count rows in a line of INSERT-based table data
+    def count(self, line):
+        if line.startswith(b'INSERT INTO '): self.rows += line.count(b'),(') + (not line.rstrip().endswith(b'VALUES'))
+        elif line.startswith(b'\t('): self.rows += 1
+
+    # Read postgres dump, writing schema part into given stream
+    def read_postgres(self, lines, schema):
+        kind, target, copy, entry, data_seen = None, None, False, [], False
+
+        # Flush collected post-data entry
+        def flush():
+            if kind is None or not entry: return
+            if kind in pg_parallel and (match := pg_table.search(b''.join(entry))):
+                self.parallel.setdefault(match.group(1), []).append(b''.join(entry))
+            else:
+                self.serial.append(b''.join(entry))
+
+        for line in lines:
+
+            # If it's a line of COPY data - spool it
+            if copy:
+                target.write(line)
+                if line == b'\\.\n': copy = False
+                else: self.rows += 1
+                continue
+
+            # Remember session settings written before the first TOC entry, to be applied in other sessions as well
+            if not self.sections and pg_setting.match(line): self.header.append(line)
+
+            # If it's a TOC entry comment - detect where the entry should go
+            if line.startswith(b'-- ') and (match := pg_entry.match(line)):
+                self.sections += 1
+                if data_seen: flush()
+                entry = []
+                if match.group(1):
+                    kind, target, data_seen = 'data', self.table(match.group(4) + b'.' + match.group(2)), True
+                elif data_seen:
+                    kind, target = match.group(3), None
+                else:
+                    kind, target = 'schema', None
+
+            # Route line
+            if kind == 'data':
+                target.write(line)
+                if line.startswith(b'COPY ') and line.rstrip().endswith(b'FROM stdin;'): copy = True
+                else: self.count(line)
+            elif data_seen:
+                entry.append(line)
+            else:
+                schema.write(line)
+
+        # Flush last entry
+        flush()
+
+    # Read mysql dump, writing schema part into given stream
+    def read_mysql(self, lines, schema):
+        kind, target, post, delimited = None, None, [], False
+
+        for line in lines:
+
+            # Keep track of DELIMITER-blocks, as lines of triggers' bodies should not be mistaken for table data
+            if line.startswith(b'DELIMITER '): delimited = not line.startswith(b'DELIMITER ;\n')
+
+            # If it's a section comment - detect where the section should go
+            if line.startswith(b'-- ') and (match := my_section.match(line)):
+                self.sections += 1
+                section = match.group(1)
+                if section == b'Dumping data for table': kind, target = 'data', self.table(match.group(2))
+                elif section in (b'Table structure for table', b'Temporary view structure for view'): kind = 'schema'
+                else: kind = 'post'
+
+            # Remember session settings written before the first section, to be applied in other sessions as well
+            if kind is None and my_setting.match(line): self.header.append(line)
+
+            # Route line: table data into spool file, anything following table data, i.e. triggers - into post-data
+            if kind == 'data':
+                if line.startswith(b'INSERT INTO ') and not delimited:
+                    target.write(line)
+                    self.count(line)
+                elif not my_wrapping.match(line) and line.strip() and not line.startswith(b'--'):
+                    post.append(line)
+            elif kind == 'post':
+                post.append(line)
+            else:
+                schema.write(line)
+
+        # Mysql post-data is imported as a whole
+        self.serial.append(b''.join(post))
+
+# Run client command feeding it with header, followed by given chunks of sql and/or spool files
+def run(command, header, *parts, wrap=(b'', b'')):
+    proc = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        proc.stdin.write(b''.join(header) + wrap[0])
+        for part in parts:
+            if isinstance(part, bytes): proc.stdin.write(part)
+            else:
+                with gzip.open(part, 'rb') as f: shutil.copyfileobj(f, proc.stdin, 1 << 20)
+        proc.stdin.write(wrap[1])
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass
+    if proc.wait() != 0: raise RuntimeError(f"{command[0]} exited with code {proc.returncode}")
+
+# Run given tasks in parallel, and raise the first failure, if any
+def parallel(jobs, fn, items):
+    with ThreadPoolExecutor(jobs) as pool:
+        for future in [pool.submit(fn, item) for item in items]: future.result()
+
+# Print message with elapsed time
+def report(prefix, msg, started):
+    print(f"{prefix}{msg} in {time.time() - started:.1f}s", flush=True)
+
+# Parse arguments
+parser = argparse.ArgumentParser(description='Import plain sql dump from stdin using several db sessions in parallel')
+parser.add_argument('--engine', default='postgres', help='db engine: postgres, mysql or mariadb')
+parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='quantity of sessions to be used in parallel')
+parser.add_argument('--prefix', default='', help='prefix for each printed message')
+parser.add_argument('--spool', default=None, help='directory for temporary files')
+parser.add_argument('--size', type=int, default=0, help='minimum free space in spool directory, in bytes')
+parser.add_argument('command', nargs=argparse.REMAINDER, help='db client command, e.g. -- psql -h host -U user -d name')
+args = parser.parse_args()
+command = args.command[1:] if args.command[:1] == ['--'] else args.command
+
+# Setup transaction wrapping for table data sessions: mysql would otherwise commit each INSERT separately
+wrap = (b'SET autocommit=0;\n', b'\nCOMMIT;\n') if args.engine != 'postgres' else (b'', b'')
+
+# If spool directory has not enough free space - import the dump as is via single session
+if (free := shutil.disk_usage(args.spool or tempfile.gettempdir()).free) < args.size:
+    print(f"{args.prefix}Not enough free space for spool files ({free:,} of {args.size:,} bytes), "
+          f"importing as a single stream", flush=True)
+    sys.exit(1 if subprocess.run(command).returncode else 0)
+
+# Create directory for spool files
+spool = tempfile.mkdtemp(prefix='.import-', dir=args.spool)
+try:
+
+    # Read the dump, importing schema part right away and spooling data part
+    started = time.time()
+    dump = Dump(args.engine, spool)
+    schema = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        if args.engine == 'postgres': dump.read_postgres(sys.stdin.buffer, schema.stdin)
+        else: dump.read_mysql(sys.stdin.buffer, schema.stdin)
+        schema.stdin.close()
+    except BrokenPipeError:
+        pass
+    if schema.wait() != 0: raise RuntimeError(f"{command[0]} exited with code {schema.returncode}")
+
+    # Close spool files, remembering uncompressed size of each
+    sizes = {}
+    for f in dump.tables.values():
+        sizes[f.name] = f.tell()
+        f.close()
+
+    # If dump has no recognizable parts - it was imported as is via schema session
+    if not dump.sections:
+        report(args.prefix, "Imported as a single stream", started)
+        sys.exit(0)
+    report(args.prefix, "Schema imported", started)
+
+    # Import data of the biggest tables first, so that the import won't end up waiting for a single big table,
+    # and remove each spool file once imported
+    started = time.time()
+    files = sorted((file for file, size in sizes.items() if size), key=sizes.get, reverse=True)
+    parallel(args.jobs, lambda file: (run(command, dump.header, file, wrap=wrap), os.remove(file)), files)
+    elapsed = max(time.time() - started, 0.001)
+    print(f"{args.prefix}Data imported: {len(files)} tables, {dump.rows:,} rows in {elapsed:.1f}s "
+          f"({dump.rows / elapsed:,.0f} rows/sec)", flush=True)
+
+    # Build indexes and constraints, in parallel for different tables
+    if dump.parallel:
+        started = time.time()
+        parallel(args.jobs, lambda statements: run(command, dump.header, *statements), dump.parallel.values())
+        report(args.prefix, f"Indexes and constraints built: {sum(map(len, dump.parallel.values()))} statements", started)
+
+    # Import the rest
+    if any(dump.serial):
+        started = time.time()
+        run(command, dump.header, *dump.serial)
+        report(args.prefix, "Foreign keys, triggers and the rest imported", started)
+
+# Print error and exit
+except RuntimeError as e:
+    print(f"{args.prefix}{e}", file=sys.stderr)
+    sys.exit(1)
+
+# Remove spool files
+finally:
+    shutil.rmtree(spool, ignore_errors=True)
@@ -31,15 +31,69 @@ else
   # Goto project root
   cd "$DOC"
 
+  # Get quantity of parallel jobs, with 'auto' meaning quantity of CPU cores
+  jobs="${DUMP_JOBS:-$(get_env "DUMP_JOBS")}"; [[ "$jobs" =~ ^[0-9]+$ ]] && (( jobs > 0 )) || jobs=$(nproc)
+
+  # Use pigz for compression if installed, as it compresses using all jobs, else gzip. That is needed only
+  # if python3 is not available, as otherwise dump-sink.py compresses in parallel by itself
+  if (( jobs > 1 )) && command -v pigz >/dev/null; then gzip_bin="pigz -p $jobs"; else gzip_bin="gzip"; fi
+
   # Prepare DBE-specific shortcuts
   if [[ "$engine" == "postgres" ]]; then
     pwdenv="PGPASSWORD"
     args="-h $host -U $user -t -q -d $name -c"
     schemas="system public"
     rows="SELECT SUM(c.reltuples::bigint) FROM pg_catalog.pg_class c JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace WHERE c.relkind = 'r' AND n.nspname IN ('${schemas/ /"','"}')"
+
+    # Table signatures as 'schema, table, definition signature, data signature' rows. Definition signature is changed by
+    # any DDL on the table, its columns, defaults, constraints, indexes, triggers or comments, and data signature is changed
+    # by any insert, update or delete, as well as by truncate, as it gives the table a new relfilenode. Data signature is
+    # the live count of rows along with the sum of their xmin, i.e. ids of transactions that created row versions, so it
+    # can't lag behind as pg_stat_user_tables counters do, as those are flushed asynchronously and can be reset
+    signs="SELECT n.nspname, c.relname, md5(concat_ws('|', c.oid, c.xmin,
+        (SELECT string_agg(a.xmin::text, ',' ORDER BY a.attnum) FROM pg_catalog.pg_attribute a WHERE a.attrelid = c.oid),
+        (SELECT string_agg(d.xmin::text, ',' ORDER BY d.oid) FROM pg_catalog.pg_attrdef d WHERE d.adrelid = c.oid),
+        (SELECT string_agg(x.xmin::text, ',' ORDER BY x.oid) FROM pg_catalog.pg_constraint x WHERE x.conrelid = c.oid),
+        (SELECT string_agg(i.xmin::text || '.' || ic.xmin::text, ',' ORDER BY i.indexrelid) FROM pg_catalog.pg_index i JOIN pg_catalog.pg_class ic ON ic.oid = i.indexrelid WHERE i.indrelid = c.oid),
+        (SELECT string_agg(t.xmin::text, ',' ORDER BY t.oid) FROM pg_catalog.pg_trigger t WHERE t.tgrelid = c.oid),
+        (SELECT string_agg(e.xmin::text, ',' ORDER BY e.objsubid) FROM pg_catalog.pg_description e WHERE e.objoid = c.oid)
+      )), concat_ws(':', c.relfilenode, (xpath('/row/s/text()', query_to_xml(format(
+        'SELECT count(*) || '':'' || coalesce(sum(xmin::text::bigint), 0) AS s FROM ONLY %I.%I', n.nspname, c.relname), false, true, '')))[1]::text)
+      FROM pg_catalog.pg_class c JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+      WHERE c.relkind IN ('r', 'p') AND n.nspname IN ('${schemas/ /"','"}') ORDER BY 1, 2"
+    table_signs() { $cli -A -F $'\t' $args "$signs"; }
+
+    # Dump data of given tables in $schema, prepended with statements to clear those tables. Foreign keys are not
+    # checked while clearing, as the data of referencing tables is either kept as is, or is replaced as well
+    delta_cmd() {
+      local table tables=()
+      echo "SET session_replication_role = replica;"
+      for table in "$@"; do
+        echo "DELETE FROM \"$schema\".\"$table\";" && tables+=(-t "\"$schema\".\"$table\"")
+      done
+      $dump_bin -h $host -U $user -d $name --data-only --no-owner --no-acl --no-publications "${tables[@]}"
+    }
     dump_bin="pg_dump"
-    dump_cmd="$dump_bin -h $host -U $user -d $name -n ~schema~ --no-owner --no-acl --no-publications --inserts --rows-per-insert=1000"
-    gzip_cmd() { grep -vE "^(CREATE SCHEMA|COMMENT ON SCHEMA)" | gzip; }
+    dump_cmd="$dump_bin -h $host -U $user -d $name -n ~schema~ --no-owner --no-acl --no-publications"
+    drop="CREATE SCHEMA|COMMENT ON SCHEMA"
+    gzip_cmd() { grep -vE "^($drop)" | $gzip_bin; }
+
+    # If parallel jobs are enabled - dump tables in parallel into directory-format dump and then convert it into
+    # plain sql, same as the one dumped directly. Progress is printed based on the qty of tables dumped so far
+    if (( jobs > 1 )); then
+      dump_cmd="pg_dump_parallel ~schema~"
+      pg_dump_parallel() {
+        local tmp="$dir/.$1.dir"; rm -rf "$tmp"
+        $dump_bin -h $host -U $user -d $name -n "$1" -Fd -j $jobs -Z 1 -f "$tmp" -v 2> >(awk -v total="$tbl" -v msg="$msg" '{
+            if ($0 ~ /finished item [0-9]+ TABLE DATA/) printf "\r%s %d / %d tables", msg, ++count, total > "/dev/stderr"
+            else if ($0 ~ /^pg_dump: (error|warning|detail|hint)/) print "\n" $0 > "/dev/stderr"
+            fflush()
+          }') || { local code=$?; rm -rf "$tmp"; return $code; }
+        pg_restore -f - --no-owner --no-acl --no-publications "$tmp"; local code=$?
+        rm -rf "$tmp"
+        return $code
+      }
+    fi
   else
     pwdenv="MYSQL_PWD"
     args="-h $host -u $user -N -e"
@@ -50,7 +104,34 @@ else
       *)       dump_bin="mysqldump" ;;
     esac
     dump_cmd="$dump_bin -h $host -u $user -y ~schema~ --single-transaction"
-    gzip_cmd() { gzip; }
+    drop=""
+    gzip_cmd() { $gzip_bin; }
+
+    # Table signatures as 'schema, table, definition signature, data signature' rows, same as for postgres.
+    # Data signature is the live checksum of table contents, as InnoDB does not track modifications anywhere else
+    signs="SELECT t.TABLE_SCHEMA, t.TABLE_NAME, MD5(CONCAT_WS('|', t.ENGINE, t.TABLE_COLLATION, t.TABLE_COMMENT,
+        (SELECT GROUP_CONCAT(CONCAT_WS(',', c.COLUMN_NAME, c.COLUMN_TYPE, c.IS_NULLABLE, c.COLUMN_DEFAULT, c.EXTRA, c.COLLATION_NAME, c.COLUMN_COMMENT)
+          ORDER BY c.ORDINAL_POSITION SEPARATOR ';') FROM INFORMATION_SCHEMA.COLUMNS c WHERE c.TABLE_SCHEMA = t.TABLE_SCHEMA AND c.TABLE_NAME = t.TABLE_NAME),
+        (SELECT GROUP_CONCAT(CONCAT_WS(',', s.INDEX_NAME, s.SEQ_IN_INDEX, s.COLUMN_NAME, s.NON_UNIQUE, s.SUB_PART, s.INDEX_TYPE)
+          ORDER BY s.INDEX_NAME, s.SEQ_IN_INDEX SEPARATOR ';') FROM INFORMATION_SCHEMA.STATISTICS s WHERE s.TABLE_SCHEMA = t.TABLE_SCHEMA AND s.TABLE_NAME = t.TABLE_NAME),
+        (SELECT GROUP_CONCAT(CONCAT_WS(',', k.CONSTRAINT_NAME, k.COLUMN_NAME, k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME)
+          ORDER BY k.CONSTRAINT_NAME, k.ORDINAL_POSITION SEPARATOR ';') FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE k WHERE k.TABLE_SCHEMA = t.TABLE_SCHEMA AND k.TABLE_NAME = t.TABLE_NAME),
+        (SELECT GROUP_CONCAT(CONCAT_WS(',', g.TRIGGER_NAME, g.CREATED, g.ACTION_STATEMENT)
+          ORDER BY g.TRIGGER_NAME SEPARATOR ';') FROM INFORMATION_SCHEMA.TRIGGERS g WHERE g.EVENT_OBJECT_SCHEMA = t.TABLE_SCHEMA AND g.EVENT_OBJECT_TABLE = t.TABLE_NAME)
+      )) FROM INFORMATION_SCHEMA.TABLES t
+      WHERE t.TABLE_SCHEMA IN ('${schemas/ /"','"}') AND t.TABLE_TYPE = 'BASE TABLE' ORDER BY 1, 2"
+    table_signs() {
+      local ddl="$($cli -B $args "$signs")"; [[ -n "$ddl" ]] || return 0
+      local list="$(awk -F '\t' '{ printf "%s`%s`.`%s`", NR > 1 ? ", " : "", $1, $2 }' <<< "$ddl")"
+      awk -F '\t' 'NR == FNR { sum[$1] = $2; next } { print $0 "\t" sum[$1 "." $2] }' <($cli -B $args "CHECKSUM TABLE $list") - <<< "$ddl"
+    }
+
+    # Dump data of given tables in $schema, prepended with statements to clear those tables
+    delta_cmd() {
+      echo "SET FOREIGN_KEY_CHECKS=0;"
+      printf 'TRUNCATE TABLE `%s`;\n' "$@"
+      $dump_bin -h $host -u $user -y "$schema" --single-transaction --no-create-info --skip-triggers "$@"
+    }
   fi
 
   # Query shortcut
@@ -69,39 +150,101 @@ else
   # Pick GH_ASSET_MAX_SIZE from .env
   export GH_ASSET_MAX_SIZE="$(grep "^GH_ASSET_MAX_SIZE=" .env | cut -d '=' -f 2-)"
 
+  # If manifest is requested, which is the case when incremental backups are enabled - save signatures of all tables
+  # into $dir/tables.json before dumping, so that any change made while dumping will be detected by the next backup
+  delta=false; dumps=()
+  [ -d "$dir" ] || mkdir -p "$dir"
+  if [[ "${DUMP_MANIFEST:-}" = "1" || -n "${DUMP_DELTA:-}" ]]; then
+    msg="${pref}Detecting changes in tables..."; echo $msg
+    table_signs | jq -R -n --arg engine "$engine" '{engine: $engine, base: null, tables: (
+      [inputs | split("\t") | {key: (.[0] + "." + .[1]), value: {ddl: .[2], data: .[3]}}] | from_entries
+    ), changed: [], dumps: []}' > "$dir/tables.json"
+    clear_last_lines 1
+
+    # If delta dump is requested - get tables having data changed since the base backup, which manifest is given
+    # by DUMP_DELTA, or '-' if any tables were created, dropped or altered since then, so full dump is needed
+    if [[ -n "${DUMP_DELTA:-}" && -f "${DUMP_DELTA:-}" ]]; then
+      changed="$(jq -r -n --slurpfile base "$DUMP_DELTA" --slurpfile now "$dir/tables.json" '$base[0] as $b | $now[0] as $n |
+        if $b.engine != $n.engine or ($b.tables | keys) != ($n.tables | keys) or any($n.tables | to_entries[]; .value.ddl != $b.tables[.key].ddl)
+        then "-" else $n.tables | to_entries[] | select(.value.data != $b.tables[.key].data) | .key end')"
+
+      # If full dump is needed - print why, else set up delta-flag and remember base backup and changed tables in manifest
+      if [[ "$changed" = "-" ]]; then
+        echo "$msg Tables were created, dropped or altered since the base backup, so doing full dump"
+      else
+        delta=true
+        echo "$msg $(grep -c . <<< "$changed" || true) tables changed since the base backup"
+        jq --slurpfile base "$DUMP_DELTA" --arg changed "$changed" \
+          '.base = $base[0].release | .changed = ($changed | split("\n") | map(select(length > 0)))' \
+          "$dir/tables.json" > "$dir/tables.json.tmp" && mv "$dir/tables.json.tmp" "$dir/tables.json"
+      fi
+    else
+      echo "$msg Done"
+    fi
+
+  # Else remove manifest left from previous dump, if any
+  else
+    rm -f "$dir/tables.json"
+  fi
+
   # Foreach schema
   for schema in $schemas; do
 
     # Shortcuts
     dump="$dir/$schema.sql.gz"
-    base=$dump*
+    delta_dump="$dir/$schema.delta.sql.gz"
+    total="$qty"
 
-    # Remove existing gz file with chunks, if any
-    rm -f $base*
+    # Remove existing gz files with chunks, if any, including delta ones, which are obsolete for a newer full dump
+    rm -f $dump* $delta_dump*
 
-    # Export dump with printing progress
-    [ -d "$dir" ] || mkdir -p "$dir"
+    # If it's a delta dump - dump data of tables changed since the base backup only, if any. Those
+    # tables are cleared by the delta dump itself, so it's imported right after the base full dump
+    if [[ $delta = true ]]; then
+      tables=(); while IFS= read -r table; do [[ "$table" = "$schema."* ]] && tables+=("${table#"$schema."}"); done <<< "$changed"
+      (( ${#tables[@]} )) || continue
+      dump="$delta_dump" && total=0
+      export_cmd() { delta_cmd "${tables[@]}"; }
+    else
+      export_cmd() { ${dump_cmd/~schema~/"$schema"}; }
+    fi
+    base=$dump*
+
+    # Export dump with printing progress. If python3 is available - dump is read once by dump-sink.py, which counts
+    # rows, compresses and splits into chunks, else it's copied via tee into awk for counting and then into gzip and
+    # split. Progress is printed as text, unless DUMP_PROGRESS=json is given to have it as json lines
     msg="${pref}Exporting $(basename "$dump") into $dir/ dir...";
-    ${dump_cmd/~schema~/"$schema"} | tee >(grep --line-buffered '^INSERT INTO' | awk -v total="$qty" -v msg="$msg" '{
-        count += gsub(/\),\(/, "&") + 1
-        percent = int((count / total) * 100)
-        if (percent != last) {
-          printf "\r%s %d / %d (%d%%)", msg, count, total, percent
-          fflush()
-          last = percent
-        }
-      }' >&2) \
-    | gzip_cmd | split --bytes=${GH_ASSET_MAX_SIZE^^} --numeric-suffixes=1 - $dump
+    if command -v python3 > /dev/null; then
+      export_cmd | python3 maintain/dump-sink.py "$dump" --max-size "$GH_ASSET_MAX_SIZE" --total "$total" --msg "$msg" \
+        --jobs "$jobs" --progress "${DUMP_PROGRESS:-text}" ${drop:+--drop "$drop"}
+    else
+      export_cmd | tee >(awk -v total="$total" -v msg="$msg" '
+        /^COPY .* FROM stdin;$/ { copy = 1; next }
+        copy && /^\\\.$/        { copy = 0; next }
+        copy                    { count++ }
+        /^INSERT INTO/          { count += gsub(/\),\(/, "&") + 1 }
+        total > 0 {
+          percent = int((count / total) * 100)
+          if (percent != last) {
+            printf "\r%s %d / %d (%d%%)", msg, count, total, percent
+            fflush()
+            last = percent
+          }
+        }' >&2) \
+      | gzip_cmd | split --bytes=${GH_ASSET_MAX_SIZE^^} --numeric-suffixes=1 - $dump
+    fi
 
     # Exit if above command failed
-    exit_code=${PIPESTATUS[0]}; if [[ $exit_code -ne 0 ]]; then echo "$dump_bin exited with code $exit_code"; exit $exit_code; fi
+    codes=("${PIPESTATUS[@]}")
+    exit_code=${codes[0]}; if [[ $exit_code -ne 0 ]]; then echo "$dump_bin exited with code $exit_code"; exit $exit_code; fi
+    exit_code=${codes[-1]}; if [[ $exit_code -ne 0 ]]; then echo "Compressing exited with code $exit_code"; exit $exit_code; fi
 
     echo ""
     clear_last_lines 1
     echo -n "$msg Done"
 
-    # Remove suffix from single chunk
-    chunks=($base); if [ "${#chunks[@]}" -eq 1 ]; then mv "${chunks[0]}" $dump; fi
+    # Remove suffix from single chunk, if not yet removed
+    chunks=($base); if [ "${#chunks[@]}" -eq 1 ] && [ "${chunks[0]}" != "$dump" ]; then mv "${chunks[0]}" $dump; fi
 
     # Get and print gzipped dump size
     size=$(du -scbh $base 2> /dev/null | awk '/total/ {print $1}' | sed -E 's~^[0-9.]+~& ~'); echo -n ", ${size,,}b"
@@ -114,8 +257,14 @@ else
 
     # Print newline
     echo ""
+    dumps+=("$(basename "$dump")")
   done
 
+  # Remember dumps in manifest, as for delta backup they're the only ones to be downloaded from the backup itself
+  if [[ -f "$dir/tables.json" ]]; then
+    jq '.dumps = $ARGS.positional' "$dir/tables.json" --args "${dumps[@]}" > "$dir/tables.json.tmp" && mv "$dir/tables.json.tmp" "$dir/tables.json"
+  fi
+
   # Unset from env
   unset "$pwdenv"
 fi
\ No newline at end of file
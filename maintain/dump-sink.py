@@ -0,0 +1,183 @@
+import os, re, sys, json, time, zlib, argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Read plain sql dump from stdin, count rows for progress, compress and write into chunk files, all in a single pass.
+# This replaces 'tee | awk' for counting, 'gzip' for compressing and 'split' for chunking, so the dump is no more
+# copied through several processes. Rows are counted by searching for lines starting with 'COPY ' and 'INSERT INTO '
+# rather than by matching each line against a regex: COPY data rows are counted as newlines up to the '\.' line,
+# and INSERT rows are counted as '),(' occurrences within INSERT lines. If --jobs is more than 1, the dump is cut
+# into blocks compressed in parallel, each as a separate gzip member, as concatenated gzip members are a valid gzip
+# stream, decompressed by gunzip same as a single one. Compressed stream is written into '<output>01', '<output>02'
+# etc files of at most --max-size bytes, same as 'split --numeric-suffixes=1' does, and if there is only one
+# such file it's renamed to '<output>'
+
+# Read buffer size
+buffer_size = 1 << 20
+
+# Size of blocks compressed in parallel
+block_size = 4 << 20
+
+# Parse size like '2000m', as accepted by 'split --bytes' command
+def parse_size(value):
+    match = re.fullmatch(r'(\d+)([kmg]?)b?', value.strip().lower())
+    if not match: raise argparse.ArgumentTypeError(f"invalid size: {value}")
+    return int(match.group(1)) * 1024 ** ' kmg'.index(match.group(2) or ' ')
+
+# Rows counter, fed by complete lines. Lines matching drop-regex outside of table data are removed from the output
+class Counter:
+
+    def __init__(self, drop=None):
+        self.rows = 0
+        self.copy = False
+        self.drop = re.compile(rb'^(?:' + drop.encode() + rb').*\n', re.M) if drop else None
+
+    # Count rows in given complete lines, and return lines to be written
+    def feed(self, data):
+        pos, out = 0, []
+        while pos < len(data):
+
+            # If within COPY data - count lines up to the '\.' line, if it's there
+            if self.copy:
+                if data.startswith(b'\\.\n', pos): end = pos
+                elif (i := data.find(b'\n\\.\n', pos)) >= 0: end = i + 1
+                else:
+                    self.rows += data.count(b'\n', pos)
+                    out.append(data[pos:])
+                    break
+                self.rows += data.count(b'\n', pos, end)
+                self.copy = False
+                out.append(data[pos:end + 3])
+                pos = end + 3
+                continue
+
+            # Find next COPY or INSERT line
+            copy, insert = self.find(data, b'COPY ', pos), self.find(data, b'INSERT INTO ', pos)
+            start = min(i for i in (copy, insert, len(data)) if i >= 0)
+
+            # Write lines before it, except the ones to be dropped
+            out.append(self.drop.sub(b'', data[pos:start]) if self.drop and start > pos else data[pos:start])
+            if start == len(data): break
+
+            # Count rows in INSERT line, or detect start of COPY data
+            end = data.find(b'\n', start) + 1
+            if start == insert: self.rows += data.count(b'),(', start, end) + 1
+            elif data[start:end].rstrip().endswith(b'FROM stdin;'): self.copy = True
+            out.append(data[start:end])
+            pos = end
+        return b''.join(out)
+
+    # Find given marker at the beginning of a line, with pos being at the beginning of a line
+    def find(self, data, marker, pos):
+        if data.startswith(marker, pos): return pos
+        i = data.find(b'\n' + marker, pos)
+        return i + 1 if i >= 0 else -1
+
+# Writer of compressed stream into chunk files of at most given size
+class Chunks:
+
+    def __init__(self, output, max_size):
+        self.output = output
+        self.max_size = max_size
+        self.files = []
+        self.file = None
+        self.size = 0
+        self.written = 0
+
+    # Write bytes, starting new chunk file when current one is full
+    def write(self, data):
+        while data:
+            if self.file is None or self.size == self.max_size:
+                if self.file: self.file.close()
+                self.files.append(f'{self.output}{len(self.files) + 1:02d}')
+                self.file = open(self.files[-1], 'wb', buffering=buffer_size)
+                self.size = 0
+            part = data[:self.max_size - self.size]
+            self.file.write(part)
+            self.size += len(part)
+            self.written += len(part)
+            data = data[len(part):]
+
+    # Close last chunk file, and if it's the only one - remove suffix from its name
+    def close(self):
+        if self.file: self.file.close()
+        if len(self.files) == 1: os.replace(self.files[0], self.output)
+
+# Progress printer, printing only if percent is changed, and no more often than twice a second, so that progress
+# redraws won't flood websocket messages when script output is streamed to the UI. If mode is 'json' - progress
+# is printed as json lines, e.g. to be parsed by the caller rather than shown as is
+class Progress:
+
+    def __init__(self, msg, total, mode):
+        self.msg = msg
+        self.total = total
+        self.mode = mode
+        self.percent = None
+        self.printed = 0
+
+    # Print progress, if need
+    def update(self, rows, written, final=False):
+        if self.total <= 0 or self.mode == 'none': return
+        percent = min(int(rows / self.total * 100), 100)
+        if not final and (percent == self.percent or time.monotonic() - self.printed < 0.5): return
+        self.percent, self.printed = percent, time.monotonic()
+        if self.mode == 'json':
+            line = json.dumps({'msg': self.msg, 'rows': rows, 'total': self.total, 'percent': percent, 'bytes': written})
+            sys.stderr.write(line + '\n')
+        else:
+            sys.stderr.write(f"\r{self.msg} {rows} / {self.total} ({percent}%)")
+        sys.stderr.flush()
+
+# Parse arguments
+parser = argparse.ArgumentParser(description='Count rows of sql dump from stdin, compress it and write into chunk files')
+parser.add_argument('output', help='output file, e.g. data/public.sql.gz')
+parser.add_argument('--max-size', type=parse_size, default='2000m', help='max size of chunk file, e.g. 2000m')
+parser.add_argument('--total', type=int, default=0, help='approximate total qty of rows, for progress')
+parser.add_argument('--msg', default='', help='message to be printed before progress')
+parser.add_argument('--progress', choices=['text', 'json', 'none'], default='text', help='progress format')
+parser.add_argument('--jobs', type=int, default=1, help='quantity of threads to compress in parallel')
+parser.add_argument('--level', type=int, default=6, help='gzip compression level')
+parser.add_argument('--drop', default=None, help='regex for lines to be dropped, except table data lines')
+args = parser.parse_args()
+
+# Setup counter, chunks writer and progress printer
+counter = Counter(args.drop)
+chunks = Chunks(args.output, args.max_size)
+progress = Progress(args.msg, args.total, args.progress)
+
+# Read dump by complete lines, with incomplete last line being kept for the next read
+def blocks(size):
+    tail, stdin = b'', sys.stdin.buffer
+    while data := stdin.read(size):
+        data = tail + data
+        cut = data.rfind(b'\n') + 1
+        tail = data[cut:]
+        if cut: yield counter.feed(data[:cut])
+        progress.update(counter.rows, chunks.written)
+    if tail: yield counter.feed(tail + b'\n')[:-1]
+
+try:
+
+    # If single job - compress as a single gzip stream
+    if args.jobs <= 1:
+        gz = zlib.compressobj(args.level, zlib.DEFLATED, 31)
+        for data in blocks(buffer_size): chunks.write(gz.compress(data))
+        chunks.write(gz.flush())
+
+    # Else compress blocks in parallel, as zlib releases the GIL, keeping up to 2 blocks per thread in flight
+    else:
+        with ThreadPoolExecutor(args.jobs) as pool:
+            pending = deque()
+            for data in blocks(block_size):
+                pending.append(pool.submit(zlib.compress, data, args.level, 31))
+                while len(pending) > args.jobs * 2 or pending and pending[0].done(): chunks.write(pending.popleft().result())
+            while pending: chunks.write(pending.popleft().result())
+
+    # Close chunks, having empty gzip stream written if dump was empty, and print final progress
+    if not chunks.written: chunks.write(zlib.compress(b'', args.level, 31))
+    chunks.close()
+    progress.update(counter.rows, chunks.written, True)
+
+# If dump command failed and the pipe was closed - exit
+except (BrokenPipeError, KeyboardInterrupt):
+    sys.exit(1)
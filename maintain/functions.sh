@@ -744,6 +744,23 @@ check_rotated_backup() {
   fi
 }
 
+# Print releases of a given repo from the cache file maintained by wrapper's releases.py, using given
+# jq-expression for each release. Return non-zero if cache does not exist or was checked more than 5 minutes ago
+cached_releases() {
+
+  # Arguments
+  local repo=$1
+  local expr=$2
+  local file="var/tmp/releases/${repo//\//--}.json"
+
+  # If cache file does not exist or is outdated - return
+  [[ -f "$file" ]] || return 1
+  (( $(date +%s) - $(jq -r '.checked | floor' "$file") < 300 )) || return 1
+
+  # Print releases
+  jq -r ".list[] | $expr" "$file"
+}
+
 # Prepare array of [tag name => backup name] pairs
 load_releases() {
 
@@ -759,8 +776,10 @@ load_releases() {
   # If $GH_TOKEN variable is set - work via via GitHub CLI
   if [[ ! -z "${GH_TOKEN:-}" ]]; then
 
-    # Get current repo releases list via GitHub CLI
-    list=$(gh release ls --json name,tagName -R "$repo" --limit 100 --jq '.[] | "\(.tagName)=\(.name)"')
+    # Get current repo releases list from cache, if CACHED=1 was prepended to the command, or via GitHub CLI
+    if [[ "${CACHED:-}" != "1" ]] || ! list=$(cached_releases "$repo" '"\(.tag_name)=\(.name)"'); then
+      list=$(gh release ls --json name,tagName -R "$repo" --limit 100 --jq '.[] | "\(.tagName)=\(.name)"')
+    fi
 
     # Convert into array of [release tag => release name] pairs
     if [[ ${#list} > 0 ]]; then
@@ -772,8 +791,10 @@ load_releases() {
   # Else work via via GitHub API
   else
 
-    # Get current repo releases list
-    list=$(curl -s "https://api.github.com/repos/$repo/releases?per_page=100" | jq -r '.[] | "\(.tag_name)=\(.name)=\(.published_at)"')
+    # Get current repo releases list from cache, if CACHED=1 was prepended to the command, or via GitHub API
+    if [[ "${CACHED:-}" != "1" ]] || ! list=$(cached_releases "$repo" '"\(.tag_name)=\(.name)=\(.published_at)"'); then
+      list=$(curl -s "https://api.github.com/repos/$repo/releases?per_page=100" | jq -r '.[] | "\(.tag_name)=\(.name)=\(.published_at)"')
+    fi
 
     # Convert into array of [release tag => release name] pairs
     if [[ ${#list} > 0 ]]; then
@@ -1052,12 +1073,15 @@ backup() {
   # else tag name is used as is, so any backup already existing under that tag will be overwritten
   prepare_backup_tag "$rotation_period_name"
 
+  # If backup is going to overwrite an existing release which is the base for incremental backups - refuse to do that
+  refuse_to_overwrite_base_backup "$tag"
+
   # Re-assign given tag to the latest commit
   set_tag_hash "$tag" "$(get_head)" && echo ""
 
   # Backup uploads and dump
   backup_uploads "$tag"
-  backup_dump "$tag"
+  backup_dump "$tag" "$rotation_period_name"
 }
 
 # Backup previously prepared database dump and file uploads into github under the given tag
@@ -1076,47 +1100,163 @@ backup_prepared_assets() {
   # Re-assign given tag to the latest commit
   set_tag_hash "$tag" "$(get_head)" && echo "» ---"
 
-  # Prepare chunks list and qty
-  local_chunks=$(ls -1 "$dir/uploads".z* 2> /dev/null | sort -V)
-  local_chunks_qty=$(echo "$local_chunks" | wc -w)
-
-  # If there a more than 1 chunk
-  if (( local_chunks_qty > 1 )); then
-
-    # Upload one by one
-    echo "» Uploading $dir/uploads.zip ($local_chunks_qty chunks):"
-    for local_chunk in $local_chunks; do
-      upload_asset "$local_chunk" "$tag" "» - "
-    done
-
-  # Else download the single file, overwriting the existing one, if any
-  else
-    upload_asset "$dir/uploads.zip" "$tag" "» "
-  fi
+  # Upload uploads chunks and manifest
+  phase_begin upload
+  upload_possibly_chunked_file "$tag" "$dir/upload-*" "upload-*.pack"
 
-  # Backup dump
+  # Backup dump, so that its checksum is published as well, if possible
   for dump in $(get_DB_DUMPS); do
-    upload_asset "$dir/$dump" "$tag" "» "
+    if has_transfer_engine; then
+      transfer_assets upload "$(get_current_repo)" "$tag" "$dir/$dump" || return 1
+    else
+      upload_asset "$dir/$dump" "$tag" "» "
+    fi
   done
+  phase_end upload
 }
 
 # Backup current database dump on github into given release assets of current repo
+# If rotation period is given, and backups of that period are incremental - only tables changed since
+# the base backup are dumped and uploaded, where base backup is the most recent full backup made for
+# any other rotation period, e.g. the most recent daily backup is the base one for hourly backups
 backup_dump() {
 
   # Arguments
   release=$1
+  local period=${2:-}
+
+  # Shortcuts
+  local base="data/tables.base.json"
+  local manifest="" since="" file
+
+  # If incremental backups are enabled - make dump-prepare.sh create manifest with table signatures, and if backup
+  # is an incremental one and base backup still exists on github - make it to dump only tables changed since then
+  if is_incremental_backup_enabled; then
+    manifest=1
+    if [[ -n "$period" ]] && is_incremental_backup "$period" && has_base_backup "$base"; then since="$base"; fi
+  fi
 
-  # Prepare dump
-  source maintain/dump-prepare.sh ""
+  # Prepare dump. Global $delta variable is set up there to indicate whether it's a delta dump
+  phase_begin dump
+  DUMP_MANIFEST="$manifest" DUMP_DELTA="$since" source maintain/dump-prepare.sh ""
+  phase_end dump
 
-  # Upload possibly chunked dumps to github
+  # Upload possibly chunked dumps to github, either full or delta ones, and delete the other ones, if any
+  phase_begin upload
   for file in $(get_DB_DUMPS); do
-    upload_possibly_chunked_file "$release" "data/$file*"
-    clear_last_lines
+    local upload="$file" obsolete="${file/.sql/.delta.sql}"
+    [[ $delta = true ]] && upload="$obsolete" obsolete="$file"
+    if ls data/$upload* > /dev/null 2>&1; then
+      upload_possibly_chunked_file "$release" "data/$upload*"
+      clear_last_lines
+    fi
+    delete_remote_chunks "$release" "$obsolete"
   done
+
+  # If manifest was created - upload it as well, and if it's a full backup of a non-incremental rotation period,
+  # remember the manifest along with release id as the base for further incremental backups
+  if [[ -f data/tables.json ]]; then
+    upload_asset "data/tables.json" "$release"
+    if [[ $delta = false && -n "$period" ]] && ! is_incremental_backup "$period"; then
+      local id="$(gh release view "$release" --json databaseId --jq .databaseId)"
+      jq --argjson id "$id" --arg tag "$release" '.release = {id: $id, tag: $tag}' data/tables.json > "$base"
+    fi
+
+  # Else delete the manifest uploaded by previous backup into the same release, if any,
+  # as otherwise restore would consider the release as an incremental backup
+  else
+    delete_remote_chunks "$release" "tables.json"
+  fi
+  phase_end upload
   echo
 }
 
+# Check whether incremental backups are enabled, i.e. at least one of rotation periods
+# mentioned in BACKUP_INCREMENTAL in .env is having non-zero quantity in BACKUPS
+is_incremental_backup_enabled() {
+  local period pair
+  for period in $(get_env "BACKUP_INCREMENTAL"); do
+    for pair in $(get_env "BACKUPS"); do
+      [[ "$pair" = "$period="* && "${pair#*=}" != "0" ]] && return 0
+    done
+  done
+  return 1
+}
+
+# Check whether backups of a given rotation period are incremental
+is_incremental_backup() {
+  [[ " $(get_env "BACKUP_INCREMENTAL") " = *" $1 "* ]]
+}
+
+# Check whether manifest of the base backup exists locally and the backup itself still exists on github
+has_base_backup() {
+
+  # Arguments
+  local base="$1"
+
+  # Get base backup release id
+  [[ -f "$base" ]] || return 1
+  local id="$(jq -r '.release.id // empty' "$base")"; [[ -n "$id" ]] || return 1
+
+  # Check release is still there, as it might be deleted due to rotation
+  gh api "repos/$(get_current_repo)/releases/$id" --jq .id > /dev/null 2>&1
+}
+
+# Print tags of incremental backups made against a given release as their base backup, if any
+get_dependent_backups() {
+
+  # Arguments
+  local repo="$1"
+  local id="$2"
+  local tag aid
+
+  # Check manifests of other releases, if any, to find the ones referring to the given release as the base one
+  gh api "repos/$repo/releases?per_page=100" --paginate --jq ".[] | select(.id != $id) | .tag_name as \$tag
+    | .assets[] | select(.name == \"tables.json\") | \"\(\$tag) \(.id)\"" | while read -r tag aid; do
+    gh api "repos/$repo/releases/assets/$aid" -H "Accept: application/octet-stream" 2> /dev/null \
+      | jq -e --argjson id "$id" '.base.id == $id' > /dev/null && echo "$tag"
+  done
+}
+
+# Exit with error if given release already exists and has full dumps that are the base for incremental backups,
+# as if those dumps are overwritten, then restoring incremental backups would pair their delta dumps with
+# the full dumps they were not made against. Rotated backups are not affected, as those always get new releases
+refuse_to_overwrite_base_backup() {
+
+  # Arguments
+  local release="$1"
+
+  # Shortcuts
+  local repo="$(get_current_repo)" id dependent
+
+  # If release has no manifest - it can't be the base backup
+  [[ -n "$(load_remote_chunk_list "$repo" "$release" "^tables.json$")" ]] || return 0
+
+  # Get dependent backups, if any
+  id="$(gh release view "$release" -R "$repo" --json databaseId --jq .databaseId)" || return 0
+  dependent="$(get_dependent_backups "$repo" "$id")"; [[ -n "$dependent" ]] || return 0
+
+  # Print error and exit
+  echo "" >&2
+  echo "Backup $repo:$release is the base for incremental backups ${dependent//$'\n'/, }, so it can't be overwritten." >&2
+  echo "Please use another tag, or delete those incremental backups first" >&2
+  exit 1
+}
+
+# Delete remote chunks of a given file, if any, e.g. delta dumps when full dump is uploaded into the same release
+delete_remote_chunks() {
+
+  # Arguments
+  local release="$1"
+  local file="$2"
+  local chunk
+
+  # Do delete
+  for chunk in $(load_remote_chunk_list "$(get_current_repo)" "$release" "^$file"); do
+    echo -n "Deleting obsolete $chunk: " && delete_asset "$chunk" "$release" && echo "Done"
+  done
+}
+
 # Load whitespace-separated list of names of assets that are chunks
 load_remote_chunk_list() {
 
@@ -1143,18 +1283,26 @@ backup_uploads() {
   release=$1
 
   # Prepare uploads
-  source maintain/uploads-prepare.sh "" && asset="$uploads"
+  phase_begin pack
+  source maintain/uploads-prepare.sh ""
+  phase_end pack
 
-  # Upload possibly chunked upload.zip to github using glob pattern uploads.z*
-  upload_possibly_chunked_file $release "${asset%.zip}.z*"
+  # Upload content-addressed chunks and manifest to github using glob pattern upload-*, so that manifest goes last
+  # as it's sorted after chunks. Chunks already uploaded into that release are skipped, as chunk names are derived
+  # from their contents. Any obsolete chunks are deleted, as well as uploads.z* chunks if uploads were zipped before
+  phase_begin upload
+  upload_possibly_chunked_file "$release" "data/upload-*" "upload-*.pack"
+  phase_end upload
 }
 
-# Upload possibly chunked file to github, based on glob pattern
+# Upload possibly chunked file to github, based on glob pattern. If 3rd arg is given, it's a glob pattern for
+# chunks having names derived from their contents, so such chunks are skipped if already exist on github
 upload_possibly_chunked_file() {
 
   # Arguments
   local release="$1"
   local pattern="$2"
+  local immutable="${3:-}"
 
   # Get current repo
   local repo="$(get_current_repo)"
@@ -1169,16 +1317,31 @@ upload_possibly_chunked_file() {
   # If there a more than 1 local chunk
   if (( local_chunks_qty > 1 )); then
 
-    # Upload one by one
+    # Upload several at a time, except the ones already uploaded, if chunks are content-addressed
     echo "Uploading chunks:"
-    for local_chunk in $local_chunks; do
-      upload_asset "$local_chunk" "$release" "» "
-    done
+    if has_transfer_engine; then
+      transfer_assets upload "$repo" "$release" --skip-existing "$immutable" --last "*.json" $local_chunks || return 1
+
+    # Else upload one by one
+    else
+      local skipped=0
+      for local_chunk in $local_chunks; do
+        if [[ -n "$immutable" && "${local_chunk##*/}" == $immutable && " $remote_chunks " == *" ${local_chunk##*/} "* ]]; then
+          skipped=$((skipped + 1))
+        else
+          upload_asset "$local_chunk" "$release" "» "
+        fi
+      done
+      (( skipped == 0 )) || echo "» $skipped unchanged chunk(s) already uploaded, skipped"
+    fi
 
     # Replace newlines with spaces in list of local chunks
     local_chunks="${local_chunks//$'\n'/ }"
 
   # Else upload the single file, overwriting the existing one, if any
+  elif has_transfer_engine; then
+    echo "Uploading $local_chunks into '$repo:$release':"
+    transfer_assets upload "$repo" "$release" $local_chunks || return 1
   else
     upload_asset "$local_chunks" "$release"
   fi
@@ -1278,17 +1441,70 @@ restore_dump() {
   # Shortcut
   local DB_DUMPS="$(get_DB_DUMPS)"
 
-  # If $release arg is given - download each (possibly chunked) dump file
+  # If $release arg is given
   if [[ "$release" != "" ]]; then
+    phase_begin download
+
+    # Remove local delta dumps, if any, as they're applicable only on top of the full dumps they were made against
     for file in $DB_DUMPS; do
-      download_possibly_chunked_file "$repo" "$release" "$file"
+      rm -f "data/${file/.sql/.delta.sql}"*
     done
+
+    # If release is an incremental backup - download full dumps from the base backup, and delta dumps from release itself
+    if get_base_backup "$repo" "$release"; then
+      for file in $DB_DUMPS; do
+        download_possibly_chunked_file "$repo" "$base_release" "$file"
+      done
+      for file in $(jq -r '.dumps[]' var/tmp/tables.json); do
+        download_possibly_chunked_file "$repo" "$release" "$file"
+      done
+
+    # Else download each (possibly chunked) dump file
+    else
+      for file in $DB_DUMPS; do
+        download_possibly_chunked_file "$repo" "$release" "$file"
+      done
+    fi
+    phase_end download
   fi
 
   # Restore downloaded possibly chunked dump
   restore_dump_from_local "data" "" "$step"
 }
 
+# Check whether given release is an incremental backup, and if yes - setup base_release variable with the tag of the
+# base backup, which is the one having full dumps. Manifest of the given release is downloaded into var/tmp/tables.json
+get_base_backup() {
+
+  # Arguments
+  local repo="$1"
+  local release="$2"
+
+  # If release has no manifest - it's a full backup
+  [[ -n "$(load_remote_chunk_list "$repo" "$release" "^tables.json$")" ]] || return 1
+
+  # Download manifest and get base backup release id, if any
+  mkdir -p var/tmp && gh_download "$repo" "$release" "tables.json" "var/tmp"
+  local id="$(jq -r '.base.id // empty' var/tmp/tables.json)"; [[ -n "$id" ]] || return 1
+
+  # Get base backup tag by release id, as base backup might have been moved to another tag due to rotation
+  if [[ ! -z "${GH_TOKEN:-}" ]]; then
+    base_release=$(gh api "repos/$repo/releases/$id" --jq .tag_name 2> /dev/null) || base_release=""
+  else
+    local api="$(get_env "GITHUB_API_URL")"
+    base_release=$(curl -s "${api:-https://api.github.com}/repos/$repo/releases/$id" | jq -r '.tag_name // empty')
+  fi
+
+  # If base backup does not exist anymore - print error and exit
+  if [[ -z "$base_release" ]]; then
+    echo "Base backup of $repo:$release, having full dumps, does not exist anymore, as it was deleted due to rotation" >&2
+    exit 1
+  fi
+
+  # Print where full dumps will be downloaded from
+  echo "Incremental backup detected, so full dumps will be downloaded from $repo:$base_release"
+}
+
 # Restore database from local possibly chunked dump, located in a given directory
 restore_dump_from_local() {
 
@@ -1310,11 +1526,13 @@ restore_dump_from_local() {
   # Stop debezium and/or closetab php processes if any running
   # Shut down db server, clean it's data/ dir and start back
   if [[ $step != "init" ]]; then
+    phase_begin reset
     if [[ $prepend != "" ]]; then
       $fn1 2>&1 | prepend "$prepend"; $fn2 2>&1 | prepend "$prepend"
     else
       $fn1; $fn2
     fi
+    phase_end reset
   fi
 
   # Import each (possibly chunked) dump
@@ -1324,9 +1542,11 @@ restore_dump_from_local() {
   do_missing_db_setup_if_needed
 
   # Do import dumps
+  phase_begin import
   for file in $(get_DB_DUMPS); do
     import_possibly_chunked_dump "$file" "$dir" "$prepend"
   done
+  phase_end import
   [[ "$prepend" != "" ]] && echo -ne "${d}"
 
   # Run debezium-specific sql
@@ -1357,25 +1577,35 @@ import_possibly_chunked_dump() {
   local db_name="$DB_NAME"
 
   if [[ "$engine" == "postgres" ]]; then
-    local run="$cli -h $engine -U $DB_APP_USER -d $db_name -o /dev/null -q -v ON_ERROR_STOP=1"
+    local run=($cli -h $engine -U $DB_APP_USER -d $db_name -o /dev/null -q -v ON_ERROR_STOP=1)
     local passenv=PGPASSWORD
   else
-    [[ "$dump" == "system.sql.gz" ]] && db_name="system"
-    local run="$cli -h $engine -u $DB_APP_USER -D $db_name"
+    [[ "$dump" == "system.sql.gz" || "$dump" == "system.delta.sql.gz" ]] && db_name="system"
+    local run=($cli -h $engine -u $DB_APP_USER -D $db_name)
     local passenv=MYSQL_PWD
   fi
 
   # Prevent warning
   export "${passenv}=${DB_APP_PASSWORD}"
 
+  # Get quantity of parallel import jobs, with 'auto' meaning quantity of CPU cores, and if it's more than 1 - import
+  # via dump-import.py, which imports schema first, then tables data in parallel, then indexes and constraints.
+  # This is possible only in the wrapper-container, as database containers have no python installed. Table data is
+  # spooled gzipped, so size of gzipped dump is required to be free in $dir, else dump is imported via single session
+  local jobs="${IMPORT_JOBS:-$(get_env "IMPORT_JOBS")}"; [[ "$jobs" =~ ^[0-9]+$ ]] && (( jobs > 0 )) || jobs=$(nproc)
+  if (( jobs > 1 )) && [[ -f maintain/dump-import.py ]] && command -v python3 > /dev/null; then
+    local size=0; [[ "${dump##*.}" = "gz" ]] && size=$(stat -c %s "$path" "$path"[0-9][0-9] 2> /dev/null | awk '{s+=$1} END {print s+0}')
+    run=(python3 maintain/dump-import.py --engine "$engine" --jobs "$jobs" --prefix "$prepend" --spool "$dir" --size "$size" -- "${run[@]}")
+  fi
+
   # If dump file exists in data/ directory - import
   if [[ -f "$path" ]]; then
 
     # If dump is gzipped - pipe to gunzip
     if [[ "${dump##*.}" = "gz" ]]; then
-      pv --name "$msg" -pert "$path" | gunzip | $run
+      pv --name "$msg" -pert "$path" | gunzip | "${run[@]}"
     else
-      pv --name "$msg" -pert "$path" | $run
+      pv --name "$msg" -pert "$path" | "${run[@]}"
     fi
 
   # Else
@@ -1389,18 +1619,28 @@ import_possibly_chunked_dump() {
 
       # If dump is gzipped - pipe to gunzip
       if [[ "${dump##*.}" = "gz" ]]; then
-        pv --name "$msg" -pert "${path}"[0-9][0-9] | gunzip | $run;
+        pv --name "$msg" -pert "${path}"[0-9][0-9] | gunzip | "${run[@]}";
       else
-        pv --name "$msg" -pert "${path}"[0-9][0-9] | $run;
+        pv --name "$msg" -pert "${path}"[0-9][0-9] | "${run[@]}";
       fi
     fi
   fi
 
   # Unset back
   unset "$passenv"
+
+  # If delta dump exists for the imported full dump, i.e. it was restored from incremental backup - import it as well
+  local delta="${dump/.sql/.delta.sql}"
+  if [[ "$delta" != "$dump" && "$dump" != *.delta.sql* ]] && ls "$dir/$delta"* > /dev/null 2>&1; then
+    if [[ -f "$path" ]] || ls "$path"[0-9][0-9] > /dev/null 2>&1; then
+      import_possibly_chunked_dump "$delta" "$dir" "$prepend"
+    fi
+  fi
 }
 
-# Download possibly chunked file from github, based on glob pattern
+# Download possibly chunked file from github, based on glob pattern. If release has checksums.json asset,
+# i.e. backup was uploaded via maintain/release-transfer.py - chunks already existing locally with the same
+# size and sha256 as mentioned there are not downloaded again, e.g. when restoring the same release again
 download_possibly_chunked_file() {
 
   # Arguments
@@ -1430,14 +1670,21 @@ download_possibly_chunked_file() {
     # If there a more than 1 chunk
     if (( remote_chunks_qty > 1 )); then
 
-      # Download one by one
+      # Download several at a time, if possible, or one by one
       echo "Downloading $file from $repo:$release into data/ ($remote_chunks_qty chunks):"
-      for remote_chunk in $remote_chunks; do
-        gh_download "$repo" "$release" "$remote_chunk" "$dir"
-        echo "» Downloading $remote_chunk... Done"
-      done
+      if has_transfer_engine; then
+        transfer_assets download "$repo" "$release" --dir "$dir" $remote_chunks || return 1
+      else
+        for remote_chunk in $remote_chunks; do
+          gh_download "$repo" "$release" "$remote_chunk" "$dir"
+          echo "» Downloading $remote_chunk... Done"
+        done
+      fi
 
-    # Else download the single file, overwriting the existing one, if any
+    # Else download the single file, overwriting the existing one, if any, and resuming interrupted download, if possible
+    elif has_transfer_engine; then
+      echo "Downloading $file from $repo:$release into data/:"
+      transfer_assets download "$repo" "$release" --dir "$dir" "$file" || return 1
     else
       local msg="Downloading $file from $repo:$release into data/ ..." && echo "$msg"
       gh_download "$repo" "$release" "$file" "$dir"
@@ -1562,8 +1809,8 @@ get_engine_init_release() {
   esac
 }
 
-# Shut down db server, clean it's data/ dir and start back
-reset_db() {
+# Shut down db server and wait until shutdown is really completed
+db_shutdown_and_wait() {
 
   # Shut down db server
   local msg="Shutting down $(get_engine_name) server..." && echo "$msg"
@@ -1582,64 +1829,223 @@ reset_db() {
   done
 
   # If shutdown file was created by db container's custom-entrypoint.sh script
+  # it means db server process exited gracefully, i.e. shutdown is really completed
   if [ -f "$done" ]; then
-
-    # It means db server process exited gracefully, i.e. shutdown is really completed
     clear_last_lines 1
     echo "$msg Done"
 
-    # Empty *_server_data volume
+  # Else if shutdown is stuck somewhere - print error message and exit
+  else
+    echo "$(get_engine_name) server shutdown timeout reached, something went wrong :("
+    exit 1
+  fi
+}
+
+# Shut down db server, clean it's data/ dir and start back
+reset_db() {
+
+  # Shut down db server
+  db_shutdown_and_wait
+
+  # If snapshot was requested by backup_current_state_locally() but not yet taken, i.e. if it's the first
+  # restore since then - move data into snapshot dir rather than remove, else empty *_server_data volume
+  if [[ -f data/before/snapshot && ! -d /var/lib/db_engine/.snapshot ]]; then
+    echo -n "Moving all data from $(get_engine_name) server into snapshot..." && take_db_snapshot && echo -e " Done"
+  else
     echo -n "Removing all data from $(get_engine_name) server..." && rm -rf /var/lib/db_engine/* && echo -e " Done"
+  fi
 
-    # Wait until re-init is really completed
-    local msg="Starting up $(get_engine_name) server back..." && echo "$msg"
-    local elapsed=0
-    local done="/var/lib/db_engine/init.done"
-    local initTimeout=60
-    local waitTimeout=10
-    while :; do
-      clear_last_lines 1
-      echo "$msg ($elapsed s)"
-      sleep 1
-      elapsed=$((elapsed + 1))
+  # Wait until re-init is really completed
+  local msg="Starting up $(get_engine_name) server back..." && echo "$msg"
+  local elapsed=0
+  local done="/var/lib/db_engine/init.done"
+  local initTimeout=60
+  local waitTimeout=10
+  while :; do
+    clear_last_lines 1
+    echo "$msg ($elapsed s)"
+    sleep 1
+    elapsed=$((elapsed + 1))
 
-      # If init maximum time reached - break
-      if [ $elapsed -ge $initTimeout ]; then
-        echo "$(get_engine_name) empty init timeout reached, something went wrong :("
-        exit 1
-      fi
+    # If init maximum time reached - break
+    if [ $elapsed -ge $initTimeout ]; then
+      echo "$(get_engine_name) empty init timeout reached, something went wrong :("
+      exit 1
+    fi
 
-      # If db re-init is done: if we need to wait a bit more - do wait, else break
-      if [ -f "$done" ]; then
-        if [[ "$waitTimeout" != "0" ]]; then waitTimeout=$((waitTimeout - 1)); else break; fi
-      fi
-    done
+    # If db re-init is done: if we need to wait a bit more - do wait, else break
+    if [ -f "$done" ]; then
+      if [[ "$waitTimeout" != "0" ]]; then waitTimeout=$((waitTimeout - 1)); else break; fi
+    fi
+  done
+  clear_last_lines 1
+  echo "$msg Done"
+}
+
+# Check whether current state should be kept as a snapshot before restore, rather than as dump and uploads
+is_restore_snapshot_enabled() {
+  [[ "$(get_env "RESTORE_SNAPSHOT")" != "0" ]]
+}
+
+# Check whether db server data-directory is empty, except the snapshot dir, if any
+is_datadir_empty() {
+  [ -z "$(ls -A "$1" | grep -vx ".snapshot")" ]
+}
+
+# Move db server data into .snapshot dir within the same volume, so that the data is kept in no time, as
+# the data is not copied. Db server should be shut down before, and shutdown.done file is removed last
+# so that db container's entrypoint will see the data-directory emptied, and will re-init the db server
+take_db_snapshot() {
+  local data="/var/lib/db_engine"
+  mkdir "$data/.snapshot"
+  find "$data" -mindepth 1 -maxdepth 1 ! -name ".*" ! -name "shutdown.done" -exec mv -t "$data/.snapshot" {} +
+  rm "$data/shutdown.done"
+}
+
+# Swap db server data with the one kept in .snapshot dir, so the current data is kept there instead. Db server
+# should be shut down before, and shutdown.done file is kept until the very end, so that db container's entrypoint
+# won't see the data-directory emptied in the middle of the swap, and .swapped file is then created to make it
+# start db server back without re-init
+swap_db_snapshot() {
+  local data="/var/lib/db_engine"
+  mkdir "$data/.swap"
+  find "$data" -mindepth 1 -maxdepth 1 ! -name ".*" ! -name "shutdown.done" -exec mv -t "$data/.swap" {} +
+  find "$data/.snapshot" -mindepth 1 -maxdepth 1 -exec mv -t "$data" {} +
+  rmdir "$data/.snapshot" && mv "$data/.swap" "$data/.snapshot"
+  rm "$data/shutdown.done" && touch "$data/.swapped"
+}
+
+# Shut down db server, swap it's data with the snapshot and start back
+switch_db_snapshot() {
+
+  # Shut down db server and swap data
+  db_shutdown_and_wait
+  echo -n "Swapping $(get_engine_name) server data with snapshot..." && swap_db_snapshot && echo -e " Done"
+
+  # Wait until db server is started back and accepts connections
+  local msg="Starting up $(get_engine_name) server back..." && echo "$msg"
+  local elapsed=0
+  local timeout=60
+  while :; do
     clear_last_lines 1
-    echo "$msg Done"
+    echo "$msg ($elapsed s)"
+    sleep 1
+    elapsed=$((elapsed + 1))
+    if [ ! -f /var/lib/db_engine/.swapped ] && db_ping > /dev/null 2>&1; then break; fi
+    if [ $elapsed -ge $timeout ]; then
+      echo "$(get_engine_name) startup timeout reached, something went wrong :("
+      exit 1
+    fi
+  done
+  clear_last_lines 1
+  echo "$msg Done"
+}
 
-  # Else if shutdown is stuck somewhere - print error message and exit
+# Check whether db server accepts connections
+db_ping() {
+
+  # Shortcuts
+  local engine="$(get_env "DB_ENGINE")"
+  local cli="$(get_engine_cli)"
+
+  # Run engine-specific query
+  if [[ "$engine" == "postgres" ]]; then
+    PGPASSWORD="$DB_APP_PASSWORD" $cli -h "$engine" -U "$DB_APP_USER" -d "$DB_NAME" -t -q -c "SELECT 1"
   else
-    echo "$(get_engine_name) server shutdown timeout reached, something went wrong :("
-    exit 1
+    MYSQL_PWD="$DB_APP_PASSWORD" $cli -h "$engine" -u "$DB_APP_USER" -N -e "SELECT 1"
   fi
 }
 
-# Restore state of custom/public/data/upload dir from the uploads.zip of a given release tag
-# If release tag is not given - existing data/uploads.zip file will be used
+# Restore state of custom/public/data/upload dir from the uploads of a given release tag
+# If release tag is not given - existing data/upload-manifest.json or data/uploads.zip file will be used
 restore_uploads() {
 
   # Arguments
   local release="${1:-}"
   local repo="${2:-$(get_current_repo)}"
 
-  # Name of the backup file
-  local file="uploads.zip"
-
-  # Download possibly chunked uploads.zip
-  download_possibly_chunked_file "$repo" "$release" "$file"
+  # Download uploads
+  if [[ -n "$release" ]]; then
+    phase_begin download
+    download_uploads "$repo" "$release"
+    phase_end download
+  fi
 
   # Extract
-  unzip_file "data/$file" "custom/public/data/upload" "www-data:www-data"
+  phase_begin unpack
+  extract_uploads "data" "custom/public/data/upload" "www-data:www-data"
+  phase_end unpack
+}
+
+# Download uploads of a given release into data/ dir. If release has upload-manifest.json asset - download it
+# and the chunks mentioned there, except the ones already existing locally, else download possibly chunked
+# uploads.zip, as uploads were zipped that way before
+download_uploads() {
+
+  # Arguments
+  local repo="$1"
+  local release="$2"
+  local dir="${3:-data}"
+  local manifest="upload-manifest.json"
+  local chunk
+
+  # If it's a release having uploads zipped - remove local manifest, if any, and download zip
+  if [[ -z "$(load_remote_chunk_list "$repo" "$release" "^$manifest$")" ]]; then
+    rm -f "$dir/$manifest"
+    download_possibly_chunked_file "$repo" "$release" "uploads.zip" "$dir"
+    return
+  fi
+
+  # Remove local zip, if any, and download manifest
+  rm -f "$dir/uploads.z"*
+  local msg="Downloading $manifest from $repo:$release into $dir/ ..." && echo "$msg"
+  gh_download "$repo" "$release" "$manifest" "$dir"
+  if [[ $- == *i* || -n "${FLASK_APP:-}" ]]; then clear_last_lines 1; fi
+  echo "$msg Done"
+
+  # Get chunks missing locally, while local chunks not mentioned in manifest are removed
+  local chunks=$(python3 maintain/uploads-pack.py missing "$dir")
+  local qty=$(echo "$chunks" | wc -w)
+
+  # Download missing chunks several at a time, if possible, or one by one
+  if (( qty > 0 )); then
+    echo "Downloading uploads from $repo:$release into $dir/ ($qty changed chunks):"
+    if has_transfer_engine; then
+      transfer_assets download "$repo" "$release" --dir "$dir" $chunks || return 1
+    else
+      for chunk in $chunks; do
+        gh_download "$repo" "$release" "$chunk" "$dir"
+        echo "» Downloading $chunk... Done"
+      done
+    fi
+  fi
+}
+
+# Extract uploads from a given dir into destination dir, either from content-addressed chunks, or from uploads.zip
+extract_uploads() {
+
+  # Arguments
+  local dir=$1
+  local dest=$2
+  local owner=${3:-}
+
+  # If there is no manifest - unzip
+  if [[ ! -f "$dir/upload-manifest.json" ]]; then
+    unzip_file "$dir/uploads.zip" "$dest" "$owner"
+    return
+  fi
+
+  # Unpack chunks, so that unchanged files are kept as is
+  local msg="Unpacking $dir/upload-manifest.json into $dest/ dir..." && echo -n "$msg"
+  local summary=$(python3 maintain/uploads-pack.py unpack "$dir" "$dest") || return 1
+  echo " Done, $summary"
+
+  # If $owner arg is given - apply ownership for the destination dir
+  if [[ -n $owner ]]; then
+    echo -n "Making that dir writable for Indi Engine..."
+    chown -R "$owner" "$dest"
+    echo -e " Done"
+  fi
 }
 
 # Set given $string at given position as $column and $lines_up relative to the current line
@@ -2100,6 +2506,56 @@ gh_download() {
   fi
 }
 
+# Remember when a given phase of backup or restore, e.g. dump, upload, download or import, has begun
+phase_begin() {
+  declare -gA phase_started
+  phase_started["$1"]="$(date +%s.%N)"
+}
+
+# Record duration of a given phase into var/tmp/phases.json, to be exposed at wrapper's /metrics endpoint, labeled
+# with the script name, e.g. backup or restore, and backup rotation period, if any. Recording is best-effort, so that
+# failure to record won't fail the backup or restore, and it's skipped if python3 is not available
+phase_end() {
+  local phase="$1"
+  local started="${phase_started[$phase]:-}"
+  [[ -n "$started" ]] && command -v python3 >/dev/null 2>&1 || return 0
+  unset 'phase_started[$phase]'
+  python3 maintain/phase-record.py "$phase" --started "$started" --script "${BASH_SOURCE[-1]##*/}" \
+    --period "${rotation_period_name:-}" > /dev/null 2>&1 || true
+}
+
+# Check whether release assets can be transferred via maintain/release-transfer.py, as python3 is
+# available in wrapper-container only, while some of functions are also called within db-containers
+has_transfer_engine() {
+  [[ -f maintain/release-transfer.py ]] && command -v python3 > /dev/null 2>&1
+}
+
+# Download or upload given release assets via maintain/release-transfer.py, which fetches release metadata once
+# and transfers up to $TRANSFER_JOBS assets at a time, retrying each separately and resuming interrupted downloads.
+# Sizes and sha256 of uploaded assets are published as checksums.json asset, and downloaded assets are verified
+# against it, while the ones already existing locally with the same size and sha256 are not downloaded at all.
+# Usage: transfer_assets download|upload repo release [options] names-or-files...
+transfer_assets() {
+
+  # Arguments
+  local command="$1"
+  local repo="$2"
+  local release="$3"
+  shift 3
+
+  # Shortcuts
+  local jobs="$(get_env "TRANSFER_JOBS")"
+  local api="$(get_env "GITHUB_API_URL")"
+  local token="${GH_TOKEN:-}"
+
+  # Uploads require the token having write access
+  [[ $command = "upload" ]] && token="${GH_TOKEN_CUSTOM_RW:-$token}"
+
+  # Do transfer
+  GH_TOKEN="$token" python3 maintain/release-transfer.py "$command" --repo "$repo" --release "$release" \
+    --jobs "${jobs:-4}" --api-url "$api" "$@"
+}
+
 # Install GitHub CLI, if not yet installed
 ghcli_install() {
 
@@ -2149,11 +2605,8 @@ init_uploads_if_need() {
   # If that dir does not exist
   if [[ ! -d "$dest" ]]; then
 
-    # Define file name of the asset, that is needed for creation of the above mentioned dir
-    file="uploads.zip"
-
-    # If asset file does not exist locally
-    if [[ ! -f "data/$file" ]]; then
+    # If assets needed for creation of the above mentioned dir do not exist locally
+    if [[ ! -f "data/upload-manifest.json" && ! -f "data/uploads.zip" ]]; then
 
       # Use GH_TOKEN_CUSTOM_RW as GH_TOKEN
       export GH_TOKEN="$(get_env "GH_TOKEN_CUSTOM_RW")"
@@ -2172,18 +2625,18 @@ init_uploads_if_need() {
         echo
 
         # Do download
-        download_possibly_chunked_file "$init_repo" "$init_release" "$file"
+        download_uploads "$init_repo" "$init_release"
       fi
 
       # Restore GH_TOKEN back, as it might have been spoofed with GH_TOKEN_PARENT_RO by (load_releases .. "init") call above
       export GH_TOKEN="$(get_env "GH_TOKEN_CUSTOM_RW")"
     fi
 
-    # If asset file does exist locally (due to it was just downloaded or it was already existing locally)
-    if [[ -f "data/$file" ]]; then
+    # If assets do exist locally (due to those were just downloaded or were already existing locally)
+    if [[ -f "data/upload-manifest.json" || -f "data/uploads.zip" ]]; then
 
-      # Extract asset with recreating the destination dir and make that dir writable by Indi Engine
-      unzip_file "data/$file" "$dest" "www-data:www-data"
+      # Extract assets with recreating the destination dir and make that dir writable by Indi Engine
+      extract_uploads "data" "$dest" "www-data:www-data"
       echo
 
     # Else create empty dir
@@ -2423,12 +2876,107 @@ get_head() {
 backup_current_state_locally() {
   if ! is_uncommitted_restore; then
     echo -e "Backing up the current version locally before restoring the selected one:"
-    source maintain/uploads-prepare.sh ${1:-} "» "
-    source maintain/dump-prepare.sh "${1:-}" "» "
+
+    # If snapshot mode is enabled - keep current state as is, so that dump and uploads
+    # are created from the snapshot only if restore will be committed
+    if is_restore_snapshot_enabled; then
+      take_restore_snapshot "${1:-data/before}" "» "
+
+    # Else create dump and uploads right now
+    else
+      source maintain/uploads-prepare.sh ${1:-} "» "
+      source maintain/dump-prepare.sh "${1:-}" "» "
+    fi
     echo ""
   fi
 }
 
+# Keep current state of uploads and database as a snapshot in a given dir:
+# 1.Hardlink uploads into $dir/upload/ dir, which is safe as uploads are never modified in place
+#   on restore, but are replaced or removed, so the hardlinked files keep their contents
+# 2.Create $dir/snapshot file, so that reset_db() will move database data into snapshot dir
+#   within the same volume, rather than remove, once db server is shut down for restore
+take_restore_snapshot() {
+
+  # Arguments
+  local dir="$1"
+  local pref="${2:-}"
+
+  # Shortcuts
+  local source="custom/public/data/upload"
+
+  # Remove previous snapshot, if any left, e.g. from a restore which has failed
+  rm -rf "$dir" /var/lib/db_engine/.snapshot && mkdir -p "$dir"
+
+  # Hardlink uploads
+  echo -n "${pref}Hardlinking $source into $dir/upload/ dir..."
+  if [[ -d "$source" ]]; then cp -al "$source" "$dir/upload"; else mkdir "$dir/upload"; fi
+  echo " Done"
+
+  # Request database snapshot
+  echo "${pref}$(get_engine_name) server data will be kept as snapshot once restore begins"
+  touch "$dir/snapshot"
+}
+
+# Revert uploads and database to the state kept in snapshot
+revert_restore_snapshot() {
+
+  # Arguments
+  local dir="$1"
+
+  # Shortcuts
+  local source="custom/public/data/upload"
+
+  # Put uploads snapshot back in place
+  echo -n "Reverting $source to the snapshot..."
+  if [[ -d "$dir/upload" ]]; then rm -rf "$source" && mv "$dir/upload" "$source"; fi
+  echo -e " Done\n"
+
+  # If database snapshot was taken, i.e. db server was reset for restore - swap the data back
+  # and remove the restored data. Debezium and closetab php processes are stopped meanwhile
+  if [[ -d /var/lib/db_engine/.snapshot ]]; then
+    declare -g closetab=false
+    declare -g debezium=false
+    stop_debezium_and_closetab_if_need
+    switch_db_snapshot
+    echo -n "Removing restored data from $(get_engine_name) server..." && rm -rf /var/lib/db_engine/.snapshot && echo -e " Done"
+    start_debezium_and_closetab_if_need
+  fi
+
+  # Remove snapshot dir
+  rm -rf "$dir"
+}
+
+# Create dump and uploads in a given dir from the state kept in snapshot
+materialize_restore_snapshot() {
+
+  # Arguments
+  local dir="$1"
+  local pref="${2:-}"
+
+  # Pack uploads snapshot, and remove it as not needed anymore
+  source maintain/uploads-prepare.sh "$dir" "$pref" "$dir/upload"
+  rm -rf "$dir/upload"
+
+  # If database snapshot was taken - temporarily swap it back to be dumped, and drop it afterwards.
+  # Else database is not changed since snapshot was requested, so it's dumped as is
+  if [[ -d /var/lib/db_engine/.snapshot ]]; then
+    declare -g closetab=false
+    declare -g debezium=false
+    stop_debezium_and_closetab_if_need
+    switch_db_snapshot 2>&1 | prepend "$pref"
+    source maintain/dump-prepare.sh "$dir" "$pref"
+    switch_db_snapshot 2>&1 | prepend "$pref"
+    rm -rf /var/lib/db_engine/.snapshot
+    start_debezium_and_closetab_if_need
+  else
+    source maintain/dump-prepare.sh "$dir" "$pref"
+  fi
+
+  # Snapshot is materialized
+  rm -f "$dir/snapshot"
+}
+
 # Restore source code
 restore_source() {
 
@@ -2627,13 +3175,26 @@ cancel_restore_source() {
 # Cancel uploads restore, i.e. revert uploads to the state which was before restore
 cancel_restore_uploads_and_dump() {
 
-  # Move uploads.zip and dump.sql.gz files from data/before/ to data/
+  # If snapshot was taken before restore - revert to it
+  if [[ -f "data/before/snapshot" ]]; then
+    revert_restore_snapshot "data/before"
+    return
+  fi
+
+  # Move uploads chunks and dump.sql.gz files from data/before/ to data/
   # for those to be further picked by restore_uploads() call and db re-init
   src="data/before" && trg="data"
-  echo -n "Moving uploads.zip and sql dumps from $src/ into $trg/..."
+  echo -n "Moving uploads and sql dumps from $src/ into $trg/..."
   if [ -d $src ]; then
-    rm -f "$trg/uploads.z"*
-    mv -f "$src"/* "$trg"/ && rm -r "$src"
+    rm -f "$trg/uploads.z"* "$trg/upload-manifest.json" "$trg/"*.delta.sql.gz*
+
+    # Uploads chunks reused by 'uploads-pack.py pack --reuse' are hardlinks of the ones in $trg/, and mv refuses
+    # to move a file onto itself, so such files are just removed from $src/ as they're already in $trg/
+    for file in "$src"/*; do
+      [[ -e "$file" ]] || continue
+      if [[ "$file" -ef "$trg/${file##*/}" ]]; then rm -f "$file"; else mv -f "$file" "$trg"/; fi
+    done
+    rm -r "$src"
   fi
   echo -e " Done\n"
 
@@ -2788,6 +3349,11 @@ backup_before_restore() {
   # were created before restore, and still kept
   dir="data/before"
 
+  # If snapshot was taken instead - create them from snapshot
+  if [[ -f "$dir/snapshot" ]]; then
+    materialize_restore_snapshot "$dir" "» "
+  fi
+
   # Backup those assets into github under 'before' tag
   backup_prepared_assets "before" "$dir"
 
@@ -2843,26 +3409,38 @@ percona_entrypoint() {
     # If we reached this line, it means db was shut down
     echo "$(get_engine_name) Server has been shut down"
 
-    # Create a file within data-dir to indicate shutdown is completed
+    # Create a file within data-dir to indicate shutdown is completed, and remove the one
+    # indicating data-directory was swapped with snapshot, if left from previous shutdown
+    rm -f "$data/.swapped"
     touch "$data/shutdown.done"
 
-    # Wait until shutdown is really completed
+    # Wait until shutdown is really completed, i.e. until data-directory is emptied or swapped with snapshot
     local timeout=5
     local elapsed=0
-    while [ ! -z "$(ls -A $data)" ] && [ $elapsed -lt $timeout ]; do
+    while ! is_datadir_empty "$data" && [ ! -f "$data/.swapped" ] && [ $elapsed -lt $timeout ]; do
       echo "Waiting for data-directory to be emptied... ($elapsed s)"
       sleep 1
       elapsed=$((elapsed + 1))
     done
 
     # If data-directory was emptied
-    if [ -z "$(ls -A $data)" ]; then
+    if is_datadir_empty "$data"; then
 
       # We assume it was done for restore
       echo "$(get_engine_name) data-directory has been emptied, so initiating the restore..."
 
       # Re-init
       "$(get_env "DB_ENGINE")_entrypoint" "$@"
+
+    # Else if data-directory was swapped with snapshot
+    elif [ -f "$data/.swapped" ]; then
+
+      # We assume it was done for restore to be cancelled or committed
+      echo "$(get_engine_name) data-directory has been swapped with snapshot, so starting up back..."
+
+      # Start up with the swapped data as is
+      rm -f "$data/.swapped"
+      "$(get_env "DB_ENGINE")_entrypoint" "$@"
     fi
 }
 
@@ -2912,26 +3490,38 @@ mysql_entrypoint() {
   # If we reached this line, it means db was shut down
   echo "$(get_engine_name) Server has been shut down"
 
-  # Create a file within data-dir to indicate shutdown is completed
+  # Create a file within data-dir to indicate shutdown is completed, and remove the one
+  # indicating data-directory was swapped with snapshot, if left from previous shutdown
+  rm -f "$data/.swapped"
   touch "$data/shutdown.done"
 
-  # Wait until shutdown is really completed
+  # Wait until shutdown is really completed, i.e. until data-directory is emptied or swapped with snapshot
   local timeout=5
   local elapsed=0
-  while [ ! -z "$(ls -A $data)" ] && [ $elapsed -lt $timeout ]; do
+  while ! is_datadir_empty "$data" && [ ! -f "$data/.swapped" ] && [ $elapsed -lt $timeout ]; do
     echo "Waiting for data-directory to be emptied... ($elapsed s)"
     sleep 1
     elapsed=$((elapsed + 1))
   done
 
   # If data-directory was emptied
-  if [ -z "$(ls -A $data)" ]; then
+  if is_datadir_empty "$data"; then
 
     # We assume it was done for restore
     echo "$(get_engine_name) data-directory has been emptied, so initiating the restore..."
 
     # Re-init
     "$(get_env "DB_ENGINE")_entrypoint" "$@"
+
+  # Else if data-directory was swapped with snapshot
+  elif [ -f "$data/.swapped" ]; then
+
+    # We assume it was done for restore to be cancelled or committed
+    echo "$(get_engine_name) data-directory has been swapped with snapshot, so starting up back..."
+
+    # Start up with the swapped data as is
+    rm -f "$data/.swapped"
+    "$(get_env "DB_ENGINE")_entrypoint" "$@"
   fi
 }
 
@@ -2981,26 +3571,38 @@ mariadb_entrypoint() {
   # If we reached this line, it means db was shut down
   echo "$(get_engine_name) Server has been shut down"
 
-  # Create a file within data-dir to indicate shutdown is completed
+  # Create a file within data-dir to indicate shutdown is completed, and remove the one
+  # indicating data-directory was swapped with snapshot, if left from previous shutdown
+  rm -f "$data/.swapped"
   touch "$data/shutdown.done"
 
-  # Wait until shutdown is really completed
+  # Wait until shutdown is really completed, i.e. until data-directory is emptied or swapped with snapshot
   local timeout=5
   local elapsed=0
-  while [ ! -z "$(ls -A $data)" ] && [ $elapsed -lt $timeout ]; do
+  while ! is_datadir_empty "$data" && [ ! -f "$data/.swapped" ] && [ $elapsed -lt $timeout ]; do
     echo "Waiting for data-directory to be emptied... ($elapsed s)"
     sleep 1
     elapsed=$((elapsed + 1))
   done
 
   # If data-directory was emptied
-  if [ -z "$(ls -A $data)" ]; then
+  if is_datadir_empty "$data"; then
 
     # We assume it was done for restore
     echo "$(get_engine_name) data-directory has been emptied, so initiating the restore..."
 
     # Re-init
     mariadb_entrypoint "$@"
+
+  # Else if data-directory was swapped with snapshot
+  elif [ -f "$data/.swapped" ]; then
+
+    # We assume it was done for restore to be cancelled or committed
+    echo "$(get_engine_name) data-directory has been swapped with snapshot, so starting up back..."
+
+    # Start up with the swapped data as is
+    rm -f "$data/.swapped"
+    mariadb_entrypoint "$@"
   fi
 }
 
@@ -3037,26 +3639,38 @@ postgres_entrypoint() {
   # If we reached this line, it means db was shut down
   echo "$(get_engine_name) has been shut down"
 
-  # Create a file within data-dir to indicate shutdown is completed
+  # Create a file within data-dir to indicate shutdown is completed, and remove the one
+  # indicating data-directory was swapped with snapshot, if left from previous shutdown
+  rm -f "$data/.swapped"
   touch "$data/shutdown.done"
 
-  # Wait until shutdown is really completed
+  # Wait until shutdown is really completed, i.e. until data-directory is emptied or swapped with snapshot
   local timeout=5
   local elapsed=0
-  while [ ! -z "$(ls -A $data)" ] && [ $elapsed -lt $timeout ]; do
+  while ! is_datadir_empty "$data" && [ ! -f "$data/.swapped" ] && [ $elapsed -lt $timeout ]; do
     echo "Waiting for data-directory to be emptied... ($elapsed s)"
     sleep 1
     elapsed=$((elapsed + 1))
   done
 
   # If data-directory was emptied
-  if [ -z "$(ls -A $data)" ]; then
+  if is_datadir_empty "$data"; then
 
     # We assume it was done for restore
     echo "$(get_engine_name) data-directory has been emptied, so initiating the restore..."
 
     # Re-init
     postgres_entrypoint "$@"
+
+  # Else if data-directory was swapped with snapshot
+  elif [ -f "$data/.swapped" ]; then
+
+    # We assume it was done for restore to be cancelled or committed
+    echo "$(get_engine_name) data-directory has been swapped with snapshot, so starting up back..."
+
+    # Start up with the swapped data as is
+    rm -f "$data/.swapped"
+    postgres_entrypoint "$@"
   fi
 }
 
@@ -3272,10 +3886,20 @@ wrapper_entrypoint() {
     gh repo set-default "$(get_current_repo)"
   fi
 
-  # Run HTTP api server
-  FLASK_APP=compose/wrapper/api.py flask run --host=0.0.0.0 --port=80
+  # Export FLASK_APP as scripts run by api server rely on it to detect they're not run from CLI
+  export FLASK_APP=compose/wrapper/api.py
+
+  # Run HTTP api server via gunicorn, if installed, or via flask development server otherwise
+  if command -v gunicorn &> /dev/null; then
+    export WRAPPER_WORKERS="$(get_env "WRAPPER_WORKERS")"
+    export WRAPPER_THREADS="$(get_env "WRAPPER_THREADS")"
+    export WRAPPER_TIMEOUT="$(get_env "WRAPPER_TIMEOUT")"
+    gunicorn -c compose/wrapper/gunicorn.conf.py --pythonpath compose/wrapper api:app
+  else
+    flask run --host=0.0.0.0 --port=80
+  fi
 
-  # If we reached this line, it means flask was shut down
+  # If we reached this line, it means api server was shut down
   echo "Flask server has been shut down"
 
   # Re-start flask
@@ -3698,7 +4322,7 @@ migrate_if_need() {
 
     # Remove local database dumps, if any, to prevent duplicate disk space usage
     for file in $(get_DB_DUMPS); do
-      rm -f "data/$file"*
+      rm -f "data/$file"* "data/${file/.sql/.delta.sql}"*
     done
 
     # Create pre-migrate database backup, if not yet created
@@ -0,0 +1,25 @@
+import os, sys, time, argparse
+
+# Use metrics module shared with wrapper's api.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'compose', 'wrapper'))
+import metrics
+
+# Record duration of a backup/restore phase, e.g. dump, upload, download or import, into 'var/tmp/phases.json',
+# which is exposed at wrapper's /metrics endpoint as wrapper_phase_duration_seconds histogram along with the
+# duration of the most recent run of each phase. Duration is counted from the time given by --started
+
+# Parse arguments
+parser = argparse.ArgumentParser(description='Record duration of a backup/restore phase')
+parser.add_argument('phase', help='phase name, e.g. dump, upload, download or import')
+parser.add_argument('--started', type=float, required=True, help='unix time when the phase was started')
+parser.add_argument('--script', default='', help='script the phase belongs to, e.g. backup or restore')
+parser.add_argument('--period', default='', help='backup rotation period, e.g. hourly or daily')
+parser.add_argument('--file', default=metrics.phases_file, help='file to record into')
+args = parser.parse_args()
+
+# Record
+try:
+    metrics.record_phase(args.phase, max(time.time() - args.started, 0.0), args.file, script=args.script, period=args.period)
+except (OSError, ValueError) as e:
+    print(e, file=sys.stderr)
+    sys.exit(1)
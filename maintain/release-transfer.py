@@ -0,0 +1,420 @@
+import io, os, sys, glob, json, time, fnmatch, hashlib, argparse, threading, http.client
+from urllib.parse import urlsplit, urljoin, quote
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Use GitHub API client shared with wrapper's api.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'compose', 'wrapper'))
+from github import Client, GitHubError
+from releases import next_link
+
+# Download or upload assets of a GitHub release, several assets at a time. Release metadata is fetched once rather
+# than once per asset, and each asset is retried separately, so a dropped connection affects that asset only.
+# Downloads are written into '<name>.<asset id>.part' files first, so that retry, as well as next run of this
+# script, resumes download from where it stopped, via Range-header. Api url can be overridden by --api-url, e.g.
+# to run against a local fake release server, and upload url is taken from release metadata, so it's overridden too
+#
+# Uploaded assets are hashed while being sent, and their sizes and sha256 are published as 'checksums.json' asset of
+# the same release. Downloaded assets are hashed while being received and verified against that asset, and assets
+# already existing locally with the same size and sha256 are not downloaded at all. To avoid re-hashing local files
+# each time, sha256 of files in a dir is cached in '.checksums.json' file there, along with their sizes and mtimes
+
+# Read/write buffer size
+buffer_size = 1 << 20
+
+# Name of asset having sizes and sha256 of other assets of a release
+checksums_name = 'checksums.json'
+
+# Name of file having sizes, mtimes and sha256 of files in a dir
+cache_name = '.checksums.json'
+
+# Get sha256 of a file contents, continuing given digest, if any
+def file_hash(path, digest=None):
+    digest = digest or hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(buffer_size): digest.update(block)
+    return digest
+
+# Cached sha256 of files in a dir, which are valid while files sizes and mtimes are not changed
+class Cache:
+
+    def __init__(self):
+        self.dirs = {}
+        self.lock = threading.Lock()
+
+    # Get entries for a given dir, loading them if not yet loaded
+    def entries(self, dir):
+        with self.lock:
+            if dir not in self.dirs:
+                try:
+                    with open(os.path.join(dir, cache_name)) as f: self.dirs[dir] = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    self.dirs[dir] = {}
+            return self.dirs[dir]
+
+    # Get sha256 of a file, hashing it if not yet cached or changed since then
+    def get(self, path):
+        st, entries = os.stat(path), self.entries(os.path.dirname(os.path.abspath(path)))
+        entry = entries.get(os.path.basename(path))
+        if entry and entry['size'] == st.st_size and entry['mtime'] == st.st_mtime_ns: return entry['sha256']
+        return self.put(path, file_hash(path).hexdigest())
+
+    # Remember sha256 of a file
+    def put(self, path, sha):
+        st, entries = os.stat(path), self.entries(os.path.dirname(os.path.abspath(path)))
+        with self.lock: entries[os.path.basename(path)] = {'size': st.st_size, 'mtime': st.st_mtime_ns, 'sha256': sha}
+        return sha
+
+    # Save entries, except the ones for files not existing anymore
+    def save(self):
+        for dir, entries in self.dirs.items():
+            entries = {name: entry for name, entry in entries.items() if os.path.isfile(os.path.join(dir, name))}
+            with open(tmp := os.path.join(dir, cache_name + '.tmp'), 'w') as f: json.dump(entries, f, separators=(',', ':'))
+            os.replace(tmp, os.path.join(dir, cache_name))
+
+# Error raised when asset transfer failed. If retry-flag is false - there is no sense to retry, e.g. on 404
+class TransferError(Exception):
+
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry
+
+# Overall progress, printed as a single line updated in place, if output is interactive
+class Progress:
+
+    def __init__(self, prefix, total, interactive):
+        self.prefix = prefix
+        self.total = total
+        self.done = 0
+        self.started = time.time()
+        self.interactive = interactive
+        self.lock = threading.Lock()
+        self.printed = 0
+        self.assets = {}
+        self.skipped = 0
+
+    # Set quantity of bytes transferred so far for a given asset, and print progress at most twice a second
+    def set(self, name, qty):
+        with self.lock:
+            self.done += qty - self.assets.get(name, 0)
+            self.assets[name] = qty
+            if self.interactive and time.time() - self.printed >= 0.5:
+                self.printed = time.time()
+                percent = self.done * 100 // self.total if self.total else 100
+                print(f"\r{self.prefix}{self.done / 1048576:,.1f} of {self.total / 1048576:,.1f} MB ({percent}%), "
+                      f"{self.speed():,.1f} MB/s\033[K", end='', flush=True)
+
+    # Exclude asset from the total as it's skipped
+    def skip(self, size):
+        with self.lock:
+            self.total -= size
+            self.skipped += 1
+
+    # Print line, above the progress line if any
+    def line(self, text):
+        with self.lock: print(('\r\033[K' if self.interactive else '') + text, flush=True)
+
+    # Get speed in MB/s
+    def speed(self):
+        return self.done / 1048576 / max(time.time() - self.started, 0.001)
+
+# File wrapper counting and hashing bytes being read by http.client while sending request body
+class Reader:
+
+    def __init__(self, file, name, progress):
+        self.file = file
+        self.name = name
+        self.progress = progress
+        self.sent = 0
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        block = self.file.read(buffer_size if size is None or size < 0 else max(size, buffer_size))
+        self.sent += len(block)
+        self.digest.update(block)
+        self.progress.set(self.name, self.sent)
+        return block
+
+# Release, which metadata is fetched once, with assets transferred via given client
+class Release:
+
+    def __init__(self, client, repo, tag, token=''):
+        self.client = client
+        self.repo = repo
+        self.token = token
+        self.lock = threading.Lock()
+        release = client.get_json(f'/repos/{repo}/releases/tags/{quote(tag)}', token)
+        self.id = release['id']
+        self.upload_url = release['upload_url'].split('{')[0]
+        self.assets = {}
+        self.refresh()
+
+    # Load assets list, page by page
+    def refresh(self):
+        assets, url = {}, f'/repos/{self.repo}/releases/{self.id}/assets?per_page=100'
+        while url:
+            status, headers, body = self.client.request('GET', url, self.token)
+            assets.update((asset['name'], asset) for asset in json.loads(body))
+            url = next_link(headers.get('link', ''))
+        with self.lock: self.assets = assets
+
+    # Get asset by name
+    def asset(self, name):
+        with self.lock: return self.assets.get(name)
+
+    # Make request following redirects, and return response to be read by the caller. Authorization header
+    # is sent to the initial host only, as asset downloads are redirected to the storage having signed urls
+    def open(self, method, url, headers, body=None):
+        host = urlsplit(url).netloc
+        for _ in range(5):
+            parts = urlsplit(url)
+            conn = self.client.connection(parts.scheme, parts.netloc)
+            send = {'User-Agent': 'indi-engine-wrapper', **headers}
+            if self.token and parts.netloc == host: send['Authorization'] = f'Bearer {self.token}'
+            try:
+                conn.request(method, parts.path + ('?' + parts.query if parts.query else ''), body=body, headers=send)
+                response = conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                self.client.disconnect(parts.scheme, parts.netloc)
+                raise
+            if response.status in (301, 302, 303, 307, 308) and body is None:
+                response.read()
+                url = urljoin(url, response.getheader('location'))
+                continue
+            response.origin = (parts.scheme, parts.netloc)
+            return response
+        raise TransferError(f'too many redirects, last one to {url}', False)
+
+    # Raise error for unexpected response status, retriable if it's server-side error or rate limit
+    def fail(self, response):
+        body = response.read()
+        try:
+            message = json.loads(body)['message']
+        except (ValueError, KeyError, TypeError):
+            message = body.decode('utf-8', 'replace').strip()[:200]
+        raise TransferError(f'HTTP {response.status} {message}'.strip(), response.status >= 500 or response.status in (408, 429))
+
+    # Download asset into given dir, resuming from '<name>.<asset id>.part' file if exists, and return its sha256.
+    # Asset id is there as re-uploaded asset gets new id, so that partial download of previous asset won't be resumed.
+    # If sha256 is given - downloaded file is verified against it
+    def download(self, name, dir, progress, sha=None):
+        asset = self.asset(name)
+        if asset is None: raise TransferError(f'not found in {self.repo} release assets', False)
+        path = os.path.join(dir, name)
+        part = f"{path}.{asset['id']}.part"
+
+        # Remove partial downloads of previous assets having same name, if any
+        for stale in glob.glob(glob.escape(path) + '.*.part'):
+            if stale != part: os.remove(stale)
+
+        # Prepare range request if download was started before, with the part downloaded so far being hashed first
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if offset > asset['size']: offset = 0
+        digest = file_hash(part) if offset else hashlib.sha256()
+        progress.set(name, offset)
+        headers = {'Accept': 'application/octet-stream'}
+        if offset: headers['Range'] = f'bytes={offset}-'
+
+        # Send request. If there is no token - use public url, as requests to api url are counted against rate limit
+        response = self.open('GET', asset['url'] if self.token else asset['browser_download_url'], headers)
+
+        # If range is not satisfiable since file is already complete - use it, else if range is ignored - start over
+        if response.status == 416 and offset == asset['size']:
+            response.read()
+        elif response.status == 416:
+            response.read()
+            os.remove(part)
+            raise TransferError('partial download is not resumable')
+        elif response.status in (200, 206):
+            if response.status == 200: offset, digest = 0, hashlib.sha256()
+            with open(part, 'ab' if offset else 'wb') as f:
+                try:
+                    while block := response.read(buffer_size):
+                        f.write(block)
+                        digest.update(block)
+                        offset += len(block)
+                        progress.set(name, offset)
+                except (OSError, http.client.HTTPException):
+                    self.client.disconnect(*response.origin)
+                    raise
+        else:
+            self.fail(response)
+
+        # If download is incomplete - drop connection as it's broken and raise error to be retried, else move into place
+        if offset != asset['size']:
+            self.client.disconnect(*response.origin)
+            raise TransferError(f"{offset} of {asset['size']} bytes received")
+
+        # If checksum does not match - remove downloaded file and raise error to be retried
+        if sha and digest.hexdigest() != sha:
+            os.remove(part)
+            raise TransferError('checksum mismatch')
+        os.replace(part, path)
+        return digest.hexdigest()
+
+    # Get contents of a small asset, e.g. checksums manifest, or None if there is no such asset
+    def read(self, name):
+        if not (asset := self.asset(name)): return None
+        response = self.open('GET', asset['url'] if self.token else asset['browser_download_url'], {'Accept': 'application/octet-stream'})
+        if response.status != 200: self.fail(response)
+        return response.read()
+
+    # Delete asset, if exists
+    def delete(self, name):
+        if asset := self.asset(name):
+            try:
+                self.client.request('DELETE', f"/repos/{self.repo}/releases/assets/{asset['id']}", self.token)
+            except GitHubError as e:
+                if e.status != 404: raise TransferError(str(e), e.status is None or e.status >= 500)
+            with self.lock: self.assets.pop(name, None)
+
+    # Upload file as an asset, replacing existing asset, if any, and return its sha256
+    def upload(self, path, progress):
+        name = os.path.basename(path)
+
+        # Upload, and if failed - uncount bytes sent, as they'll be sent again on retry
+        with open(path, 'rb') as f:
+            reader = Reader(f, name, progress)
+            try:
+                self.post(name, os.path.getsize(path), reader)
+            except Exception:
+                progress.set(name, 0)
+                raise
+        return reader.digest.hexdigest()
+
+    # Upload given body as an asset, replacing existing asset, if any
+    def post(self, name, size, body):
+
+        # Delete existing asset, which may also be the one left by failed previous attempt
+        self.delete(name)
+
+        # Upload
+        headers = {'Accept': 'application/vnd.github+json', 'Content-Type': 'application/octet-stream', 'Content-Length': str(size)}
+        response = self.open('POST', f'{self.upload_url}?name={quote(name)}', headers, body)
+
+        # If upload is done - remember asset, else if asset with such name exists - reload assets list to delete it on retry
+        if response.status == 201:
+            asset = json.loads(response.read())
+            with self.lock: self.assets[name] = asset
+        elif response.status == 422:
+            response.read()
+            self.refresh()
+            raise TransferError('asset already exists')
+        else:
+            self.fail(response)
+
+# Run transfer of a single asset with retries, unless error says there is no sense to retry
+def attempt(fn, name, retries, client, progress):
+    for n in range(retries + 1):
+        try:
+            return fn()
+        except (TransferError, GitHubError, OSError, http.client.HTTPException) as e:
+            if n == retries or isinstance(e, TransferError) and not e.retry: raise
+            progress.line(f'{progress.prefix}{name}: {e}, retrying...')
+            time.sleep(client.delay(n))
+
+# Run transfers in parallel, and return failures as [name => error] pairs. Transfer fn returning False means it's skipped
+def run(jobs, items, fn, progress, verb):
+    failures = {}
+    with ThreadPoolExecutor(jobs, thread_name_prefix='transfer') as pool:
+        futures = {pool.submit(fn, item): os.path.basename(item) for item in items}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                if future.result() is not False: progress.line(f'{progress.prefix}{verb} {name}... Done')
+            except Exception as e:
+                failures[name] = e
+                progress.line(f'{progress.prefix}{verb} {name}... Failed: {e}')
+    return failures
+
+# Load checksums manifest of a release as [name => {size, sha256}] pairs, except entries not matching assets sizes,
+# e.g. if asset was re-uploaded by other means than this script
+def load_checksums(release):
+    checksums = json.loads(release.read(checksums_name) or '{}')
+    return {name: entry for name, entry in checksums.items() if (release.asset(name) or {}).get('size') == entry['size']}
+
+# Download assets, except the ones existing locally with same size and sha256 as mentioned in checksums manifest
+def download(args, client, release, cache):
+    os.makedirs(args.dir, exist_ok=True)
+    total = sum((release.asset(name) or {}).get('size', 0) for name in args.names)
+    progress = Progress(args.prefix, total, args.interactive)
+    checksums = attempt(lambda: load_checksums(release), checksums_name, args.retries, client, progress)
+
+    # Download asset unless it's already there
+    def fn(name):
+        path, entry = os.path.join(args.dir, name), checksums.get(name)
+        if entry and os.path.isfile(path) and os.path.getsize(path) == entry['size'] and cache.get(path) == entry['sha256']:
+            progress.skip(entry['size'])
+            return False
+        sha = release.download(name, args.dir, progress, entry and entry['sha256'])
+        cache.put(path, sha)
+
+    # Run downloads
+    failures = run(args.jobs, args.names, lambda name: attempt(lambda: fn(name), name, args.retries, client, progress), progress, 'Downloading')
+    if progress.skipped: print(f'{args.prefix}{progress.skipped} unchanged asset(s) already downloaded, skipped', flush=True)
+    return progress, failures
+
+# Upload files, except the ones which names match --skip-existing pattern and which are already uploaded with same size.
+# Files which names match --last pattern are uploaded after all others, e.g. manifest mentioning other files. Then
+# checksums manifest is updated with sizes and sha256 of uploaded files, as well as of skipped ones, if not there yet
+def upload(args, client, release, cache):
+    files, skipped = [], 0
+    for path in args.files:
+        asset = release.asset(os.path.basename(path))
+        if args.skip_existing and fnmatch.fnmatch(os.path.basename(path), args.skip_existing) and asset \
+                and asset['size'] == os.path.getsize(path) and asset.get('state', 'uploaded') == 'uploaded':
+            skipped += 1
+        else:
+            files.append(path)
+    if skipped: print(f'{args.prefix}{skipped} unchanged asset(s) already uploaded, skipped', flush=True)
+    last = [path for path in files if args.last and fnmatch.fnmatch(os.path.basename(path), args.last)]
+    first = [path for path in files if path not in last]
+    progress = Progress(args.prefix, sum(map(os.path.getsize, files)), args.interactive)
+    fn = lambda path: cache.put(path, attempt(lambda: release.upload(path, progress), os.path.basename(path), args.retries, client, progress))
+    failures = run(args.jobs, first, fn, progress, 'Uploading')
+    if not failures and last: failures = run(args.jobs, last, fn, progress, 'Uploading')
+    if failures: return progress, failures
+
+    # Update checksums manifest, with entries for assets not existing anymore being removed
+    checksums = attempt(lambda: load_checksums(release), checksums_name, args.retries, client, progress)
+    for path in args.files:
+        checksums[os.path.basename(path)] = {'size': os.path.getsize(path), 'sha256': cache.get(path)}
+    body = json.dumps(dict(sorted(checksums.items())), indent=1).encode()
+    attempt(lambda: release.post(checksums_name, len(body), io.BytesIO(body)), checksums_name, args.retries, client, progress)
+    return progress, failures
+
+# Parse arguments
+parser = argparse.ArgumentParser(description='Download or upload GitHub release assets in parallel')
+parser.add_argument('command', choices=['download', 'upload'])
+parser.add_argument('--repo', required=True, help='repository, e.g. owner/name')
+parser.add_argument('--release', required=True, help='release tag')
+parser.add_argument('--jobs', type=int, default=4, help='quantity of assets transferred at a time')
+parser.add_argument('--retries', type=int, default=5, help='quantity of retries for each asset')
+parser.add_argument('--api-url', default='', help='GitHub API url, e.g. url of local fake release server')
+parser.add_argument('--prefix', default='» ', help='prefix for each printed message')
+parser.add_argument('--dir', default='data', help='dir where assets are downloaded into')
+parser.add_argument('--skip-existing', default='', help='glob pattern for names of files not to be re-uploaded if already exist')
+parser.add_argument('--last', default='', help='glob pattern for names of files to be uploaded after all others')
+parser.add_argument('items', nargs='*', help='asset names to download, or files to upload')
+args = parser.parse_intermixed_args()
+args.names = args.files = args.items
+args.interactive = sys.stdout.isatty() or bool(os.environ.get('FLASK_APP'))
+
+# Run command
+client = Client(args.api_url or os.environ.get('GITHUB_API_URL') or 'https://api.github.com', timeout=60)
+cache = Cache()
+try:
+    release = Release(client, args.repo, args.release, os.environ.get('GH_TOKEN', ''))
+    progress, failures = (download if args.command == 'download' else upload)(args, client, release, cache)
+except (GitHubError, TransferError) as e:
+    print(f'{args.prefix}{e}', file=sys.stderr)
+    sys.exit(1)
+finally:
+    cache.save()
+
+# Print summary
+if progress.done:
+    elapsed = time.time() - progress.started
+    print(f"{args.prefix}{progress.done / 1048576:,.1f} MB in {elapsed:.1f}s ({progress.speed():,.1f} MB/s)", flush=True)
+if failures:
+    print(f"{args.prefix}Failed to {args.command} {len(failures)} asset(s): {', '.join(failures)}", file=sys.stderr)
+    sys.exit(1)
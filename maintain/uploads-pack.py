@@ -0,0 +1,301 @@
+import os, re, sys, json, stat, hashlib, argparse
+
+# Pack directory tree into content-addressed chunks, and unpack it back. Each file is hashed and stored once however
+# many copies of it are there, and files are packed one after another in the order of their paths into chunks having
+# names derived from their contents, e.g. 'upload-0f3e....pack'. Chunk boundaries are content-defined, i.e. chunk ends
+# after a file, which hash says so, rather than after a fixed quantity of bytes, so adding, changing or deleting a file
+# changes the chunk where that file is, while other chunks stay the same, having same names. This makes it possible
+# to skip chunks which were already packed, uploaded or downloaded, by names only. Directory tree, file attributes
+# and locations of file contents within chunks are kept in manifest, which is the 'upload-manifest.json' file
+
+# Manifest filename
+manifest_name = 'upload-manifest.json'
+
+# Chunk filename regex
+chunk_name = re.compile(r'^upload-[0-9a-f]{64}\.pack$')
+
+# Read buffer size
+buffer_size = 1 << 20
+
+# Quantity of attempts to pack source dir, if files are changed while being packed
+attempts = 3
+
+# Error raised when a file was changed or removed since it was scanned, e.g. as a new version of it was uploaded
+class Changed(RuntimeError):
+    def __init__(self, path):
+        super().__init__(f"{path} was changed while being packed")
+        self.path = path
+
+# Parse size like '2000m' or '64m', as accepted by 'split --bytes' and 'zip -s' commands
+def parse_size(value):
+    match = re.fullmatch(r'(\d+)([kmg]?)b?', value.strip().lower())
+    if not match: raise argparse.ArgumentTypeError(f"invalid size: {value}")
+    return int(match.group(1)) * 1024 ** ' kmg'.index(match.group(2) or ' ')
+
+# Load manifest from a given directory, or None if there is no manifest so far
+def load_manifest(dir):
+    try:
+        with open(os.path.join(dir, manifest_name)) as f: return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+# Save manifest into a given directory
+def save_manifest(dir, manifest):
+    tmp = os.path.join(dir, manifest_name + '.tmp')
+    with open(tmp, 'w') as f: json.dump(manifest, f, separators=(',', ':'))
+    os.replace(tmp, os.path.join(dir, manifest_name))
+
+# Get sha256 of a file contents
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(buffer_size): digest.update(block)
+    return digest.hexdigest()
+
+# Get sha256 object fed with the first given quantity of bytes of a file
+def prefix_hash(path, length):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while length and (block := f.read(min(buffer_size, length))):
+            digest.update(block)
+            length -= len(block)
+    return digest
+
+# Walk source directory and collect its dirs and files in the order of their paths, relative to source
+# directory. Hashes of files which size and mtime are same as in previous manifest are taken from there.
+# Files removed while being scanned are skipped
+def scan(source, previous):
+    dirs, files = [], []
+    known = {f['path']: f for f in previous['files']} if previous else {}
+    for root, subdirs, names in os.walk(source):
+        subdirs.sort()
+        rel = os.path.relpath(root, source)
+        for name in sorted(subdirs):
+            st = os.lstat(os.path.join(root, name))
+            if stat.S_ISLNK(st.st_mode): names.append(name)
+            else: dirs.append({'path': os.path.normpath(os.path.join(rel, name)), 'mode': stat.S_IMODE(st.st_mode), 'mtime': st.st_mtime_ns})
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            try:
+                st = os.lstat(path)
+                item = {'path': os.path.normpath(os.path.join(rel, name)), 'mode': stat.S_IMODE(st.st_mode), 'mtime': st.st_mtime_ns}
+                if stat.S_ISLNK(st.st_mode):
+                    item['link'] = os.readlink(path)
+                elif stat.S_ISREG(st.st_mode):
+                    item['size'] = st.st_size
+                    prev = known.get(item['path'])
+                    if prev and prev.get('size') == st.st_size and prev['mtime'] == st.st_mtime_ns and 'sha' in prev:
+                        item['sha'] = prev['sha']
+                    else:
+                        item['sha'] = file_hash(path)
+                else:
+                    continue
+            except FileNotFoundError:
+                continue
+            files.append(item)
+    dirs.sort(key=lambda d: d['path'])
+    files.sort(key=lambda f: f['path'])
+    return dirs, files
+
+# Split unique file contents into chunks as [name => [[sha, offset, length, path], ...]] pairs. Content bigger
+# than max_size is split into pieces of max_size. Chunk is ended after a piece, if chunk is at least a quarter
+# of target size and piece hash is below the threshold proportional to piece length, so that chunks are of
+# target size in average, or if the next piece would make chunk bigger than max_size
+def plan(files, target, max_size):
+    chunks, chunk, size, seen = {}, [], 0, set()
+
+    # Name chunk by hashes of pieces, so that chunk name is known before chunk is written
+    def close():
+        nonlocal chunk, size
+        if not chunk: return
+        digest = hashlib.sha256()
+        for sha, offset, length, _ in chunk: digest.update(f'{sha}:{offset}:{length}\n'.encode())
+        chunks[f'upload-{digest.hexdigest()}.pack'] = chunk
+        chunk, size = [], 0
+
+    for file in files:
+        if 'sha' not in file or file['sha'] in seen: continue
+        seen.add(file['sha'])
+        offset = 0
+        while True:
+            length = min(max_size, file['size'] - offset)
+            if chunk and size + length > max_size: close()
+            chunk.append((file['sha'], offset, length, file['path']))
+            size += length
+            piece = hashlib.sha256(f"{file['sha']}:{offset}".encode()).digest()
+            if size >= target // 4 and int.from_bytes(piece[:4], 'big') < length * 2 ** 32 / target: close()
+            offset += length
+            if offset >= file['size']: break
+    close()
+    return chunks
+
+# Write chunks into target dir, except the ones already existing there, or hardlinked from reuse dir, and return
+# quantity of written chunks and locations of file contents within chunks as [sha => [[name, offset, length], ...]]
+# pairs. Contents are hashed while written, as chunk names are derived from hashes got by scan, so if a file was
+# rewritten since then, even if having same size, chunk would have name not matching its contents, and would be kept
+# as is by further runs. Hashing of a file split across chunks is continued from chunk to chunk, or is started from
+# the file itself, if its previous pieces are in chunks that were not written
+def write(args, files, chunks):
+    written, blobs, hashing = 0, {}, {}
+    sizes = {f['sha']: f['size'] for f in files if 'sha' in f}
+    for name, pieces in chunks.items():
+        offset = 0
+        for sha, start, length, _ in pieces:
+            blobs.setdefault(sha, []).append([name, offset, length])
+            offset += length
+        path = os.path.join(args.target, name)
+        if os.path.exists(path) and os.path.getsize(path) == offset: continue
+        if args.reuse and os.path.exists(reuse := os.path.join(args.reuse, name)) and os.path.getsize(reuse) == offset:
+            try:
+                os.link(reuse, path)
+                continue
+            except OSError:
+                pass
+        try:
+            with open(path + '.tmp', 'wb') as out:
+                for sha, start, length, rel in pieces:
+                    try:
+                        digest = hashing.pop(sha, None) or prefix_hash(os.path.join(args.source, rel), start)
+                        with open(os.path.join(args.source, rel), 'rb') as f:
+                            f.seek(start)
+                            remaining = length
+                            while remaining and (block := f.read(min(buffer_size, remaining))):
+                                out.write(block)
+                                digest.update(block)
+                                remaining -= len(block)
+                    except FileNotFoundError:
+                        raise Changed(rel)
+                    if remaining: raise Changed(rel)
+                    if start + length < sizes[sha]: hashing[sha] = digest
+                    elif digest.hexdigest() != sha: raise Changed(rel)
+        except BaseException:
+            if os.path.exists(path + '.tmp'): os.remove(path + '.tmp')
+            raise
+        os.replace(path + '.tmp', path)
+        written += 1
+    return written, blobs
+
+# Pack source dir into target dir
+def pack(args):
+    os.makedirs(args.target, exist_ok=True)
+
+    # Collect dirs and files, and write chunks. If a file was changed since scanned, e.g. as user uploaded a new version
+    # of it meanwhile - rescan, having that file re-hashed while other files' hashes are taken from the failed attempt,
+    # and retry, so that live changes don't fail the backup. Chunks written by the failed attempt are verified already,
+    # so those are kept and either skipped by the next attempt or removed below as not used anymore
+    previous = load_manifest(args.target) or (load_manifest(args.reuse) if args.reuse else None)
+    for attempt in range(attempts):
+        dirs, files = scan(args.source, previous)
+        chunks = plan(files, args.chunk_size, args.max_size)
+        try:
+            written, blobs = write(args, files, chunks)
+            break
+        except Changed as e:
+            if attempt == attempts - 1: raise
+            previous = {'files': [f for f in files if f['path'] != e.path]}
+
+    # Remove chunks not used anymore
+    for name in os.listdir(args.target):
+        if chunk_name.match(name) and name not in chunks: os.remove(os.path.join(args.target, name))
+
+    # Save manifest
+    save_manifest(args.target, {
+        'version': 1,
+        'dirs': dirs,
+        'files': files,
+        'blobs': blobs,
+        'chunks': {name: sum(piece[2] for piece in pieces) for name, pieces in chunks.items()}
+    })
+    size = sum(f.get('size', 0) for f in files)
+    print(f"{len(files)} files, {size:,} bytes, {len(chunks)} chunks, {written} of them written", flush=True)
+
+# Print names of chunks mentioned in manifest but missing in given dir, and remove chunks not mentioned there
+def missing(args):
+    manifest = load_manifest(args.target)
+    if manifest is None: raise RuntimeError(f"{os.path.join(args.target, manifest_name)} not found")
+    for name in os.listdir(args.target):
+        if chunk_name.match(name) and name not in manifest['chunks']: os.remove(os.path.join(args.target, name))
+    for name, size in manifest['chunks'].items():
+        path = os.path.join(args.target, name)
+        if not os.path.exists(path) or os.path.getsize(path) != size: print(name)
+
+# Unpack chunks in source dir into target dir, so that target dir becomes same as it was when packed. Files, which
+# size and mtime are same as in manifest, are kept as is, and files and dirs not mentioned in manifest are removed
+def unpack(args):
+    manifest = load_manifest(args.source)
+    if manifest is None: raise RuntimeError(f"{os.path.join(args.source, manifest_name)} not found")
+    os.makedirs(args.target, exist_ok=True)
+
+    # Remove files and dirs not mentioned in manifest, as well as ones having another type
+    dirs = {d['path'] for d in manifest['dirs']}
+    files = {f['path']: f for f in manifest['files']}
+    for root, subdirs, names in os.walk(args.target, topdown=False):
+        rel = os.path.relpath(root, args.target)
+        for name in names + subdirs:
+            path, key = os.path.join(root, name), os.path.normpath(os.path.join(rel, name))
+            is_dir = os.path.isdir(path) and not os.path.islink(path)
+            if is_dir and key not in dirs or not is_dir and (key not in files or os.path.islink(path) != ('link' in files[key])):
+                if is_dir: os.rmdir(path)
+                else: os.remove(path)
+
+    # Create dirs
+    for d in manifest['dirs']: os.makedirs(os.path.join(args.target, d['path']), exist_ok=True)
+
+    # Write files, except unchanged ones
+    written = 0
+    for f in manifest['files']:
+        path = os.path.join(args.target, f['path'])
+        if 'link' in f:
+            if os.path.islink(path) and os.readlink(path) == f['link']: continue
+            if os.path.lexists(path): os.remove(path)
+            os.symlink(f['link'], path)
+            continue
+        if os.path.isfile(path):
+            st = os.stat(path)
+            if st.st_size == f['size'] and st.st_mtime_ns == f['mtime']: continue
+        with open(path + '.tmp', 'wb') as out:
+            for name, offset, length in manifest['blobs'][f['sha']]:
+                with open(os.path.join(args.source, name), 'rb') as chunk:
+                    chunk.seek(offset)
+                    remaining = length
+                    while remaining and (block := chunk.read(min(buffer_size, remaining))):
+                        out.write(block)
+                        remaining -= len(block)
+                if remaining: raise RuntimeError(f"{name} is truncated")
+        os.chmod(path + '.tmp', f['mode'])
+        os.replace(path + '.tmp', path)
+        os.utime(path, ns=(f['mtime'], f['mtime']))
+        written += 1
+
+    # Apply dirs attributes, deepest first, as creating files inside a dir changes its mtime
+    for d in reversed(manifest['dirs']):
+        path = os.path.join(args.target, d['path'])
+        os.chmod(path, d['mode'])
+        os.utime(path, ns=(d['mtime'], d['mtime']))
+    print(f"{len(manifest['files'])} files, {written} of them written", flush=True)
+
+# Parse arguments
+parser = argparse.ArgumentParser(description='Pack directory tree into content-addressed chunks, and unpack it back')
+commands = parser.add_subparsers(dest='command', required=True)
+command = commands.add_parser('pack', help='pack source dir into chunks and manifest in target dir')
+command.add_argument('source', help='dir to be packed')
+command.add_argument('target', help='dir where chunks and manifest are written')
+command.add_argument('--chunk-size', type=parse_size, default='64m', help='average chunk size, e.g. 64m')
+command.add_argument('--max-size', type=parse_size, default='2000m', help='maximum chunk size, e.g. 2000m')
+command.add_argument('--reuse', default=None, help='dir where existing chunks can be hardlinked from, e.g. data')
+command.set_defaults(fn=pack)
+command = commands.add_parser('missing', help='print chunks mentioned in manifest but missing in target dir')
+command.add_argument('target', help='dir where chunks and manifest are')
+command.set_defaults(fn=missing)
+command = commands.add_parser('unpack', help='unpack chunks and manifest in source dir into target dir')
+command.add_argument('source', help='dir where chunks and manifest are')
+command.add_argument('target', help='dir to be unpacked into')
+command.set_defaults(fn=unpack)
+args = parser.parse_args()
+
+# Run command
+try:
+    args.fn(args)
+except (RuntimeError, OSError) as e:
+    print(e, file=sys.stderr)
+    sys.exit(1)
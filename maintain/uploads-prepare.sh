@@ -21,26 +21,23 @@ else
   # Goto project root
   cd $DOC
 
-  # Directory where to create the zip
+  # Directory where to create chunks and manifest
   dir=${1:-data}
 
   # Prefix to every printed message
   pref="${2:-}"
 
-  # Source dir to be zipped
-  source="custom/public/data/upload"
+  # Source dir to be packed, which can be given e.g. as data/before/upload where uploads snapshot is kept
+  source="${3:-custom/public/data/upload}"
 
-  # Target path to the zip file
-  uploads="$dir/uploads.zip"
+  # Target path to the manifest
+  uploads="$dir/upload-manifest.json"
 
   # Create $dir if it does not exist
   [ -d "$dir" ] || mkdir -p "$dir"
 
-  # Get glob pattern for zip file(s)
-  base="${uploads%.zip}.z*"
-
-  # Remove all .z01, .z02, etc chunks for this archive including .zip file
-  rm -f $base
+  # Remove uploads.zip with .z01, .z02, etc chunks, if any, as uploads were zipped that way before
+  rm -f "$dir/uploads.z"*
 
   # If source dir not created so far - create, make it writable for www-data user and executable
   # to allow du-command to be runnable from within apache-container on behalf of www-data user
@@ -50,57 +47,17 @@ else
     chmod +x "$source/../" "$source"
   fi
 
-  # Get total files and folders to be added to zip
-  qty=$(find $source -mindepth 1 | wc -l)
-  msg="${pref}Zipping $source into $uploads..."
-
-  # Save current dir
-  dir="$(pwd)"
-
-  # Pick GH_ASSET_MAX_SIZE from .env
+  # Pick GH_ASSET_MAX_SIZE and UPLOADS_CHUNK_SIZE from .env
   export GH_ASSET_MAX_SIZE="$(grep "^GH_ASSET_MAX_SIZE=" .env | cut -d '=' -f 2-)"
+  chunk_size="$(get_env "UPLOADS_CHUNK_SIZE")"
 
-  # Goto dir to be zipped
-  cd "$source"
-
-  # If source directory (current dir) is empty
-  if [ -z "$(ls -A ".")" ]; then
-
-    # Use 7z-command to create an empty zip archive, because zip-command does not support that
-    echo -n "$msg" && 7z a -tzip -bso0 -bse0 "../../../../$uploads" && echo -n " Done"
-
-  # Else
-  else
-
-    # Prepare arguments for zip-command
-    args="-r -0 -s $GH_ASSET_MAX_SIZE ../../../../$uploads ."
-
-    # If we're within an interactive shell
-    if [[ $- == *i* || -n "${FLASK_APP:-}" ]]; then
-
-      # Zip with progress tracking
-      zip $args | awk -v qty="$qty" -v msg="$msg" '/ adding: / {idx++; printf "\r%s %d of %d\033[K     ", msg, idx, qty; fflush();}'
-      clear_last_lines 1
-      echo -en "\n$msg Done"
-
-    # Else zip with NO progress tracking
-    else
-      echo -n "$msg" && zip $args > /dev/null && echo -n " Done"
-    fi
-  fi
-
-  # Go back to original dir
-  cd "$dir"
-
-  # Get and print zip size
-  size=$(du -scbh $base 2> /dev/null | awk '/total/ {print $1}' | sed -E 's~^[0-9.]+~& ~'); echo -n ", ${size,,}b"
-
-  # Find all chunks
-  chunks=$(ls -1 $base 2> /dev/null | sort -V)
-
-  # Print chunks qty if more than 1
-  qty=$(echo "$chunks" | wc -l); if (( $qty > 1 )); then echo -n " ($qty chunks)"; else echo -n "     "; fi
+  # If packing into other dir than data/, e.g. into data/before/ - hardlink chunks existing in data/ instead of writing
+  [[ "$dir" != "data" && -d "data" ]] && reuse=(--reuse data) || reuse=()
 
-  # Print newline
-  echo ""
+  # Pack source dir into content-addressed chunks and manifest. Files unchanged since previous packing are
+  # not re-hashed, and chunks which already exist in $dir are not re-written, while obsolete ones are removed.
+  # If failed - return, rather than exit, as this script is sourced by backup and restore functions
+  msg="${pref}Packing $source into $dir/ dir..."; echo -n "$msg"
+  summary=$(python3 maintain/uploads-pack.py pack "$source" "$dir" --chunk-size "${chunk_size:-64m}" --max-size "$GH_ASSET_MAX_SIZE" "${reuse[@]}") || { return 1 2> /dev/null || exit 1; }
+  echo " Done, $summary"
 fi
\ No newline at end of file